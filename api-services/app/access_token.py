@@ -0,0 +1,47 @@
+# access_token.py
+# Short-lived, locally verifiable proof that a client already paid for a resource.
+#
+#   token = mint("lnk_1a2b3c4d", ttl_s=900)
+#   verify(token, "lnk_1a2b3c4d")   # True until it expires, microseconds, no network
+#
+# Format: v1.<expires_unix>.<base64url HMAC-SHA256(secret, "v1|<resource>|<expires>")>
+# The resource id is not in the token, only in the MAC, so a token for one link cannot be
+# replayed against another. Workers must share ACCESS_TOKEN_SECRET to accept each other's
+# tokens; without it each process draws its own secret and a token is only honoured by the
+# worker that minted it (clients then just fall back to paying again).
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from typing import Optional
+
+SECRET = (os.getenv("ACCESS_TOKEN_SECRET") or secrets.token_hex(32)).encode()
+VERSION = "v1"
+
+
+def _mac(resource: str, expires: int, secret: bytes) -> str:
+    digest = hmac.new(secret, f"{VERSION}|{resource}|{expires}".encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def mint(resource: str, ttl_s: int, secret: bytes = SECRET, now: Optional[float] = None) -> str:
+    expires = int(now if now is not None else time.time()) + ttl_s
+    return f"{VERSION}.{expires}.{_mac(resource, expires, secret)}"
+
+
+def verify(token: Optional[str], resource: str, secret: bytes = SECRET, now: Optional[float] = None) -> bool:
+    if not token:
+        return False
+    try:
+        version, expires_s, mac = token.split(".", 2)
+        expires = int(expires_s)
+    except ValueError:
+        return False
+    if version != VERSION or expires < (now if now is not None else time.time()):
+        return False
+    return hmac.compare_digest(mac, _mac(resource, expires, secret))
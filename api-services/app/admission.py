@@ -0,0 +1,293 @@
+# admission.py
+# Admission control in front of the rate-limited upstreams (LLM providers, CoinGecko).
+#
+#   async with admission.slot("openai"):      # done for you by providers.py
+#       ...one upstream call...
+#   with admission.sync_slot("coingecko"):   # from sync handlers running in a worker thread
+#       requests.get(...)
+#   priority: float = Depends(admission.prioritize(COST_USD))   # per endpoint
+#
+# Each gated provider has a concurrency cap and a token bucket (rate + burst) sized below
+# the upstream's own limits, so we queue instead of collecting 429s and timeouts from it.
+# Callers beyond the cap wait in a bounded queue ordered by priority: the price of the
+# request times the tenant's weight (X-Tenant header, ADMIT_TENANT_WEIGHTS="acme=3,free=0.5").
+# When the queue is full a newcomer that outranks the lowest waiter takes its place; whoever
+# loses is shed immediately with 429 + Retry-After, as is anyone who waited ADMIT_MAX_WAIT_S.
+# Admitted work therefore runs at the upstream's sustainable rate however much is offered.
+#
+# Env per provider: ADMIT_CONCURRENCY_<P>, ADMIT_RATE_<P> (requests/s, 0 = no bucket),
+# ADMIT_BURST_<P>, ADMIT_MAX_QUEUE_<P>. Providers not listed here are not gated.
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import anyio
+from fastapi import HTTPException, Request
+
+MAX_WAIT_S = float(os.getenv("ADMIT_MAX_WAIT_S", "15"))
+TENANT_HEADER = "X-Tenant"
+
+
+@dataclass
+class GateConfig:
+    concurrency: int
+    rate: float
+    burst: float
+    max_queue: int
+
+
+def _config(name: str, concurrency: int, rate: float, burst: float, max_queue: int) -> GateConfig:
+    env = name.upper()
+    return GateConfig(
+        concurrency=int(os.getenv(f"ADMIT_CONCURRENCY_{env}", concurrency)),
+        rate=float(os.getenv(f"ADMIT_RATE_{env}", rate)),
+        burst=float(os.getenv(f"ADMIT_BURST_{env}", burst)),
+        max_queue=int(os.getenv(f"ADMIT_MAX_QUEUE_{env}", max_queue)),
+    )
+
+
+GATES: Dict[str, GateConfig] = {
+    "openai": _config("openai", 64, 20, 40, 256),
+    "anthropic": _config("anthropic", 64, 10, 20, 256),
+    "gemini": _config("gemini", 64, 20, 40, 256),
+    "perplexity": _config("perplexity", 32, 5, 10, 128),
+    # Public API: about 30 calls/min on the free plan.
+    "coingecko": _config("coingecko", 8, 0.5, 5, 64),
+}
+
+
+def _weights(spec: str) -> Dict[str, float]:
+    out = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() and weight.strip():
+            out[name.strip()] = float(weight)
+    return out
+
+
+TENANT_WEIGHTS = _weights(os.getenv("ADMIT_TENANT_WEIGHTS", ""))
+
+# Priority of the work running in this context; set per request by prioritize().
+current_priority: contextvars.ContextVar[float] = contextvars.ContextVar("admission_priority", default=0.0)
+
+
+class Overloaded(HTTPException):
+    """Shed by admission control; rendered as 429 with Retry-After."""
+
+    def __init__(self, provider: str, reason: str, retry_after: float):
+        super().__init__(
+            status_code=429,
+            detail=f"{provider} is at capacity ({reason}); retry later",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
+class Gate:
+    """Concurrency cap + token bucket + bounded priority queue for one provider (one event loop)."""
+
+    def __init__(self, name: str, cfg: GateConfig):
+        self.name = name
+        self.cfg = cfg
+        self.free = cfg.concurrency
+        self.tokens = cfg.burst
+        self.stamp = time.monotonic()
+        self.waiters: list = []  # heap of [-priority, seq, future]
+        self.seq = itertools.count()
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.hold_ewma = 1.0
+        self.waits: deque = deque(maxlen=1024)
+        self.stats = {"admitted": 0, "queued": 0, "shed_full": 0, "shed_wait": 0, "evicted": 0}
+
+    def _refill(self) -> None:
+        if self.cfg.rate <= 0:
+            return
+        now = time.monotonic()
+        self.tokens = min(self.cfg.burst, self.tokens + (now - self.stamp) * self.cfg.rate)
+        self.stamp = now
+
+    def _ready(self) -> bool:
+        return self.free > 0 and (self.cfg.rate <= 0 or self.tokens >= 1)
+
+    def _take(self) -> None:
+        self.free -= 1
+        if self.cfg.rate > 0:
+            self.tokens -= 1
+        self.stats["admitted"] += 1
+
+    def retry_after(self) -> float:
+        """Rough time until a newcomer would be admitted: the queue ahead drained at our pace."""
+        ahead = len(self.waiters) + 1
+        by_rate = ahead / self.cfg.rate if self.cfg.rate > 0 else 0.0
+        by_slots = ahead * self.hold_ewma / max(self.cfg.concurrency, 1)
+        return max(by_rate, by_slots, 1.0)
+
+    def _dispatch(self) -> None:
+        self._refill()
+        while self.waiters and self._ready():
+            _, _, fut = heapq.heappop(self.waiters)
+            if fut.done():
+                continue
+            self._take()
+            fut.set_result(None)
+        if self.waiters and self.free > 0 and self.cfg.rate > 0 and self.timer is None:
+            # Slots are free but the bucket is empty: wake when the next token lands.
+            delay = (1 - self.tokens) / self.cfg.rate
+            self.timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+
+    def _on_timer(self) -> None:
+        self.timer = None
+        self._dispatch()
+
+    def _remove(self, entry: list) -> None:
+        try:
+            self.waiters.remove(entry)
+            heapq.heapify(self.waiters)
+        except ValueError:
+            pass
+
+    async def acquire(self, priority: float) -> None:
+        self._refill()
+        if not self.waiters and self._ready():
+            self._take()
+            return
+        if len(self.waiters) >= self.cfg.max_queue:
+            lowest = max(self.waiters) if self.waiters else None  # largest -priority = lowest priority
+            if lowest is None or priority <= -lowest[0]:
+                self.stats["shed_full"] += 1
+                raise Overloaded(self.name, "queue full", self.retry_after())
+            self._remove(lowest)
+            self.stats["evicted"] += 1
+            lowest[2].set_exception(Overloaded(self.name, "displaced by higher-priority work", self.retry_after()))
+        fut = asyncio.get_running_loop().create_future()
+        entry = [-priority, next(self.seq), fut]
+        heapq.heappush(self.waiters, entry)
+        self.stats["queued"] += 1
+        self._dispatch()
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), MAX_WAIT_S)
+        except asyncio.TimeoutError:
+            if fut.done() and not fut.cancelled() and fut.exception() is None:
+                self.waits.append(time.monotonic() - start)
+                return  # admitted at the deadline
+            fut.cancel()
+            self._remove(entry)
+            self.stats["shed_wait"] += 1
+            raise Overloaded(self.name, f"waited {MAX_WAIT_S:.0f}s", self.retry_after())
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled() and fut.exception() is None:
+                self.release(0.0)  # admitted, but our caller is gone
+            else:
+                fut.cancel()
+                self._remove(entry)
+            raise
+        self.waits.append(time.monotonic() - start)
+
+    def release(self, held_s: float) -> None:
+        if held_s:
+            self.hold_ewma = 0.9 * self.hold_ewma + 0.1 * held_s
+        self.free += 1
+        self._dispatch()
+
+    def snapshot(self) -> Dict[str, Any]:
+        self._refill()
+        waits = sorted(self.waits)
+        return dict(
+            self.stats,
+            in_use=self.cfg.concurrency - self.free,
+            concurrency=self.cfg.concurrency,
+            waiting=len(self.waiters),
+            max_queue=self.cfg.max_queue,
+            rate=self.cfg.rate,
+            tokens=round(self.tokens, 2),
+            wait_p50_s=round(waits[len(waits) // 2], 3) if waits else None,
+            wait_p95_s=round(waits[int(len(waits) * 0.95)], 3) if waits else None,
+        )
+
+
+_gates: Dict[Any, Dict[str, Gate]] = {}
+
+
+def _gate(provider: str) -> Optional[Gate]:
+    cfg = GATES.get(provider)
+    if cfg is None:
+        return None
+    # Futures belong to one loop; a process normally has one, tests may have several.
+    gates = _gates.setdefault(asyncio.get_running_loop(), {})
+    gate = gates.get(provider)
+    if gate is None:
+        gate = gates[provider] = Gate(provider, cfg)
+    return gate
+
+
+@asynccontextmanager
+async def slot(provider: str, priority: Optional[float] = None):
+    """Hold one admission slot for `provider` for the duration of the block (no-op if ungated)."""
+    gate = _gate(provider)
+    if gate is None:
+        yield
+        return
+    await gate.acquire(current_priority.get() if priority is None else priority)
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        gate.release(time.monotonic() - start)
+
+
+async def _acquire(provider: str, priority: float) -> Optional[Gate]:
+    gate = _gate(provider)
+    if gate is not None:
+        await gate.acquire(priority)
+    return gate
+
+
+@contextmanager
+def sync_slot(provider: str, priority: Optional[float] = None):
+    """slot() for sync handlers running in an anyio worker thread."""
+    gate = anyio.from_thread.run(_acquire, provider, current_priority.get() if priority is None else priority)
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        if gate is not None:
+            anyio.from_thread.run_sync(gate.release, time.monotonic() - start)
+
+
+def tenant_weight(tenant: Optional[str]) -> float:
+    return TENANT_WEIGHTS.get(tenant or "", 1.0)
+
+
+def set_priority(request: Request, price_usd: float) -> float:
+    """Rank this request's upstream calls by price x tenant weight; for routes priced per request."""
+    priority = price_usd * tenant_weight(request.headers.get(TENANT_HEADER))
+    current_priority.set(priority)
+    return priority
+
+
+def prioritize(price_usd: float):
+    """FastAPI dependency: rank this request's upstream calls by price x tenant weight."""
+
+    async def dependency(request: Request) -> float:
+        return set_priority(request, price_usd)
+
+    return dependency
+
+
+def snapshot() -> Dict[str, Any]:
+    try:
+        gates = _gates.get(asyncio.get_running_loop(), {})
+    except RuntimeError:
+        gates = next(iter(_gates.values()), {}) if _gates else {}
+    return {name: gates[name].snapshot() if name in gates else {"idle": True} for name in GATES}
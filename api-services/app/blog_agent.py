@@ -1,11 +1,31 @@
-from fastapi import FastAPI, Query, HTTPException, Depends
+from fastapi import FastAPI, Query, Request, Response, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime, timezone
-import requests
 import os
 
+import providers
+import admission
+import metrics
+import profiler
+import llm_cache
+import x402
+import hedging
+from jobs import jobs, check_mode
+
+from llm_cache import cache_key, cached_call, lookup, store, CacheMiss, POLICIES
+from singleflight import flights
+from prompting import compact_research, output_budget, prompt_report, stats as prompt_stats
+from llm_stream import event_stream
+
 app = FastAPI(title="Blog Agent API", version="1.0")
+metrics.install(app)
+profiler.install(app)
+x402.install(app)
+llm_cache.install(app)
+providers.install(app)
+jobs.install(app)
 
 # ---------------------------------------------------------------------
 # Authentication setup
@@ -34,14 +54,18 @@ app.add_middleware(
 # Config
 # ---------------------------------------------------------------------
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "your-openai-api-key")
-OPENAI_BASE = "https://api.openai.com/v1/chat/completions"
+OPENAI_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1").rstrip("/") + "/chat/completions"
 TIMEOUT = 60
+COST_USD = 0.80
+# x402 price per call; 0 (the default) leaves the endpoint behind the bearer token only
+PRICE_USD = float(os.getenv("BLOG_PRICE_USD", "0"))
 
 # ---------------------------------------------------------------------
 # Blog Generation Functions
 # ---------------------------------------------------------------------
-def generate_blog(topic: str, research_data: str = "", word_count: int = 1500, style: str = "Indian Market Copywriter"):
-    """Generate blog content using OpenAI API"""
+def build_blog_request(topic: str, research_data: str = "", word_count: int = 1500, style: str = "Indian Market Copywriter"):
+    """Headers, OpenAI request body and prompt token report for a blog post"""
+    research_data, report = compact_research("blog", topic, research_data)
     headers = {
         "Authorization": f"Bearer {OPENAI_API_KEY}",
         "Content-Type": "application/json"
@@ -64,23 +88,71 @@ def generate_blog(topic: str, research_data: str = "", word_count: int = 1500, s
     - Make it scannable with bullet points
     - End with a strong call-to-action"""
     
+    max_tokens = output_budget(word_count, "gpt-4o")
     data = {
         "model": "gpt-4o",
         "messages": [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
         ],
-        "max_tokens": word_count * 2,  # Allow extra tokens for formatting
+        "max_tokens": max_tokens,
         "temperature": 0.7
     }
-    
-    response = requests.post(OPENAI_BASE, headers=headers, json=data, timeout=TIMEOUT)
-    response.raise_for_status()
-    return response.json()
+    return headers, data, prompt_report(report, system_prompt, user_prompt, max_tokens=max_tokens)
+
+async def generate_blog(topic: str, research_data: str = "", word_count: int = 1500, style: str = "Indian Market Copywriter", cache: str = "prefer"):
+    """Generate blog content using OpenAI API. Returns (response_json, served_from_cache, coalesced, prompt_report)."""
+    headers, data, report = build_blog_request(topic, research_data, word_count, style)
+
+    def call():
+        return hedging.call("blog", hedging.Target("openai", OPENAI_BASE, headers, data), TIMEOUT)
+
+    key = f"{cache}:{cache_key('openai', data['model'], data)}"
+    (result, cached), shared = await flights.do(
+        "blog", key, lambda: cached_call("blog", "openai", data["model"], data, call, cache), COST_USD, free=lambda value: value[1]
+    )
+    return result, cached, shared, report
+
+async def stream_blog(topic: str, research_data: str = "", word_count: int = 1500, style: str = "Indian Market Copywriter", cache: str = "prefer", payment: x402.Payment = None):
+    """SSE frames for a blog post streamed from OpenAI (see llm_stream.py for the schema)"""
+    headers, data, report = build_blog_request(topic, research_data, word_count, style)
+    hit = await lookup("blog", "openai", data["model"], data) if cache != "bypass" else None
+    if hit is None and cache == "only":
+        raise CacheMiss("no cached blog response for this request")
+
+    served = {"provider": "openai"}
+    return event_stream(
+        "openai",
+        data["model"],
+        lambda: hedging.stream("blog", hedging.Target("openai", OPENAI_BASE, headers, data), TIMEOUT, lambda p: served.update(provider=p)),
+        lambda text, cached: blog_response(topic, word_count, style, text, cached, prompt_tokens=report, provider=served["provider"]),
+        cached_text=hit["choices"][0]["message"]["content"] if hit else None,
+        on_complete=lambda text: store("openai", data["model"], data, {"choices": [{"message": {"content": text}}]}),
+        payment=payment,
+    )
+
+def blog_response(topic: str, word_count: int, style: str, content: str, cached: bool, coalesced: bool = False, prompt_tokens: dict = None, provider: str = "openai"):
+    return {
+        "topic": topic,
+        "word_count": word_count,
+        "style": style,
+        "content": content,
+        "source": hedging.label(provider),
+        "provider": provider,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "cached": cached,
+        "coalesced": coalesced,
+        "prompt_tokens": prompt_tokens,
+        "cost_usd": 0.0 if cached or coalesced else COST_USD
+    }
 
 # ---------------------------------------------------------------------
 # Endpoints
 # ---------------------------------------------------------------------
+@app.on_event("shutdown")
+async def close_provider_clients():
+    await providers.aclose_all()
+
 @app.get("/health")
 def health_check():
     """Health check endpoint (no authentication required)"""
@@ -88,32 +160,52 @@ def health_check():
         "status": "healthy",
         "service": "Blog Agent API",
         "version": "1.0",
+        "coalescing": flights.snapshot("blog"),
+        "payments": x402.snapshot(),
+        "jobs": jobs.snapshot("blog"),
+        "admission": admission.snapshot(),
+        "hedging": hedging.snapshot("blog"),
+        "prompt_budget": prompt_stats.snapshot("blog"),
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
 
 @app.post("/generate")
-def generate_blog_post(
+async def generate_blog_post(
+    request: Request,
+    response: Response,
     topic: str = Query(..., description="Blog topic"),
     research_data: str = Query("", description="Research data to include"),
     word_count: int = Query(1500, description="Target word count"),
     style: str = Query("Indian Market Copywriter", description="Writing style"),
-    token: str = Depends(verify_token)
+    cache: str = Query("prefer", description="Response cache: prefer, bypass or only"),
+    stream: bool = Query(False, description="Stream tokens as Server-Sent Events"),
+    mode: str = Query("sync", description="sync, or async to get a job id and poll /jobs/{id}"),
+    webhook: str = Query(None, description="With mode=async: URL to POST the finished job to"),
+    token: str = Depends(verify_token),
+    priority: float = Depends(admission.prioritize(COST_USD)),
+    payment: x402.Payment = Depends(x402.paywall(PRICE_USD, "Blog post generation"))
 ):
     """Generate a blog post"""
-    try:
-        result = generate_blog(topic, research_data, word_count, style)
-        
-        return {
-            "topic": topic,
-            "word_count": word_count,
-            "style": style,
-            "content": result["choices"][0]["message"]["content"],
-            "source": "OpenAI GPT-4",
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "cost_usd": 0.80
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Blog generation failed: {str(e)}")
+    if cache not in POLICIES:
+        raise HTTPException(status_code=400, detail=f"cache must be one of {', '.join(POLICIES)}")
+    check_mode(mode, stream)
+    if stream:
+        return StreamingResponse(await stream_blog(topic, research_data, word_count, style, cache, payment), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    async def run():
+        try:
+            result, cached, shared, report = await generate_blog(topic, research_data, word_count, style, cache)
+            return blog_response(topic, word_count, style, result["choices"][0]["message"]["content"], cached, shared, report, hedging.served_by(result, "openai"))
+        except HTTPException:
+            raise  # admission control sheds with 429 + Retry-After
+        except CacheMiss as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Blog generation failed: {str(e)}")
+
+    if mode == "async":
+        return await jobs.submit(request, response, "blog", run, webhook, payment)
+    return await providers.until_disconnected(request, run())
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,246 @@
+# circuit.py
+# Circuit breakers for flaky upstreams (CoinGecko, the x402 merchant).
+#
+#   with circuit.guard("coingecko"):          # sync or async code alike
+#       r = requests.get(...)
+#       if r.status_code >= 500: r.raise_for_status()   # exceptions inside count as failures
+#   circuit.check("coingecko")                # fail fast before waiting for an admission slot
+#
+# Each breaker keeps the last CIRCUIT_WINDOW_CALLS call outcomes (none older than
+# CIRCUIT_WINDOW_S). Once it has CIRCUIT_MIN_CALLS of them and either the error ratio or
+# the share slower than CIRCUIT_SLOW_S passes its threshold, it opens. Calls still in
+# flight past CIRCUIT_SLOW_S count as slow outcomes already, so a brown-out trips it about
+# CIRCUIT_SLOW_S in rather than one full upstream timeout later. While open, callers get
+# CircuitOpen (503 + Retry-After) at once, or serve stale data if they have some. After
+# CIRCUIT_OPEN_S it goes half-open and lets CIRCUIT_PROBES calls through; if they succeed
+# it closes, if one fails (or is slow) it opens again for twice as long (up to
+# CIRCUIT_OPEN_MAX_S).
+#
+# Env per upstream: CIRCUIT_<SETTING>_<NAME>, e.g. CIRCUIT_SLOW_S_MERCHANT=1.5.
+# Breakers are per process and thread-safe (the OHLCV service calls CoinGecko from threads).
+
+from __future__ import annotations
+
+import itertools
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+@dataclass
+class BreakerConfig:
+    window_calls: int
+    window_s: float
+    min_calls: int
+    failure_ratio: float
+    slow_s: float
+    slow_ratio: float
+    open_s: float
+    open_max_s: float
+    probes: int
+
+
+def _config(name: str, window_calls: int, window_s: float, min_calls: int, failure_ratio: float, slow_s: float, slow_ratio: float,
+            open_s: float, open_max_s: float, probes: int) -> BreakerConfig:
+    env = name.upper()
+    get = lambda key, default: os.getenv(f"CIRCUIT_{key}_{env}", default)  # noqa: E731
+    return BreakerConfig(
+        window_calls=int(get("WINDOW_CALLS", window_calls)),
+        window_s=float(get("WINDOW_S", window_s)),
+        min_calls=int(get("MIN_CALLS", min_calls)),
+        failure_ratio=float(get("FAILURE_RATIO", failure_ratio)),
+        slow_s=float(get("SLOW_S", slow_s)),
+        slow_ratio=float(get("SLOW_RATIO", slow_ratio)),
+        open_s=float(get("OPEN_S", open_s)),
+        open_max_s=float(get("OPEN_MAX_S", open_max_s)),
+        probes=int(get("PROBES", probes)),
+    )
+
+
+BREAKERS: Dict[str, BreakerConfig] = {
+    "coingecko": _config("coingecko", 10, 60, 5, 0.5, 5.0, 0.5, 15, 120, 1),
+    "merchant": _config("merchant", 20, 30, 10, 0.5, 2.0, 0.5, 5, 60, 2),
+}
+
+
+class CircuitOpen(HTTPException):
+    """Refused without calling the upstream; rendered as 503 with Retry-After."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(
+            status_code=503,
+            detail=f"{name} is unavailable (circuit open); retry later",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+        self.name = name
+        self.retry_after = retry_after
+
+
+class Breaker:
+    def __init__(self, name: str, cfg: BreakerConfig):
+        self.name = name
+        self.cfg = cfg
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.calls: Deque[Tuple[float, bool, float]] = deque(maxlen=cfg.window_calls)  # (finished_at, ok, seconds)
+        self.in_flight: Dict[int, float] = {}  # id -> started_at, for calls still waiting on the upstream
+        self.ids = itertools.count()
+        self.opened_at = 0.0
+        self.open_for = cfg.open_s
+        self.probes_out = 0
+        self.probes_ok = 0
+        self.last_error: Optional[str] = None
+        self.stats = {"calls": 0, "failures": 0, "slow": 0, "rejected": 0, "opened": 0}
+
+    def _trim(self, now: float) -> None:
+        while self.calls and self.calls[0][0] < now - self.cfg.window_s:
+            self.calls.popleft()
+
+    def _open(self, now: float, backoff: bool) -> None:
+        self.open_for = min(self.open_for * 2, self.cfg.open_max_s) if backoff else self.cfg.open_s
+        self.state, self.opened_at = OPEN, now
+        self.probes_out = self.probes_ok = 0
+        self.calls.clear()
+        self.stats["opened"] += 1
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.open_for - time.monotonic())
+
+    def _tripped(self, now: float) -> bool:
+        overdue = min(self.cfg.window_calls, sum(1 for t in self.in_flight.values() if now - t >= self.cfg.slow_s))
+        recent = list(self.calls)[overdue:]  # they are the newest outcomes, so they displace the oldest
+        n = len(recent) + overdue
+        if n < self.cfg.min_calls:
+            return False
+        failures = sum(1 for _, ok, _ in recent if not ok)
+        slow = overdue + sum(1 for _, _, s in recent if s >= self.cfg.slow_s)
+        return failures / n >= self.cfg.failure_ratio or slow / n >= self.cfg.slow_ratio
+
+    def before(self) -> bool:
+        """Admit one call or raise CircuitOpen; True if the call is a half-open probe."""
+        with self.lock:
+            now = time.monotonic()
+            if self.state == OPEN and now >= self.opened_at + self.open_for:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                self._trim(now)
+                if not self._tripped(now):
+                    return False
+                self._open(now, backoff=False)
+            if self.state == HALF_OPEN and self.probes_out < self.cfg.probes:
+                self.probes_out += 1
+                return True
+            self.stats["rejected"] += 1
+            raise CircuitOpen(self.name, self.retry_after() or self.open_for)
+
+    def check(self) -> None:
+        """Raise CircuitOpen if a call would be refused now, without taking a probe slot."""
+        with self.lock:
+            now = time.monotonic()
+            if self.state == OPEN and now < self.opened_at + self.open_for:
+                self.stats["rejected"] += 1
+                raise CircuitOpen(self.name, self.retry_after())
+            if self.state == HALF_OPEN and self.probes_out >= self.cfg.probes:
+                self.stats["rejected"] += 1
+                raise CircuitOpen(self.name, self.open_for)
+
+    def after(self, probe: bool, ok: bool, seconds: float, error: Optional[str] = None) -> None:
+        with self.lock:
+            now = time.monotonic()
+            slow = seconds >= self.cfg.slow_s
+            self.stats["calls"] += 1
+            self.stats["failures"] += not ok
+            self.stats["slow"] += slow
+            if not ok:
+                self.last_error = error
+            if probe:
+                if self.state != HALF_OPEN:
+                    return
+                if not ok or slow:
+                    self._open(now, backoff=True)
+                    return
+                self.probes_ok += 1
+                if self.probes_ok >= self.cfg.probes:
+                    self.state, self.open_for = CLOSED, self.cfg.open_s
+                    self.calls.clear()
+                return
+            if self.state != CLOSED:
+                return
+            self.calls.append((now, ok, seconds))
+            self._trim(now)
+            if self._tripped(now):
+                self._open(now, backoff=False)
+
+    def release(self, probe: bool) -> None:
+        """A call that ended without an outcome (cancelled): give its probe slot back."""
+        if probe:
+            with self.lock:
+                if self.state == HALF_OPEN:
+                    self.probes_out -= 1
+
+    def _finish(self, call_id: int) -> None:
+        with self.lock:
+            self.in_flight.pop(call_id, None)
+
+    @contextmanager
+    def guard(self):
+        probe = self.before()
+        with self.lock:  # _tripped iterates in_flight under the lock, from other threads too
+            call_id = next(self.ids)
+            start = self.in_flight[call_id] = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self._finish(call_id)
+            self.after(probe, False, time.monotonic() - start, f"{type(e).__name__}: {e}")
+            raise
+        except BaseException:
+            self._finish(call_id)
+            self.release(probe)
+            raise
+        self._finish(call_id)
+        self.after(probe, True, time.monotonic() - start)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            now = time.monotonic()
+            if self.state == OPEN and now >= self.opened_at + self.open_for:
+                self.state = HALF_OPEN
+            self._trim(now)
+            durations = sorted(s for _, _, s in self.calls)
+            return dict(
+                self.stats,
+                state=self.state,
+                window_calls=len(self.calls),
+                in_flight=len(self.in_flight),
+                window_failures=sum(1 for _, ok, _ in self.calls if not ok),
+                window_p95_s=round(durations[int(len(durations) * 0.95)], 3) if durations else None,
+                retry_after_s=round(self.retry_after(), 1) if self.state == OPEN else None,
+                last_error=self.last_error,
+            )
+
+
+breakers: Dict[str, Breaker] = {name: Breaker(name, cfg) for name, cfg in BREAKERS.items()}
+
+
+def guard(name: str):
+    """Context manager running one call to upstream `name` through its breaker."""
+    return breakers[name].guard()
+
+
+def check(name: str) -> None:
+    """Fail fast before queueing for anything else (e.g. an admission slot) if `name` is open."""
+    breakers[name].check()
+
+
+def snapshot() -> Dict[str, Any]:
+    return {name: b.snapshot() for name, b in breakers.items()}
@@ -0,0 +1,70 @@
+# compact_route.py
+# Slim JSON encoding of a Jupiter best route, emitted by the swap agent with --slim.
+#
+# Slim "route" object:
+#   {"swapMode": "ExactIn",
+#    "mints": ["So111...", "EPjF...", ...],          # each mint once, first-seen order
+#    "hops": [[label, ammKey, inIdx, outIdx, inAtoms, outAtoms, feeAtoms, percent], ...]}
+# inIdx/outIdx index into "mints"; all amounts are integer atoms.
+#
+# slim_route() builds this in one pass over routePlan, with no intermediate objects. Mints
+# and labels are interned, so results held in memory (batch responses, callers caching
+# routes) share one copy of each instead of one per hop.
+
+from __future__ import annotations
+
+import json
+import sys
+from typing import Any, Dict, List
+
+try:
+    import orjson  # in requirements.txt; stdlib json is the fallback
+except ImportError:  # pragma: no cover - depends on environment
+    orjson = None
+
+HOP_FIELDS = ("label", "ammKey", "inIdx", "outIdx", "inAmount", "outAmount", "feeAmount", "percent")
+
+_intern = sys.intern
+
+
+def _atoms(x: Any) -> int:
+    try:
+        return int(x) if x is not None else 0
+    except (TypeError, ValueError):
+        return 0
+
+
+def slim_route(best: Dict[str, Any]) -> Dict[str, Any]:
+    """Slim "route" object (see module header for the layout) for a raw Jupiter best route."""
+    mints: List[str] = []
+    index: Dict[str, int] = {}
+
+    def idx(m: Any) -> int:
+        m = _intern(m or "")
+        i = index.get(m)
+        if i is None:
+            i = index[m] = len(mints)
+            mints.append(m)
+        return i
+
+    hops = []
+    for leg in best.get("routePlan") or ():
+        info = leg.get("swapInfo") or {}
+        hops.append([
+            _intern(info.get("label") or ""),
+            info.get("ammKey") or "",
+            idx(info.get("inputMint")),
+            idx(info.get("outputMint")),
+            _atoms(info.get("inAmount")),
+            _atoms(info.get("outAmount")),
+            _atoms(info.get("feeAmount")),
+            _atoms(leg.get("percent")),
+        ])
+    return {"swapMode": _intern(best.get("swapMode") or "ExactIn"), "mints": mints, "hops": hops}
+
+
+def encode(obj: Any) -> bytes:
+    """Compact JSON bytes, via orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, check_circular=False).encode()
@@ -0,0 +1,319 @@
+from fastapi import FastAPI, Request, Response, HTTPException, Depends
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from datetime import datetime, timezone
+import asyncio
+import time
+import os
+
+import admission
+import providers
+import hedging
+import metrics
+import profiler
+import research_agent
+import blog_agent
+import tweet_agent
+import script_agent
+import image_agent
+import x402
+
+from llm_cache import CacheMiss, POLICIES
+from llm_stream import sse
+
+app = FastAPI(title="Content Pipeline API", version="1.0")
+metrics.install(app)
+profiler.install(app)
+x402.install(app)
+providers.install(app)
+
+# ---------------------------------------------------------------------
+# Authentication setup
+# ---------------------------------------------------------------------
+security = HTTPBearer()
+API_KEY = os.getenv("API_KEY", "pipeline-agent-secret-key-2024")
+
+def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Verify the bearer token"""
+    if credentials.credentials != API_KEY:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    return credentials.credentials
+
+# ---------------------------------------------------------------------
+# CORS setup
+# ---------------------------------------------------------------------
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# ---------------------------------------------------------------------
+# Config
+# ---------------------------------------------------------------------
+# Per-stage timeouts in seconds; a request may lower or raise them via "timeouts".
+DEFAULT_TIMEOUTS = {
+    "research": float(os.getenv("PIPELINE_TIMEOUT_RESEARCH", "45")),
+    "blog": float(os.getenv("PIPELINE_TIMEOUT_BLOG", "90")),
+    "tweet": float(os.getenv("PIPELINE_TIMEOUT_TWEET", "45")),
+    "script": float(os.getenv("PIPELINE_TIMEOUT_SCRIPT", "90")),
+    "image": float(os.getenv("PIPELINE_TIMEOUT_IMAGE", "90")),
+}
+FAN_OUT = ("blog", "tweet", "script", "image")
+MAX_TIMEOUT = 300
+# A campaign costs what its stages would cost bought one by one (<AGENT>_PRICE_USD, all 0 by
+# default), so the paywalled agents cannot be had for free through /campaign.
+AGENTS = {"research": research_agent, "blog": blog_agent, "tweet": tweet_agent, "script": script_agent, "image": image_agent}
+
+# ---------------------------------------------------------------------
+# Stages
+# ---------------------------------------------------------------------
+# Each stage takes (topic, research_text, options, cache) and returns the same body the
+# stand-alone agent endpoint returns, so clients can reuse their existing parsers.
+async def run_research(topic: str, opts: dict, cache: str):
+    query = opts.get("query") or topic
+    max_tokens = int(opts.get("max_tokens", 1000))
+    result, cached, shared = await research_agent.call_perplexity(query, max_tokens, cache)
+    provider = hedging.served_by(result, "perplexity")
+    return {
+        "query": query,
+        "max_tokens": max_tokens,
+        "result": result,
+        "source": hedging.label(provider),
+        "provider": provider,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "cached": cached,
+        "coalesced": shared,
+        "cost_usd": 0.0 if cached or shared else research_agent.COST_USD
+    }
+
+async def run_blog(topic: str, research_text: str, opts: dict, cache: str):
+    word_count = int(opts.get("word_count", 1500))
+    style = opts.get("style", "Indian Market Copywriter")
+    result, cached, shared, report = await blog_agent.generate_blog(topic, research_text, word_count, style, cache)
+    return blog_agent.blog_response(topic, word_count, style, result["choices"][0]["message"]["content"], cached, shared, report, hedging.served_by(result, "openai"))
+
+async def run_tweet(topic: str, research_text: str, opts: dict, cache: str):
+    post_count = int(opts.get("post_count", 10))
+    result, cached, shared, report = await tweet_agent.generate_tweet_thread(topic, research_text, post_count, cache)
+    return tweet_agent.tweet_response(topic, post_count, result["content"][0]["text"], cached, shared, report, hedging.served_by(result, "anthropic"))
+
+async def run_script(topic: str, research_text: str, opts: dict, cache: str):
+    duration = int(opts.get("duration", 60))
+    style = opts.get("style", "educational")
+    result, cached, shared, report = await script_agent.generate_video_script(topic, duration, style, research_text, cache)
+    script_content = result["candidates"][0]["content"]["parts"][0]["text"]
+    return script_agent.script_response(topic, duration, style, script_content, cached, shared, report, hedging.served_by(result, "gemini"))
+
+async def run_image(topic: str, research_text: str, opts: dict, cache: str):
+    # Images are prompted from the topic only; the research text would blow the prompt limit.
+    prompt = opts.get("prompt") or topic
+    count = int(opts.get("count", 1))
+    size = opts.get("size", "1024x1024")
+    style = opts.get("style", "professional")
+    result, shared = await image_agent.generate_images(prompt, count, size, style)
+    return {
+        "prompt": prompt,
+        "count": count,
+        "size": size,
+        "style": style,
+        "model": "dalle",
+        "images": result.get("data", []),
+        "errors": result.get("errors", []),
+        "source": "DALL-E 3",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "from_store": result.get("from_store", 0),
+        "coalesced": shared,
+        "cost_usd": 0.0 if shared or result.get("from_store", 0) == count else image_agent.COST_USD
+    }
+
+STAGES = {"blog": run_blog, "tweet": run_tweet, "script": run_script, "image": run_image}
+
+
+def research_text(body: dict) -> str:
+    try:
+        return body["result"]["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        return ""
+
+
+async def _timed(name: str, work, timeout: float):
+    """Run one stage; never raises, so a failed stage cannot sink its siblings."""
+    started = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(work, timeout)
+        outcome = {"stage": name, "status": "ok", "result": result}
+    except asyncio.TimeoutError:
+        outcome = {"stage": name, "status": "timeout", "error": f"{name} exceeded {timeout:g}s"}
+    except CacheMiss as e:
+        outcome = {"stage": name, "status": "error", "error": str(e)}
+    except Exception as e:
+        outcome = {"stage": name, "status": "error", "error": f"{name} failed: {e}"}
+    outcome["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return outcome
+
+
+async def run_campaign(plan: dict):
+    """Yield stage outcomes as they finish: research first, then the fan-out in completion order."""
+    topic, cache, timeouts = plan["topic"], plan["cache"], plan["timeouts"]
+
+    research = await _timed("research", run_research(topic, plan["options"].get("research", {}), cache), timeouts["research"])
+    yield research
+    if research["status"] != "ok":
+        if not plan["continue_without_research"]:
+            return
+        text = ""
+    else:
+        text = research_text(research["result"])
+
+    tasks = [
+        asyncio.ensure_future(
+            _timed(name, STAGES[name](topic, text, plan["options"].get(name, {}), cache), timeouts[name])
+        )
+        for name in plan["stages"]
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for t in tasks:
+            t.cancel()
+
+
+# Integer stage options, checked up front so a bad value is a 400 rather than a failed stage.
+INT_OPTIONS = {"research": ("max_tokens",), "blog": ("word_count",), "tweet": ("post_count",), "script": ("duration",), "image": ("count",)}
+
+
+def parse_options(raw) -> dict:
+    if not isinstance(raw, dict) or not all(isinstance(v, dict) for v in raw.values()):
+        raise HTTPException(status_code=400, detail="options must map stage names to objects")
+    options = {name: dict(opts) for name, opts in raw.items()}
+    for name, keys in INT_OPTIONS.items():
+        for key in keys:
+            if key not in options.get(name, {}):
+                continue
+            value = options[name][key]
+            try:
+                if isinstance(value, bool) or not isinstance(value, (int, str)):
+                    raise ValueError
+                options[name][key] = int(value)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"options.{name}.{key} must be an integer")
+    count = options.get("image", {}).get("count", 1)
+    if not 1 <= count <= image_agent.MAX_COUNT:
+        raise HTTPException(status_code=400, detail=f"options.image.count must be between 1 and {image_agent.MAX_COUNT}")
+    return options
+
+
+def parse_plan(payload: dict) -> dict:
+    p = payload or {}
+    topic = p.get("topic")
+    if not topic:
+        raise HTTPException(status_code=400, detail="topic is required")
+    cache = p.get("cache", "prefer")
+    if cache not in POLICIES:
+        raise HTTPException(status_code=400, detail=f"cache must be one of {', '.join(POLICIES)}")
+    stages = p.get("stages") or list(FAN_OUT)
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"unknown stages: {', '.join(unknown)}; choose from {', '.join(FAN_OUT)}")
+    timeouts = dict(DEFAULT_TIMEOUTS)
+    for name, value in (p.get("timeouts") or {}).items():
+        if name not in timeouts:
+            raise HTTPException(status_code=400, detail=f"unknown stage in timeouts: {name}")
+        timeouts[name] = min(max(float(value), 0.1), MAX_TIMEOUT)
+    return {
+        "topic": topic,
+        "cache": cache,
+        "stages": list(dict.fromkeys(stages)),
+        "timeouts": timeouts,
+        "options": parse_options(p.get("options") or {}),
+        "continue_without_research": bool(p.get("continue_without_research", False)),
+    }
+
+
+def plan_price(plan: dict) -> float:
+    return round(sum(AGENTS[s].PRICE_USD for s in ["research", *plan["stages"]]), 6)
+
+
+def plan_cost(plan: dict) -> float:
+    return sum(AGENTS[s].COST_USD for s in ["research", *plan["stages"]])
+
+
+def summarize(plan: dict, outcomes: list, elapsed_ms: float):
+    stages = {o["stage"]: o for o in outcomes}
+    ok = [o for o in outcomes if o["status"] == "ok"]
+    return {
+        "topic": plan["topic"],
+        "status": "complete" if len(ok) == len(plan["stages"]) + 1 else ("partial" if ok else "failed"),
+        "stages": stages,
+        "elapsed_ms": round(elapsed_ms, 1),
+        "stage_ms_sum": round(sum(o["elapsed_ms"] for o in outcomes), 1),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "cost_usd": round(sum(o["result"].get("cost_usd", 0.0) for o in ok), 2),
+    }
+
+# ---------------------------------------------------------------------
+# Endpoints
+# ---------------------------------------------------------------------
+@app.on_event("shutdown")
+async def close_provider_clients():
+    await providers.aclose_all()
+
+@app.get("/health")
+def health_check():
+    """Health check endpoint (no authentication required)"""
+    return {
+        "status": "healthy",
+        "service": "Content Pipeline API",
+        "version": "1.0",
+        "stages": ["research", *FAN_OUT],
+        "timeouts": DEFAULT_TIMEOUTS,
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+
+@app.post("/campaign")
+async def campaign(request: Request, response: Response, payload: dict, token: str = Depends(verify_token)):
+    """
+    Research once, then generate blog / tweet thread / script / images concurrently.
+    Body: {"topic", "stages"?: [...], "cache"?, "timeouts"?: {stage: s}, "options"?: {stage: {...}},
+           "continue_without_research"?: bool, "stream"?: bool}
+    Failed or timed-out stages are reported per stage; the rest still complete ("status": "partial").
+    With "stream": true the response is SSE: one `stage` event per finished stage, then `done`.
+    Priced at the sum of its stages' agent prices (x402), ranked by their summed cost for admission.
+    """
+    plan = parse_plan(payload)
+    admission.set_priority(request, plan_cost(plan))
+    payment = await x402.authorize(request, plan_price(plan), f"Content campaign: {', '.join(['research', *plan['stages']])}")
+    started = time.perf_counter()
+
+    if payload.get("stream"):
+        async def events():
+            outcomes = []
+            yield sse("start", {"topic": plan["topic"], "stages": ["research", *plan["stages"]]})
+            async for outcome in run_campaign(plan):
+                outcomes.append(outcome)
+                yield sse("stage", outcome)
+            yield sse("done", summarize(plan, outcomes, (time.perf_counter() - started) * 1000))
+
+        stream = StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+        x402.apply_headers(stream, payment)
+        return stream
+
+    async def collect():
+        return [o async for o in run_campaign(plan)]
+
+    try:
+        outcomes = await providers.until_disconnected(request, collect())
+    except BaseException:
+        await x402.release(payment)  # nothing delivered; the client may resend the proof
+        raise
+    x402.apply_headers(response, payment)
+    return summarize(plan, outcomes, (time.perf_counter() - started) * 1000)
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8007)
@@ -0,0 +1,100 @@
+# gateway.py
+# Single-process gateway: every api-services app mounted under a path prefix on one event loop.
+#
+#     python app/gateway.py                          # :8080
+#     uvicorn gateway:app --app-dir app --port 8080
+#
+#     /ohlcv/...     main.py              /image/...     image_agent.py
+#     /research/...  research_agent.py    /script/...    script_agent.py
+#     /blog/...      blog_agent.py        /swap/...      swap_service.py
+#     /tweet/...     tweet_agent.py       /pipeline/...  content_pipeline.py
+#     /links/...     link_shortner.py
+#
+# Mounted apps keep their own routes, auth and paywalls; what they share here is everything
+# that lives at module level: the provider HTTP pools (providers.py), the response cache,
+# single-flight table, image and link stores, the x402 spent-proof guard, and one import of
+# FastAPI/pydantic. The per-service entry points (python app/blog_agent.py, start_services.py)
+# are unchanged.
+
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+import os
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+
+# Stored images are linked as <IMAGE_PUBLIC_BASE>/images/<sha>; here they live under /image.
+os.environ.setdefault("IMAGE_PUBLIC_BASE", "/image")
+
+import main
+import research_agent
+import blog_agent
+import tweet_agent
+import image_agent
+import script_agent
+import swap_service
+import content_pipeline
+import link_shortner
+import metrics
+import profiler
+
+MOUNTS = {
+    "/ohlcv": main.app,
+    "/research": research_agent.app,
+    "/blog": blog_agent.app,
+    "/tweet": tweet_agent.app,
+    "/image": image_agent.app,
+    "/script": script_agent.app,
+    "/swap": swap_service.app,
+    "/pipeline": content_pipeline.app,
+    "/links": link_shortner.app,
+}
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    # Starlette does not run lifespan events for mounted apps; run each one's handlers here.
+    for sub in MOUNTS.values():
+        await sub.router.startup()
+    try:
+        yield
+    finally:
+        for sub in MOUNTS.values():
+            await sub.router.shutdown()
+
+
+app = FastAPI(title="API Services Gateway", version="1.0", lifespan=lifespan)
+# One /metrics and /admin/* for the whole process; requests are recorded by the mounted apps.
+metrics.install(app, requests=False)
+profiler.install(app, requests=False)
+
+# ---------------------------------------------------------------------
+# CORS setup (answered here once; the mounted apps' own middleware stays for standalone use)
+# ---------------------------------------------------------------------
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+for prefix, sub in MOUNTS.items():
+    app.mount(prefix, sub)
+
+
+@app.get("/health")
+def health_check():
+    """Gateway health; each mounted app also serves <prefix>/health"""
+    return {
+        "status": "healthy",
+        "service": "API Services Gateway",
+        "version": "1.0",
+        "mounts": {prefix: sub.title for prefix, sub in MOUNTS.items()},
+        "pid": os.getpid(),
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("GATEWAY_PORT", "8080")))
@@ -0,0 +1,338 @@
+# hedging.py
+# Hedged requests and failover across LLM providers for the content agents.
+#
+#   result = await hedging.call("blog", hedging.Target("openai", OPENAI_BASE, headers, data), TIMEOUT)
+#   served_by = hedging.served_by(result, "openai")
+#   async for text in hedging.stream("blog", target, openai_text, TIMEOUT): ...
+#
+# With HEDGE_<AGENT> unset (the default) this is a plain call to the agent's own provider.
+# With HEDGE_BLOG=anthropic,gemini the prompt is also translated for those providers and:
+#   - if the primary has not answered (or, streaming, sent its first token) by its hedge
+#     deadline, the next provider is started too and whichever finishes first wins; the
+#     loser is cancelled
+#   - if a provider fails outright (HTTP error, 429 from admission control, ...) the next
+#     one is started at once
+# The hedge deadline is the HEDGE_PERCENTILE (default p95) of that provider's recent
+# latencies (full response or time to first token, kept separately), so only the slow
+# tail gets hedged: about (100 - percentile)% of calls pay for a second request.
+# Until a provider has HEDGE_MIN_SAMPLES observations HEDGE_DEFAULT_S is used.
+# An attempt cancelled after its deadline (it lost the race) still counts, with the time it
+# had run so far: a lower bound, but one in the tail, so slow attempts cannot drop out of the
+# window and drag the deadline down. Attempts cancelled earlier say nothing about the tail.
+#
+# Results keep the primary provider's response shape, so caching and parsing in the agents
+# do not change; a response produced by another provider carries "served_by".
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+
+import providers
+from prompting import output_limit
+from llm_stream import anthropic_text, gemini_text, openai_text, post_stream
+
+PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+DEFAULT_S = float(os.getenv("HEDGE_DEFAULT_S", "8"))
+MIN_S = float(os.getenv("HEDGE_MIN_S", "0.25"))
+WINDOW = 512
+
+# Same env as the agents, so a stand-in (bench/llm_standin.py) serves the alternates too.
+OPENAI_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1").rstrip("/") + "/chat/completions"
+ANTHROPIC_BASE = os.getenv("ANTHROPIC_API_BASE", "https://api.anthropic.com/v1").rstrip("/") + "/messages"
+GEMINI_MODEL_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta").rstrip("/") + "/models"
+PERPLEXITY_BASE = os.getenv("PERPLEXITY_API_BASE", "https://api.perplexity.ai").rstrip("/") + "/chat/completions"
+
+MODELS = {
+    "openai": os.getenv("HEDGE_MODEL_OPENAI", "gpt-4o"),
+    "anthropic": os.getenv("HEDGE_MODEL_ANTHROPIC", "claude-3-5-sonnet-20241022"),
+    "gemini": os.getenv("HEDGE_MODEL_GEMINI", "gemini-1.5-pro"),
+    "perplexity": os.getenv("HEDGE_MODEL_PERPLEXITY", "llama-3.1-sonar-small-128k-online"),
+}
+LABELS = {
+    "openai": "OpenAI GPT-4",
+    "anthropic": "Claude 3.5 Sonnet",
+    "gemini": "Gemini 1.5 Pro",
+    "perplexity": "Perplexity",
+}
+PARSERS = {"openai": openai_text, "anthropic": anthropic_text, "gemini": gemini_text, "perplexity": openai_text}
+
+
+def alternates(agent: str) -> List[str]:
+    return [p.strip() for p in os.getenv(f"HEDGE_{agent.upper()}", "").split(",") if p.strip() in MODELS]
+
+
+@dataclass
+class Target:
+    provider: str
+    url: str
+    headers: Dict[str, str]
+    body: Dict[str, Any]
+    stream_url: Optional[str] = None  # defaults to `url` with "stream": true in the body
+
+
+@dataclass
+class Prompt:
+    system: str
+    user: str
+    max_tokens: int
+    temperature: Optional[float]
+
+
+# ---------------------------------------------------------------------
+# Prompt translation between provider request / response shapes
+# ---------------------------------------------------------------------
+def prompt_of(target: Target) -> Prompt:
+    body = target.body
+    if target.provider == "gemini":
+        cfg = body.get("generationConfig") or {}
+        text = "".join(p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", []))
+        return Prompt("", text, cfg.get("maxOutputTokens", 1024), cfg.get("temperature"))
+    messages = body.get("messages", [])
+    system = body.get("system") or "\n\n".join(m["content"] for m in messages if m.get("role") == "system")
+    user = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    return Prompt(system, user, body.get("max_tokens", 1024), body.get("temperature"))
+
+
+def target_for(provider: str, prompt: Prompt) -> Target:
+    model = MODELS[provider]
+    # The primary's budget may exceed what the alternate model accepts (gpt-4o allows 16384).
+    prompt = Prompt(prompt.system, prompt.user, min(prompt.max_tokens, output_limit(model)), prompt.temperature)
+    if provider == "anthropic":
+        body = {"model": model, "max_tokens": prompt.max_tokens, "messages": [{"role": "user", "content": prompt.user}]}
+        if prompt.system:
+            body["system"] = prompt.system
+        if prompt.temperature is not None:
+            body["temperature"] = prompt.temperature
+        headers = {
+            "x-api-key": os.getenv("ANTHROPIC_API_KEY", "your-anthropic-api-key"),
+            "Content-Type": "application/json",
+            "anthropic-version": "2023-06-01",
+        }
+        return Target(provider, ANTHROPIC_BASE, headers, body)
+    if provider == "gemini":
+        text = f"{prompt.system}\n\n{prompt.user}" if prompt.system else prompt.user
+        cfg = {"maxOutputTokens": prompt.max_tokens}
+        if prompt.temperature is not None:
+            cfg["temperature"] = prompt.temperature
+        key = os.getenv("GOOGLE_API_KEY", "your-google-api-key")
+        return Target(
+            provider,
+            f"{GEMINI_MODEL_BASE}/{model}:generateContent?key={key}",
+            {"Content-Type": "application/json"},
+            {"contents": [{"parts": [{"text": text}]}], "generationConfig": cfg},
+            stream_url=f"{GEMINI_MODEL_BASE}/{model}:streamGenerateContent?alt=sse&key={key}",
+        )
+    # OpenAI-compatible chat completions (openai, perplexity)
+    messages = ([{"role": "system", "content": prompt.system}] if prompt.system else []) + [{"role": "user", "content": prompt.user}]
+    body = {"model": model, "messages": messages, "max_tokens": prompt.max_tokens}
+    if prompt.temperature is not None:
+        body["temperature"] = prompt.temperature
+    key = os.getenv("OPENAI_API_KEY", "your-openai-api-key") if provider == "openai" else os.getenv("PERPLEXITY_API_KEY", "your-perplexity-api-key")
+    url = OPENAI_BASE if provider == "openai" else PERPLEXITY_BASE
+    return Target(provider, url, {"Authorization": f"Bearer {key}", "Content-Type": "application/json"}, body)
+
+
+def text_of(provider: str, result: Dict[str, Any]) -> str:
+    if provider == "anthropic":
+        return "".join(block.get("text", "") for block in result.get("content", []))
+    if provider == "gemini":
+        return "".join(p.get("text", "") for c in result.get("candidates", [])[:1] for p in c["content"]["parts"])
+    return result["choices"][0]["message"]["content"]
+
+
+def shaped(provider: str, text: str) -> Dict[str, Any]:
+    """A minimal `provider`-style response body carrying `text`."""
+    if provider == "anthropic":
+        return {"content": [{"type": "text", "text": text}]}
+    if provider == "gemini":
+        return {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+    return {"choices": [{"message": {"content": text}}]}
+
+
+def served_by(result: Dict[str, Any], primary: str) -> str:
+    return result.get("served_by", primary)
+
+
+def label(provider: str) -> str:
+    return LABELS.get(provider, provider)
+
+
+# ---------------------------------------------------------------------
+# Latency tracking
+# ---------------------------------------------------------------------
+class Latencies:
+    """Recent latencies per (provider, kind); kind is "response" or "first_token"."""
+
+    def __init__(self, window: int = WINDOW):
+        self.window = window
+        self.samples: Dict[Tuple[str, str], Deque[float]] = {}
+
+    def observe(self, provider: str, kind: str, seconds: float) -> None:
+        self.samples.setdefault((provider, kind), deque(maxlen=self.window)).append(seconds)
+
+    def observe_cancelled(self, provider: str, kind: str, seconds: float) -> None:
+        """An attempt abandoned after `seconds`; recorded only once it was past the deadline."""
+        if seconds >= self.deadline(provider, kind):
+            self.observe(provider, kind, seconds)
+
+    def quantile(self, provider: str, kind: str, q: float) -> Optional[float]:
+        xs = self.samples.get((provider, kind))
+        if not xs:
+            return None
+        xs = sorted(xs)
+        return xs[min(len(xs) - 1, int(len(xs) * q / 100))]
+
+    def deadline(self, provider: str, kind: str) -> float:
+        xs = self.samples.get((provider, kind))
+        if not xs or len(xs) < MIN_SAMPLES:
+            return DEFAULT_S
+        return max(MIN_S, self.quantile(provider, kind, PERCENTILE))
+
+    def snapshot(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for (provider, kind), xs in self.samples.items():
+            out.setdefault(provider, {})[kind] = {
+                "n": len(xs),
+                "p50_s": round(self.quantile(provider, kind, 50), 3),
+                "p95_s": round(self.quantile(provider, kind, 95), 3),
+                "p99_s": round(self.quantile(provider, kind, 99), 3),
+                "hedge_after_s": round(self.deadline(provider, kind), 3),
+            }
+        return out
+
+
+latencies = Latencies()
+stats: Dict[str, Dict[str, Any]] = {}
+
+
+def _stats(agent: str) -> Dict[str, Any]:
+    return stats.setdefault(agent, {"calls": 0, "hedged": 0, "failovers": 0, "won_by": {}})
+
+
+# ---------------------------------------------------------------------
+# Hedged call / stream
+# ---------------------------------------------------------------------
+async def _timed_post(target: Target, timeout: Optional[float]) -> Dict[str, Any]:
+    start = time.monotonic()
+    try:
+        result = await providers.post_json(target.provider, target.url, target.headers, target.body, timeout)
+    except asyncio.CancelledError:
+        latencies.observe_cancelled(target.provider, "response", time.monotonic() - start)
+        raise
+    latencies.observe(target.provider, "response", time.monotonic() - start)
+    return result
+
+
+async def _race(agent: str, targets: List[Target], launch: Callable[[Target], "asyncio.Future"], kind: str):
+    """Start targets[0], add the next one on its hedge deadline or on failure; first success wins."""
+    st = _stats(agent)
+    st["calls"] += 1
+    running: Dict[asyncio.Future, Target] = {}
+    nxt, error = 0, None
+
+    def start_next():
+        nonlocal nxt
+        task = launch(targets[nxt])
+        running[task] = targets[nxt]
+        nxt += 1
+
+    start_next()
+    try:
+        while running:
+            timeout = latencies.deadline(targets[nxt - 1].provider, kind) if nxt < len(targets) else None
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                st["hedged"] += 1
+                start_next()
+                continue
+            for task in done:
+                target = running.pop(task)
+                if task.exception() is None:
+                    st["won_by"][target.provider] = st["won_by"].get(target.provider, 0) + 1
+                    return target, task.result()
+                error = task.exception()
+            if nxt < len(targets):
+                st["failovers"] += 1
+                start_next()
+        raise error
+    finally:
+        for task in running:
+            task.cancel()
+
+
+async def call(agent: str, primary: Target, timeout: Optional[float] = None) -> Dict[str, Any]:
+    """The primary's response, or another provider's answer in the primary's response shape."""
+    names = alternates(agent)
+    if not names:
+        return await _timed_post(primary, timeout)
+    prompt = prompt_of(primary)
+    targets = [primary] + [target_for(p, prompt) for p in names if p != primary.provider]
+    target, result = await _race(agent, targets, lambda t: asyncio.ensure_future(_timed_post(t, timeout)), "response")
+    if target is primary:
+        return result
+    return dict(shaped(primary.provider, text_of(target.provider, result)), served_by=target.provider)
+
+
+async def _first_token(target: Target, timeout: Optional[float]) -> Tuple[AsyncIterator[str], str]:
+    """Open `target`'s stream and wait for its first text chunk."""
+    url = target.stream_url or target.url
+    body = target.body if target.stream_url else dict(target.body, stream=True)
+    start = time.monotonic()
+    chunks = post_stream(target.provider, url, target.headers, body, PARSERS[target.provider], timeout).__aiter__()
+    try:
+        first = await chunks.__anext__()
+    except BaseException as e:
+        if isinstance(e, asyncio.CancelledError):
+            latencies.observe_cancelled(target.provider, "first_token", time.monotonic() - start)
+        await chunks.aclose()
+        raise
+    latencies.observe(target.provider, "first_token", time.monotonic() - start)
+    return chunks, first
+
+
+async def stream(agent: str, primary: Target, timeout: Optional[float] = None, on_winner: Optional[Callable[[str], None]] = None) -> AsyncIterator[str]:
+    """Text chunks from whichever provider sends a first token first (hedged on time to first token)."""
+    names = alternates(agent)
+    if not names:
+        url = primary.stream_url or primary.url
+        body = primary.body if primary.stream_url else dict(primary.body, stream=True)
+        async for text in post_stream(primary.provider, url, primary.headers, body, PARSERS[primary.provider], timeout):
+            yield text
+        return
+    prompt = prompt_of(primary)
+    targets = [primary] + [target_for(p, prompt) for p in names if p != primary.provider]
+    opened: List[AsyncIterator[str]] = []
+
+    def launch(t: Target):
+        task = asyncio.ensure_future(_first_token(t, timeout))
+        # A loser that got its first token anyway still holds a connection: close it.
+        task.add_done_callback(lambda f: opened.append(f.result()[0]) if not f.cancelled() and f.exception() is None else None)
+        return task
+
+    target, (chunks, first) = await _race(agent, targets, launch, "first_token")
+    for other in opened:
+        if other is not chunks:
+            asyncio.ensure_future(other.aclose())
+    if on_winner is not None:
+        on_winner(target.provider)
+    yield first
+    try:
+        async for text in chunks:
+            yield text
+    finally:
+        await chunks.aclose()
+
+
+def snapshot(agent: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        "alternates": alternates(agent) if agent else None,
+        "percentile": PERCENTILE,
+        "agent": dict(_stats(agent)) if agent else stats,
+        "latency": latencies.snapshot(),
+    }
@@ -1,11 +1,26 @@
-from fastapi import FastAPI, Query, HTTPException, Depends
+from fastapi import FastAPI, Query, Request, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime, timezone
-import requests
+import asyncio
 import os
 
+import providers
+import admission
+import metrics
+import profiler
+import x402
+from jobs import jobs, check_mode
+from image_store import image_store, store_key, parse_range, CONTENT_TYPES
+from singleflight import flights
+
 app = FastAPI(title="Image Agent API", version="1.0")
+metrics.install(app)
+profiler.install(app)
+x402.install(app)
+providers.install(app)
+jobs.install(app)
 
 # ---------------------------------------------------------------------
 # Authentication setup
@@ -34,14 +49,55 @@ app.add_middleware(
 # Config
 # ---------------------------------------------------------------------
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "your-openai-api-key")
-OPENAI_BASE = "https://api.openai.com/v1/images/generations"
+OPENAI_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1").rstrip("/") + "/images/generations"
 TIMEOUT = 60
+COST_USD = 0.70
+# x402 price per call; 0 (the default) leaves the endpoint behind the bearer token only
+PRICE_USD = float(os.getenv("IMAGE_PRICE_USD", "0"))
+# dall-e-3 accepts n=1 only; raise for models that take larger batches (dall-e-2: 10).
+MAX_PER_REQUEST = int(os.getenv("IMAGE_MAX_PER_REQUEST", "1"))
+# Sub-requests in flight per generation; the shared OpenAI pool bounds the total.
+CONCURRENCY = int(os.getenv("IMAGE_CONCURRENCY", "8"))
+MAX_COUNT = int(os.getenv("IMAGE_MAX_COUNT", "32"))
 
 # ---------------------------------------------------------------------
 # Image Generation Functions
 # ---------------------------------------------------------------------
-def generate_images(prompt: str, count: int = 5, size: str = "1024x1024", style: str = "professional"):
-    """Generate images using DALL-E API"""
+def split_count(count: int, per_request: int = MAX_PER_REQUEST):
+    """[4, 4, 2] for count=10, per_request=4"""
+    per_request = max(per_request, 1)
+    return [min(per_request, count - i) for i in range(0, count, per_request)]
+
+async def _fan_out(headers: dict, data: dict, count: int):
+    """Run provider-sized sub-requests concurrently and merge them in order.
+
+    Failed sub-requests are reported in "errors"; only if every one fails is the error raised.
+    """
+    semaphore = asyncio.Semaphore(max(CONCURRENCY, 1))
+
+    async def one(n: int):
+        async with semaphore:
+            return await providers.post_json("openai", OPENAI_BASE, headers, dict(data, n=n), TIMEOUT)
+
+    sizes = split_count(count)
+    results = await asyncio.gather(*(one(n) for n in sizes), return_exceptions=True)
+    images, errors = [], []
+    for i, (n, r) in enumerate(zip(sizes, results)):
+        if isinstance(r, BaseException):
+            if isinstance(r, asyncio.CancelledError):
+                raise r
+            errors.append({"batch": i, "count": n, "error": str(r)})
+        else:
+            images.extend(r.get("data", []))
+    if not images and errors:
+        raise next(r for r in results if isinstance(r, BaseException))
+    return {"data": images, "errors": errors}
+
+async def generate_images(prompt: str, count: int = 5, size: str = "1024x1024", style: str = "professional", fresh: bool = False):
+    """Generate images using DALL-E API, reusing stored images for the same prompt/style/size.
+
+    Returns (response_json, coalesced); response_json["from_store"] is how many images came from disk.
+    """
     headers = {
         # "Authorization": f"Bearer {OPENAI_API_KEY}",
         "Content-Type": "application/json"
@@ -53,15 +109,24 @@ def generate_images(prompt: str, count: int = 5, size: str = "1024x1024", style:
     data = {
         "model": "dall-e-3",
         "prompt": enhanced_prompt,
-        "n": min(count, 4),  # DALL-E 3 max is 4 images
+        "n": count,  # split into MAX_PER_REQUEST-sized sub-requests by _fan_out
         "size": size,
         "quality": "hd",
         "style": "vivid"
     }
     
-    response = requests.post(OPENAI_BASE, headers=headers, json=data, timeout=TIMEOUT)
-    response.raise_for_status()
-    return response.json()
+    key = store_key(data["model"], prompt, style, size)
+
+    async def produce():
+        stored = [] if fresh else image_store.lookup(key)[:count]
+        missing = count - len(stored)
+        if missing == 0:
+            return {"data": stored, "errors": [], "from_store": len(stored)}
+        result = await _fan_out(headers, data, missing)
+        images = await image_store.ingest(key, result["data"])
+        return {"data": stored + images, "errors": result["errors"], "from_store": len(stored)}
+
+    return await flights.do("image", f"{key}:{count}:{fresh}", produce, COST_USD, free=lambda value: value["from_store"] == count)
 
 def generate_stable_diffusion_images(prompt: str, count: int = 5):
     """Generate images using Stable Diffusion (placeholder for external API)"""
@@ -81,6 +146,10 @@ def generate_stable_diffusion_images(prompt: str, count: int = 5):
 # ---------------------------------------------------------------------
 # Endpoints
 # ---------------------------------------------------------------------
+@app.on_event("shutdown")
+async def close_provider_clients():
+    await providers.aclose_all()
+
 @app.get("/health")
 def health_check():
     """Health check endpoint (no authentication required)"""
@@ -88,38 +157,97 @@ def health_check():
         "status": "healthy",
         "service": "Image Agent API",
         "version": "1.0",
+        "coalescing": flights.snapshot("image"),
+        "payments": x402.snapshot(),
+        "jobs": jobs.snapshot("image"),
+        "admission": admission.snapshot(),
+        "store": image_store.snapshot(),
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
 
 @app.post("/generate")
-def generate_images_endpoint(
+async def generate_images_endpoint(
+    request: Request,
+    response: Response,
     prompt: str = Query(..., description="Image generation prompt"),
     count: int = Query(5, description="Number of images to generate"),
     size: str = Query("1024x1024", description="Image size"),
     style: str = Query("professional", description="Image style"),
     model: str = Query("dalle", description="Model to use (dalle or sd)"),
-    token: str = Depends(verify_token)
+    fresh: bool = Query(False, description="Ignore stored images and generate new ones"),
+    mode: str = Query("sync", description="sync, or async to get a job id and poll /jobs/{id}"),
+    webhook: str = Query(None, description="With mode=async: URL to POST the finished job to"),
+    token: str = Depends(verify_token),
+    priority: float = Depends(admission.prioritize(COST_USD)),
+    payment: x402.Payment = Depends(x402.paywall(PRICE_USD, "Image generation"))
 ):
     """Generate images"""
-    try:
-        if model.lower() == "dalle":
-            result = generate_images(prompt, count, size, style)
-        else:
-            result = generate_stable_diffusion_images(prompt, count)
-        
-        return {
-            "prompt": prompt,
-            "count": count,
-            "size": size,
-            "style": style,
-            "model": model,
-            "images": result.get("data", result.get("images", [])),
-            "source": "DALL-E 3" if model.lower() == "dalle" else "Stable Diffusion",
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "cost_usd": 0.70
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Image generation failed: {str(e)}")
+    if not 1 <= count <= MAX_COUNT:
+        raise HTTPException(status_code=400, detail=f"count must be between 1 and {MAX_COUNT}")
+    check_mode(mode)
+
+    async def run():
+        try:
+            shared = False
+            if model.lower() == "dalle":
+                result, shared = await generate_images(prompt, count, size, style, fresh)
+            else:
+                result = generate_stable_diffusion_images(prompt, count)
+
+            return {
+                "prompt": prompt,
+                "count": count,
+                "size": size,
+                "style": style,
+                "model": model,
+                "images": result.get("data", result.get("images", [])),
+                "errors": result.get("errors", []),
+                "source": "DALL-E 3" if model.lower() == "dalle" else "Stable Diffusion",
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "from_store": result.get("from_store", 0),
+                "coalesced": shared,
+                "cost_usd": 0.0 if shared or result.get("from_store", 0) == count else COST_USD
+            }
+        except HTTPException:
+            raise  # admission control sheds with 429 + Retry-After
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Image generation failed: {str(e)}")
+
+    if mode == "async":
+        return await jobs.submit(request, response, "image", run, webhook, payment)
+    return await providers.until_disconnected(request, run())
+
+@app.get("/images/{name}")
+def serve_image(name: str, request: Request):
+    """Serve a stored image by content hash (no authentication: names are unguessable sha256s)"""
+    path = image_store.open_blob(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    etag = f'"{name.split(".")[0]}"'
+    media_type = CONTENT_TYPES[name.split(".")[1]]
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable", "Accept-Ranges": "bytes"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        size = os.path.getsize(path)
+        try:
+            span = parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers=dict(headers, **{"Content-Range": f"bytes */{size}"}))
+        if span is not None:
+            start, end = span
+            with open(path, "rb") as f:
+                f.seek(start)
+                body = f.read(end - start + 1)
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            return Response(body, status_code=206, media_type=media_type, headers=headers)
+
+    return FileResponse(path, media_type=media_type, headers=headers)
 
 if __name__ == "__main__":
     import uvicorn
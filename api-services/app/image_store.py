@@ -0,0 +1,234 @@
+# image_store.py
+# Content-addressed local store for generated images.
+#
+# Blobs    <dir>/blobs/<sha[:2]>/<sha256>.<ext>   the image bytes; identical images dedupe
+# Manifests <dir>/manifests/<key>.json           the blobs generated for one (model, prompt,
+#                                                style, size), in generation order
+#
+# Provider URLs expire within hours, so every generated image is downloaded once and then
+# served by the image agent from disk (GET /images/<sha>.<ext>, strong ETag + Range).
+# Blobs are evicted least-recently-used once the store exceeds IMAGE_STORE_MAX_MB; a
+# manifest whose blobs were evicted just reports fewer images and is topped up on demand.
+# Several workers (supervisor.py) may share the directory, so the in-process index is only a
+# cache of it: a blob another worker wrote is adopted on first use, one it evicted is dropped.
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import providers
+
+STORE_DIR = os.getenv("IMAGE_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache", "images"))
+STORE_MAX_BYTES = int(float(os.getenv("IMAGE_STORE_MAX_MB", "2048")) * 1024 * 1024)
+# Prefix for the URLs handed back to clients, e.g. https://cdn.example.com; relative by default.
+PUBLIC_BASE = os.getenv("IMAGE_PUBLIC_BASE", "").rstrip("/")
+
+EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", "image/webp": "webp", "image/gif": "gif"}
+CONTENT_TYPES = {ext: ctype for ctype, ext in EXTENSIONS.items()}
+BLOB_NAME = re.compile(r"^([0-9a-f]{64})\.(png|jpg|webp|gif)$")
+
+
+def store_key(model: str, prompt: str, style: str, size: str) -> str:
+    canonical = json.dumps([model, prompt, style, size], separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def public_url(name: str) -> str:
+    return f"{PUBLIC_BASE}/images/{name}"
+
+
+class ImageStore:
+    def __init__(self, directory: str = STORE_DIR, max_bytes: int = STORE_MAX_BYTES):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.index: "OrderedDict[str, int]" = OrderedDict()  # blob name -> size, least recently used first
+        self.total = 0
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "dedupes": 0, "evictions": 0, "download_errors": 0, "adopted": 0}
+        os.makedirs(os.path.join(self.directory, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(self.directory, "manifests"), exist_ok=True)
+        self._load_index()
+
+    # -- paths -----------------------------------------------------------
+    def blob_path(self, name: str) -> str:
+        return os.path.join(self.directory, "blobs", name[:2], name)
+
+    def _manifest_path(self, key: str) -> str:
+        return os.path.join(self.directory, "manifests", f"{key}.json")
+
+    def _load_index(self) -> None:
+        entries = []
+        for root, _, files in os.walk(os.path.join(self.directory, "blobs")):
+            for name in files:
+                if BLOB_NAME.match(name):
+                    st = os.stat(os.path.join(root, name))
+                    entries.append((st.st_mtime, name, st.st_size))
+        for _, name, size in sorted(entries):
+            self.index[name] = size
+            self.total += size
+
+    # -- blobs -----------------------------------------------------------
+    def _present(self, name: str) -> bool:
+        """Whether the blob is on disk, reconciling the index with what other workers did."""
+        try:
+            size = os.stat(self.blob_path(name)).st_size
+        except OSError:
+            with self.lock:
+                if name in self.index:
+                    self.total -= self.index.pop(name)
+            return False
+        with self.lock:
+            if name not in self.index:
+                self.index[name] = size
+                self.total += size
+                self.stats["adopted"] += 1
+        return True
+
+    def touch(self, name: str) -> None:
+        now = time.time()
+        try:
+            os.utime(self.blob_path(name), (now, now))  # recency survives restarts via mtime
+        except OSError:
+            pass
+        with self.lock:
+            if name in self.index:
+                self.index.move_to_end(name)
+
+    def put_blob(self, data: bytes, content_type: str) -> str:
+        name = f"{hashlib.sha256(data).hexdigest()}.{EXTENSIONS.get(content_type.split(';')[0].strip(), 'png')}"
+        path = self.blob_path(name)
+        if self._present(name):
+            with self.lock:
+                self.stats["dedupes"] += 1
+            self.touch(name)
+            return name
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self.lock:
+            self.total += len(data) - self.index.pop(name, 0)
+            self.index[name] = len(data)
+            self.stats["stores"] += 1
+            self._evict()
+        return name
+
+    def _evict(self) -> None:
+        while self.total > self.max_bytes and len(self.index) > 1:
+            old, size = self.index.popitem(last=False)
+            self.total -= size
+            self.stats["evictions"] += 1
+            try:
+                os.remove(self.blob_path(old))
+            except OSError:
+                pass
+
+    def open_blob(self, name: str) -> Optional[str]:
+        """Path of a stored blob (marking it recently used), or None."""
+        if not BLOB_NAME.match(name):
+            return None
+        if not self._present(name):
+            return None
+        self.touch(name)
+        return self.blob_path(name)
+
+    # -- manifests -------------------------------------------------------
+    def lookup(self, key: str) -> List[Dict[str, Any]]:
+        """Stored images for a generation key, dropping any whose blob was evicted."""
+        try:
+            with open(self._manifest_path(key), "rb") as f:
+                entries = json.loads(f.read())
+        except (OSError, ValueError):
+            entries = []
+        live = [e for e in entries if self._present(e["name"])]
+        with self.lock:
+            self.stats["hits" if live else "misses"] += 1
+        for e in live:
+            self.touch(e["name"])
+        return [dict(e, url=public_url(e["name"]), stored=True) for e in live]
+
+    def append(self, key: str, entries: List[Dict[str, Any]]) -> None:
+        path = self._manifest_path(key)
+        with self.lock:
+            try:
+                with open(path, "rb") as f:
+                    current = json.loads(f.read())
+            except (OSError, ValueError):
+                current = []
+            current = [e for e in current if os.path.exists(self.blob_path(e["name"]))]
+            seen = {e["name"] for e in current}
+            current.extend(e for e in entries if e["name"] not in seen)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(current, f, separators=(",", ":"))
+            os.replace(tmp, path)
+
+    async def ingest(self, key: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Download provider images into the store; items that fail keep their provider URL."""
+        out, stored = [], []
+        fetched = await asyncio.gather(*(_fetch(item) for item in items), return_exceptions=True)
+        for item, got in zip(items, fetched):
+            if isinstance(got, BaseException):
+                if isinstance(got, asyncio.CancelledError):
+                    raise got
+                with self.lock:
+                    self.stats["download_errors"] += 1
+                out.append(dict(item, stored=False, store_error=str(got)))
+                continue
+            data, ctype = got
+            name = self.put_blob(data, ctype)
+            entry = {
+                "name": name,
+                "sha256": name.split(".")[0],
+                "bytes": len(data),
+                "content_type": CONTENT_TYPES[name.split(".")[1]],
+                "revised_prompt": item.get("revised_prompt"),
+            }
+            stored.append(entry)
+            out.append(dict(entry, url=public_url(name), stored=True))
+        if stored:
+            self.append(key, stored)
+        return out
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return dict(self.stats, blobs=len(self.index), bytes=self.total, max_bytes=self.max_bytes)
+
+
+async def _fetch(item: Dict[str, Any]) -> Tuple[bytes, str]:
+    if item.get("b64_json"):
+        return base64.b64decode(item["b64_json"]), "image/png"
+    if not item.get("url"):
+        raise ValueError("image has neither url nor b64_json")
+    return await providers.get_bytes("download", item["url"])
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """(start, end_inclusive) for a single `bytes=` range; None for forms we ignore (multi-range,
+    malformed), which are served whole. Raises ValueError if the range is unsatisfiable."""
+    m = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if not m or (not m.group(1) and not m.group(2)):
+        return None
+    if not m.group(1):
+        length = int(m.group(2))
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(m.group(1))
+    end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+    if start >= size or end < start:
+        raise ValueError("range not satisfiable")
+    return start, end
+
+
+image_store = ImageStore()
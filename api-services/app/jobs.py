@@ -0,0 +1,388 @@
+# jobs.py
+# Async job mode for long generations: answer 202 at once, run the work in the background.
+#
+#   POST /generate?...&mode=async[&webhook=https://...]  -> 202 {"job_id", "status": "queued", "poll"}
+#   GET  /jobs/<job_id>                                   -> {"status": queued|running|succeeded|failed,
+#                                                             "result" | "error", timings...}
+#
+# Work goes onto an in-process bounded queue drained by JOBS_WORKERS asyncio workers. Both
+# are created on first use inside the serving event loop, so nothing crosses the supervisor's
+# fork. A full queue refuses the submit with 503 + Retry-After instead of piling up.
+# Job records live in a WAL SQLite file (JOBS_DB_PATH) so that whichever worker process a poll
+# lands on can answer it; they expire after JOBS_TTL_S and the table is capped at
+# JOBS_MAX_RECORDS. JOB_STORE=memory keeps them per process (single worker, development).
+# A job that fails releases the x402 proof its request paid with (see x402.release), so the
+# record says "payment_released" and the client can resend the proof.
+# With a webhook the finished record is also POSTed there (a few retries, then given up).
+# The server makes that request, so webhooks are restricted: https only, and the host must
+# resolve to public addresses only (checked at submit and again before each delivery; no
+# redirects are followed), or match JOBS_WEBHOOK_HOSTS when that allowlist is set.
+# JOBS_WEBHOOKS=0 refuses them altogether; JOBS_WEBHOOK_ALLOW_HTTP=1 admits plain http.
+# Delivery connects to the address that was checked, so a rebinding DNS answer cannot
+# redirect it. Queue depth, outcomes and timings are exported on /metrics (jobs_*, job_*).
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import ipaddress
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+from uuid import uuid4
+
+import anyio
+import httpx
+from fastapi import HTTPException, Response
+from starlette.requests import Request
+
+import metrics
+import providers
+import x402
+
+WORKERS = int(os.getenv("JOBS_WORKERS", "16"))
+MAX_QUEUE = int(os.getenv("JOBS_MAX_QUEUE", "256"))
+TTL_S = int(os.getenv("JOBS_TTL_S", "3600"))
+MAX_RECORDS = int(os.getenv("JOBS_MAX_RECORDS", "100000"))
+RUN_TIMEOUT_S = float(os.getenv("JOBS_RUN_TIMEOUT_S", "300"))
+DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "jobs.db"))
+WEBHOOK_ATTEMPTS = 3
+WEBHOOKS_ENABLED = os.getenv("JOBS_WEBHOOKS", "1") == "1"
+WEBHOOK_ALLOW_HTTP = os.getenv("JOBS_WEBHOOK_ALLOW_HTTP", "0") == "1"
+# Exact hosts, or ".example.com" for any subdomain; when set, only these are accepted.
+WEBHOOK_HOSTS = [h.strip().lower() for h in os.getenv("JOBS_WEBHOOK_HOSTS", "").split(",") if h.strip()]
+MODES = ("sync", "async")
+
+Job = Dict[str, Any]
+
+JOB_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+job_events = metrics.register(metrics.Counter("jobs_total", "Async job lifecycle events.", ("kind", "event")))
+jobs_queued = metrics.register(metrics.Gauge("jobs_queued", "Async jobs waiting for a worker.", ("kind",)))
+jobs_running = metrics.register(metrics.Gauge("jobs_running", "Async jobs being run.", ("kind",)))
+job_wait_seconds = metrics.register(
+    metrics.Histogram("job_wait_seconds", "Time an async job waited in the queue.", ("kind",), JOB_BUCKETS)
+)
+job_run_seconds = metrics.register(metrics.Histogram("job_run_seconds", "Time an async job ran.", ("kind",), JOB_BUCKETS))
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _public(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global
+
+
+async def vet_webhook(url: str) -> Tuple[Optional[str], Optional[str]]:
+    """(why the server must not POST job results to `url`, or None; the vetted address to use).
+
+    The address is None for JOBS_WEBHOOK_HOSTS matches, which are trusted by name.
+    """
+    if not WEBHOOKS_ENABLED:
+        return "webhooks are disabled on this server", None
+    try:
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+    except ValueError:
+        return "webhook is not a valid URL", None
+    schemes = ("https", "http") if WEBHOOK_ALLOW_HTTP else ("https",)
+    if parts.scheme not in schemes or not parts.hostname:
+        return f"webhook must be an {'http(s)' if WEBHOOK_ALLOW_HTTP else 'https'} URL", None
+    host = parts.hostname.lower()
+    if WEBHOOK_HOSTS:
+        allowed = any(host == h or (h.startswith(".") and host.endswith(h)) for h in WEBHOOK_HOSTS)
+        return (None if allowed else "webhook host is not allowed"), None
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except OSError:
+        return "webhook host does not resolve", None
+    if not infos or not all(_public(info[4][0]) for info in infos):
+        return "webhook host must resolve to public addresses", None
+    return None, infos[0][4][0].split("%", 1)[0]
+
+
+async def post_webhook(url: str, job: Job) -> Optional[httpx.Response]:
+    """POST `job` to `url`, connecting to the address vet_webhook() checked; None if refused.
+
+    httpx would otherwise resolve the name again, and a rebinding DNS server could answer
+    with an internal address the second time. The Host header and TLS SNI / certificate
+    check still use the name.
+    """
+    problem, address = await vet_webhook(url)
+    if problem:
+        return None
+    if address is None:
+        return await providers.request("webhook", "POST", url, job)
+    target = httpx.URL(url)
+    host = target.host if target.port is None else f"{target.host}:{target.port}"
+    return await providers.request(
+        "webhook", "POST", str(target.copy_with(host=address)), job,
+        headers={"Host": host}, extensions={"sni_hostname": target.host},
+    )
+
+# ---------------------------------------------------------------------
+# Record stores
+# ---------------------------------------------------------------------
+class MemoryJobStore:
+    """Per-process TTL dict, oldest evicted first past `capacity`."""
+
+    def __init__(self, ttl_s: int = TTL_S, capacity: int = MAX_RECORDS):
+        self.ttl_s = ttl_s
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.jobs: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def put(self, job: Job) -> None:
+        with self.lock:
+            self.jobs[job["id"]] = (time.time() + self.ttl_s, job)
+            self.jobs.move_to_end(job["id"])
+            while len(self.jobs) > self.capacity:
+                self.jobs.popitem(last=False)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.lock:
+            item = self.jobs.get(job_id)
+        if item is None or item[0] < time.time():
+            return None
+        return item[1]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"backend": "memory", "records": len(self.jobs)}
+
+
+class SQLiteJobStore:
+    """Job records as JSON in a WAL SQLite file shared by all workers; one connection per thread."""
+
+    PURGE_EVERY = 256
+
+    def __init__(self, path: str = DB_PATH, ttl_s: int = TTL_S, capacity: int = MAX_RECORDS):
+        self.path = os.path.abspath(path)
+        self.ttl_s = ttl_s
+        self.capacity = capacity
+        self.local = threading.local()
+        self.writes = 0
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, expires_at REAL NOT NULL, doc TEXT NOT NULL) WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_expires ON jobs (expires_at)")
+        conn.commit()
+        conn.close()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn, self.local.pid = conn, os.getpid()
+        return conn
+
+    def put(self, job: Job) -> None:
+        conn = self._conn()
+        now = time.time()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?)", (job["id"], now + self.ttl_s, json.dumps(job)))
+            self.writes += 1
+            if self.writes % self.PURGE_EVERY == 0:
+                conn.execute("DELETE FROM jobs WHERE expires_at < ?", (now,))
+                conn.execute(
+                    "DELETE FROM jobs WHERE id IN (SELECT id FROM jobs ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                    (self.capacity,),
+                )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self._conn().execute("SELECT expires_at, doc FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or row[0] < time.time():
+            return None
+        return json.loads(row[1])
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"backend": "sqlite", "path": self.path}
+
+
+def make_store(kind: Optional[str] = None):
+    kind = (kind or os.getenv("JOB_STORE", "sqlite")).lower()
+    if kind == "memory":
+        return MemoryJobStore()
+    if kind == "sqlite":
+        return SQLiteJobStore()
+    raise ValueError(f"JOB_STORE must be sqlite or memory, not {kind!r}")
+
+
+# ---------------------------------------------------------------------
+# Queue
+# ---------------------------------------------------------------------
+def _quantiles(samples: Deque[float]) -> Dict[str, Optional[float]]:
+    if not samples:
+        return {"p50": None, "p95": None, "max": None}
+    xs = sorted(samples)
+    return {"p50": round(xs[len(xs) // 2], 3), "p95": round(xs[int(len(xs) * 0.95)], 3), "max": round(xs[-1], 3)}
+
+
+class JobQueue:
+    def __init__(self, store, workers: int = WORKERS, max_queue: int = MAX_QUEUE, run_timeout_s: float = RUN_TIMEOUT_S):
+        self.store = store
+        self.workers = workers
+        self.max_queue = max_queue
+        self.run_timeout_s = run_timeout_s
+        self.queue: Optional[asyncio.Queue] = None
+        self.loop = None
+        self.tasks = []
+        self.running = 0
+        self.counts: Dict[str, Dict[str, int]] = {}
+        self.wait_s: Dict[str, Deque[float]] = {}
+        self.run_s: Dict[str, Deque[float]] = {}
+
+    def _start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self.loop is loop:
+            return
+        self.loop = loop
+        self.queue = asyncio.Queue(self.max_queue)
+        self.tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    def _count(self, kind: str, what: str) -> None:
+        c = self.counts.setdefault(kind, {"submitted": 0, "rejected": 0, "succeeded": 0, "failed": 0, "webhook_delivered": 0, "webhook_failed": 0})
+        c[what] += 1
+        job_events.inc((kind, what))
+
+    async def submit(
+        self,
+        request: Request,
+        response: Response,
+        kind: str,
+        work: Callable[[], Awaitable[Any]],
+        webhook: Optional[str] = None,
+        payment: Optional[x402.Payment] = None,
+    ) -> Dict[str, Any]:
+        """Queue `work` (a zero-arg coroutine function returning the endpoint's JSON) and answer 202.
+
+        `payment` is what the route's paywall accepted; it is released if the job fails, as the
+        paywall would have done for a synchronous request.
+        """
+        if webhook:
+            problem, _ = await vet_webhook(webhook)
+            if problem:
+                raise HTTPException(status_code=400, detail=problem)
+        self._start()
+        if self.queue.full():
+            self._count(kind, "rejected")
+            raise HTTPException(status_code=503, detail="job queue full", headers={"Retry-After": "5"})
+        job = {"id": f"job_{uuid4().hex}", "kind": kind, "status": "queued", "created_at": _now(), "webhook": webhook}
+        await anyio.to_thread.run_sync(self.store.put, job)
+        # The job keeps the request's context (e.g. its admission priority).
+        self.queue.put_nowait((job, work, payment, contextvars.copy_context(), time.monotonic()))
+        jobs_queued.add((kind,), 1)
+        self._count(kind, "submitted")
+        poll = f"{request.scope.get('root_path', '')}/jobs/{job['id']}"
+        response.status_code = 202
+        response.headers["Location"] = poll
+        return {"job_id": job["id"], "status": "queued", "poll": poll}
+
+    async def _worker(self) -> None:
+        while True:
+            job, work, payment, context, enqueued = await self.queue.get()
+            kind = job["kind"]
+            started = time.monotonic()
+            self.wait_s.setdefault(kind, deque(maxlen=1024)).append(started - enqueued)
+            job_wait_seconds.observe((kind,), started - enqueued)
+            jobs_queued.add((kind,), -1)
+            jobs_running.add((kind,), 1)
+            self.running += 1
+            job.update(status="running", started_at=_now())
+            try:
+                await anyio.to_thread.run_sync(self.store.put, job)
+                result = await asyncio.wait_for(asyncio.get_running_loop().create_task(work(), context=context), self.run_timeout_s)
+                job.update(status="succeeded", result=result)
+            except asyncio.TimeoutError:
+                job.update(status="failed", status_code=504, error=f"job exceeded {self.run_timeout_s:.0f}s")
+            except HTTPException as e:
+                job.update(status="failed", status_code=e.status_code, error=e.detail)
+            except Exception as e:
+                job.update(status="failed", status_code=500, error=str(e))
+            finally:
+                self.running -= 1
+                jobs_running.add((kind,), -1)
+                self.queue.task_done()
+            self.run_s.setdefault(kind, deque(maxlen=1024)).append(time.monotonic() - started)
+            job_run_seconds.observe((kind,), time.monotonic() - started)
+            self._count(kind, job["status"])
+            if job["status"] == "failed" and payment is not None and payment.via == "proof":
+                try:
+                    await x402.release(payment)
+                    job["payment_released"] = True  # the client may resend the same proof
+                except Exception:
+                    pass
+            job["finished_at"] = _now()
+            try:
+                await anyio.to_thread.run_sync(self.store.put, job)
+            except Exception:
+                pass  # the webhook still carries the result
+            if job.get("webhook"):
+                asyncio.ensure_future(self._notify(job))
+
+    async def _notify(self, job: Job) -> None:
+        for attempt in range(WEBHOOK_ATTEMPTS):
+            try:
+                r = await post_webhook(job["webhook"], job)
+                if r is None:
+                    break  # the name points somewhere it may not by now
+                if r.status_code < 500:
+                    self._count(job["kind"], "webhook_delivered")
+                    return
+            except Exception:
+                pass
+            await asyncio.sleep(2 ** attempt)
+        self._count(job["kind"], "webhook_failed")
+
+    def install(self, app) -> None:
+        """Add GET /jobs/{job_id} (no authentication: job ids are unguessable)."""
+
+        def poll(job_id: str):
+            job = self.store.get(job_id)
+            if job is None:
+                raise HTTPException(status_code=404, detail="unknown or expired job")
+            return job
+
+        app.add_api_route("/jobs/{job_id}", poll, methods=["GET"])
+
+    def snapshot(self, kind: Optional[str] = None) -> Dict[str, Any]:
+        kinds = [kind] if kind else sorted(self.counts)
+        return {
+            "workers": self.workers,
+            "depth": self.queue.qsize() if self.queue else 0,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "store": self.store.snapshot(),
+            "by_kind": {
+                k: dict(
+                    self.counts.get(k, {}),
+                    wait_s=_quantiles(self.wait_s.get(k, ())),
+                    run_s=_quantiles(self.run_s.get(k, ())),
+                )
+                for k in kinds
+            },
+        }
+
+
+def check_mode(mode: str, stream: bool = False) -> None:
+    if mode not in MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(MODES)}")
+    if mode == "async" and stream:
+        raise HTTPException(status_code=400, detail="stream and mode=async cannot be combined")
+
+
+jobs = JobQueue(make_store())
@@ -3,11 +3,19 @@ from fastapi.responses import RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime, timezone
 from uuid import uuid4
-import requests
+import sqlite3
 import os
 
+import metrics
+import profiler
+import x402
+from link_store import make_store
+
 
 app = FastAPI(title="x402 Paywalled Link Shortener", version="0.1.0")
+metrics.install(app)
+profiler.install(app)
+x402.install(app)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,82 +28,59 @@ app.add_middleware(
 # Config
 TIMEOUT = 10
 DEFAULT_PRICE_USD = float(os.getenv("LINK_PRICE_USD", "0.01"))
-MERCHANT_URL = os.getenv("X402_URL", "http://localhost:7003")
-
-
-def create_invoice(price_usd: float):
-    try:
-        r = requests.post(f"{MERCHANT_URL}/invoice", json={"price_usd": price_usd}, timeout=TIMEOUT)
-        if r.status_code == 402:
-            return {
-                "invoice": r.headers.get("X-402-Invoice"),
-                "price": r.headers.get("X-402-Price"),
-                "currency": r.headers.get("X-402-Currency"),
-                "payto": r.headers.get("X-402-PayTo"),
-                "body": r.json(),
-            }
-        raise Exception(f"merchant returned {r.status_code}")
-    except Exception as e:
-        raise Exception(f"create_invoice failed: {e}")
+# After one verified payment the client gets a signed token (cookie + X-402-Access-Token
+# header) and resolves the same link without touching the merchant until it expires.
+ACCESS_TTL_S = int(os.getenv("LINK_ACCESS_TTL_S", "900"))
+ACCESS_COOKIE = x402.ACCESS_COOKIE
+COOKIE_SECURE = os.getenv("LINK_COOKIE_SECURE", "false").lower() == "true"
 
 
-def verify_payment(invoice_id: str, proof: dict):
-    try:
-        r = requests.post(f"{MERCHANT_URL}/verify", json={"invoice": invoice_id, "proof": proof}, timeout=TIMEOUT)
-        data = r.json()
-        return bool(data.get("ok")), data
-    except Exception as e:
-        return False, {"error": f"verify failed: {e}"}
-
-
-# In-memory store (swap to DB later)
-SHORTS: dict[str, dict] = {}
+# Durable store shared by all workers (LINK_STORE / LINK_DB_PATH, see link_store.py)
+links = make_store()
 
 
 @app.get("/health")
 def health():
-    return {"ok": True, "service": "link-shortener", "time": datetime.now(timezone.utc).isoformat()}
+    return {"ok": True, "service": "link-shortener", "storage": links.snapshot(), "time": datetime.now(timezone.utc).isoformat()}
 
 
 @app.post("/shorten")
-def shorten(payload: dict):
+def shorten(request: Request, payload: dict):
     url = (payload or {}).get("url")
     if not url or not isinstance(url, str) or not url.startswith("http"):
         raise HTTPException(status_code=400, detail="url required (http/https)")
     price = float((payload or {}).get("price_usd") or DEFAULT_PRICE_USD)
-    sid = f"lnk_{uuid4().hex[:8]}"
-    SHORTS[sid] = {"url": url, "price_usd": price, "created_at": datetime.now(timezone.utc).isoformat()}
-    return {"ok": True, "id": sid, "short": f"/s/{sid}", "price_usd": price}
+    entry = {"url": url, "price_usd": price, "created_at": datetime.now(timezone.utc).isoformat()}
+    for _ in range(3):
+        sid = f"lnk_{uuid4().hex[:8]}"
+        try:
+            links.put(sid, entry)
+            break
+        except sqlite3.IntegrityError:
+            continue  # id collision; draw again
+    else:
+        raise HTTPException(status_code=503, detail="could not allocate a short id")
+    return {"ok": True, "id": sid, "short": f"{request.scope.get('root_path', '')}/s/{sid}", "price_usd": price}
+
+
+def paid_redirect(request: Request, sid: str, url: str, payment: x402.Payment):
+    redirect = RedirectResponse(url=url, status_code=302)
+    x402.apply_headers(redirect, payment)
+    if payment.access_token:
+        redirect.set_cookie(
+            ACCESS_COOKIE, payment.access_token, max_age=ACCESS_TTL_S, path=f"{request.scope.get('root_path', '')}/s/{sid}", httponly=True, samesite="lax", secure=COOKIE_SECURE
+        )
+    return redirect
 
 
 @app.get("/s/{sid}")
-def resolve(request: Request, response: Response, sid: str):
-    entry = SHORTS.get(sid)
+async def resolve(request: Request, sid: str):
+    entry = links.get(sid)  # LRU hit or one indexed SQLite read; cheap enough for the event loop
     if not entry:
         raise HTTPException(status_code=404, detail="not found")
-
-    inv = request.headers.get("X-402-Invoice")
-    ptx = request.headers.get("X-402-Proof-Tx")
-    pmint = request.headers.get("X-402-Proof-Mint")
-    pchain = request.headers.get("X-402-Chain")
-    pamt = request.headers.get("X-402-Amount")
-
-    if inv and ptx and pmint and pchain:
-        ok, _ = verify_payment(inv, {"txid": ptx, "mint": pmint, "chain": pchain, "amount": pamt})
-        if ok:
-            return RedirectResponse(url=entry["url"], status_code=302)
-
-    try:
-        invoice = create_invoice(entry["price_usd"])
-        response.status_code = 402
-        response.headers["X-402-Price"] = invoice["price"]
-        response.headers["X-402-Currency"] = invoice["currency"]
-        response.headers["X-402-Invoice"] = invoice["invoice"]
-        response.headers["X-402-PayTo"] = invoice["payto"]
-        response.headers["X-402-Description"] = f"Pay to access {sid}"
-        return invoice["body"]
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"payment error: {e}")
+    # Access token, proof or 402 challenge; a verified proof also mints the access token.
+    payment = await x402.authorize(request, entry["price_usd"], f"Pay to access {sid}", resource=sid, access_ttl=ACCESS_TTL_S)
+    return paid_redirect(request, sid, entry["url"], payment)
 
 
 # To run standalone: uvicorn api-services.app.link_shortner:app --reload --port 8010
@@ -0,0 +1,163 @@
+# link_store.py
+# Storage for the link shortener: durable on-disk backend + hot in-process LRU.
+#
+#   store = make_store()              # LINK_STORE=sqlite (default) or memory
+#   store.put(sid, {"url": ..., "price_usd": ..., "created_at": ...})
+#   entry = store.get(sid)            # None if unknown
+#
+# The SQLite backend runs in WAL mode, so every uvicorn worker opens the same file, readers
+# never block the writer, and a committed link is visible to all workers immediately.
+# Links are immutable once created, which makes the per-worker LRU safe without any
+# invalidation: a miss falls through to SQLite, a hit is a dict lookup.
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+DB_PATH = os.getenv("LINK_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "links.db"))
+CACHE_SIZE = int(os.getenv("LINK_CACHE_SIZE", "100000"))
+# NORMAL survives process crashes in WAL mode; FULL also survives power loss at ~2x write cost.
+SYNCHRONOUS = os.getenv("LINK_DB_SYNCHRONOUS", "NORMAL").upper()
+
+Entry = Dict[str, Any]
+
+
+class MemoryLinkStore:
+    """The original dict: per-process and lost on restart. For local development."""
+
+    def __init__(self):
+        self.links: Dict[str, Entry] = {}
+
+    def get(self, sid: str) -> Optional[Entry]:
+        return self.links.get(sid)
+
+    def put(self, sid: str, entry: Entry) -> None:
+        self.links[sid] = entry
+
+    def put_many(self, rows: Iterable[Tuple[str, Entry]]) -> None:
+        self.links.update(rows)
+
+    def count(self) -> int:
+        return len(self.links)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"backend": "memory", "links": len(self.links)}
+
+
+class SQLiteLinkStore:
+    """One row per link in a WAL-mode SQLite file; one connection per thread."""
+
+    def __init__(self, path: str = DB_PATH, synchronous: str = SYNCHRONOUS):
+        self.path = os.path.abspath(path)
+        self.synchronous = synchronous
+        self.local = threading.local()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Schema via a throwaway connection: nothing opened at import may cross a fork.
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS links ("
+            " sid TEXT PRIMARY KEY, url TEXT NOT NULL, price_usd REAL NOT NULL, created_at TEXT NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        conn.commit()
+        conn.close()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            conn.execute("PRAGMA mmap_size=268435456")
+            conn.execute("PRAGMA cache_size=-65536")  # 64 MiB page cache per connection
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def get(self, sid: str) -> Optional[Entry]:
+        row = self._conn().execute("SELECT url, price_usd, created_at FROM links WHERE sid = ?", (sid,)).fetchone()
+        if row is None:
+            return None
+        return {"url": row[0], "price_usd": row[1], "created_at": row[2]}
+
+    def put(self, sid: str, entry: Entry) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO links (sid, url, price_usd, created_at) VALUES (?, ?, ?, ?)",
+                (sid, entry["url"], entry["price_usd"], entry["created_at"]),
+            )
+
+    def put_many(self, rows: Iterable[Tuple[str, Entry]]) -> None:
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT INTO links (sid, url, price_usd, created_at) VALUES (?, ?, ?, ?)",
+                ((sid, e["url"], e["price_usd"], e["created_at"]) for sid, e in rows),
+            )
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM links").fetchone()[0]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"backend": "sqlite", "path": self.path, "synchronous": self.synchronous}
+
+
+class CachedLinkStore:
+    """LRU of resolved links in front of a durable backend. Writes go through to the backend."""
+
+    def __init__(self, backend, capacity: int = CACHE_SIZE):
+        self.backend = backend
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.lru: "OrderedDict[str, Entry]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, sid: str) -> Optional[Entry]:
+        with self.lock:
+            entry = self.lru.get(sid)
+            if entry is not None:
+                self.lru.move_to_end(sid)
+                self.stats["hits"] += 1
+                return entry
+            self.stats["misses"] += 1
+        entry = self.backend.get(sid)
+        if entry is not None:
+            self._remember(sid, entry)
+        return entry
+
+    def put(self, sid: str, entry: Entry) -> None:
+        self.backend.put(sid, entry)  # durable first; raises on a duplicate sid
+        self._remember(sid, entry)
+
+    def put_many(self, rows: Iterable[Tuple[str, Entry]]) -> None:
+        self.backend.put_many(rows)
+
+    def _remember(self, sid: str, entry: Entry) -> None:
+        with self.lock:
+            self.lru[sid] = entry
+            self.lru.move_to_end(sid)
+            while len(self.lru) > self.capacity:
+                self.lru.popitem(last=False)
+
+    def count(self) -> int:
+        return self.backend.count()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            lru = dict(self.stats, size=len(self.lru), capacity=self.capacity)
+        return dict(self.backend.snapshot(), cache=lru)
+
+
+def make_store(kind: Optional[str] = None, path: str = DB_PATH, capacity: int = CACHE_SIZE):
+    kind = (kind or os.getenv("LINK_STORE", "sqlite")).lower()
+    if kind == "memory":
+        return MemoryLinkStore()
+    if kind == "sqlite":
+        return CachedLinkStore(SQLiteLinkStore(path), capacity)
+    raise ValueError(f"LINK_STORE must be sqlite or memory, not {kind!r}")
@@ -0,0 +1,193 @@
+# llm_cache.py
+# Content-addressed, on-disk response cache shared by the LLM agents.
+#
+# Key   = sha256 over the canonical JSON of (provider, model, full provider request body),
+#         i.e. the exact prompts and generation params; API keys never enter the key.
+# Value = the provider's JSON response, stored as <dir>/<key[:2]>/<key>.json.
+#
+# Policies (the agents' `cache` query parameter):
+#   prefer  serve a fresh hit, otherwise call the provider and store the result (default)
+#   bypass  always call the provider, then overwrite the stored result
+#   only    serve a fresh hit or fail with CacheMiss; never call the provider
+#
+# install(app) renders a CacheMiss that escapes a route (e.g. a stream=true request) as 504.
+#
+# lookup() and store() are coroutines: file reads, writes and evictions run in a worker
+# thread, never on the event loop. The directory is shared by all of the supervisor's
+# workers, so each process re-reads its size and LRU order from disk (file sizes and mtimes)
+# every LLM_CACHE_RESCAN_EVERY stores and before it evicts; eviction then goes down to 90%
+# of LLM_CACHE_MAX_MB, which keeps the rescans rare. Between rescans the directory can run
+# over by what the other workers stored since, at most about workers x RESCAN_EVERY entries.
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import anyio
+from fastapi.responses import JSONResponse
+
+CACHE_DIR = os.getenv("LLM_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache", "llm"))
+CACHE_MAX_BYTES = int(float(os.getenv("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024)
+RESCAN_EVERY = int(os.getenv("LLM_CACHE_RESCAN_EVERY", "64"))
+LOW_WATER = 0.9
+
+# Seconds a stored response stays servable, per agent. Research answers go stale fastest.
+DEFAULT_TTLS = {"research": 3600, "blog": 86400, "tweet": 86400, "script": 86400}
+
+POLICIES = ("prefer", "bypass", "only")
+
+
+class CacheMiss(Exception):
+    """Raised for policy=only when there is no fresh entry."""
+
+
+async def _cache_miss(_request, exc: CacheMiss):
+    return JSONResponse({"detail": str(exc)}, status_code=504)
+
+
+def install(app) -> None:
+    """Answer a CacheMiss raised anywhere in a route with 504, as the non-streaming paths do."""
+    app.add_exception_handler(CacheMiss, _cache_miss)
+
+
+def ttl_for(agent: str) -> int:
+    return int(os.getenv(f"LLM_CACHE_TTL_{agent.upper()}", DEFAULT_TTLS.get(agent, 3600)))
+
+
+def cache_key(provider: str, model: str, request_body: Dict[str, Any]) -> str:
+    canonical = json.dumps([provider, model, request_body], sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class DiskCache:
+    """Size-bounded LRU over hash-named JSON files; the index is rebuilt from disk at startup
+    and whenever other processes' writes have to be accounted for (see the module header)."""
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.index: "OrderedDict[str, int]" = OrderedDict()  # key -> size, least recently used first
+        self.total = 0
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "rescans": 0}
+        self.since_scan = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _load_index(self) -> None:
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    try:
+                        st = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue  # evicted by another worker meanwhile
+                    entries.append((st.st_mtime, name[:-5], st.st_size))
+        index: "OrderedDict[str, int]" = OrderedDict()
+        for _, key, size in sorted(entries):
+            index[key] = size
+        with self.lock:
+            self.index, self.total, self.since_scan = index, sum(index.values()), 0
+
+    def get(self, key: str, ttl: float) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = json.loads(f.read())
+        except (OSError, ValueError):
+            with self.lock:
+                self.stats["misses"] += 1
+            return None
+        if time.time() - entry["stored_at"] > ttl:
+            with self.lock:
+                self.stats["misses"] += 1
+            return None
+        now = time.time()
+        try:
+            os.utime(path, (now, now))  # recency survives restarts via mtime
+        except OSError:
+            pass
+        with self.lock:
+            self.stats["hits"] += 1
+            if key in self.index:
+                self.index.move_to_end(key)
+        return entry["value"]
+
+    def put(self, key: str, value: Any) -> None:
+        data = json.dumps({"stored_at": time.time(), "value": value}, separators=(",", ":")).encode()
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self.lock:
+            self.total += len(data) - self.index.pop(key, 0)
+            self.index[key] = len(data)
+            self.stats["stores"] += 1
+            self.since_scan += 1
+            rescan = self.total > self.max_bytes or self.since_scan >= RESCAN_EVERY
+        if not rescan:
+            return
+        self._load_index()  # count what the other workers stored, and what they evicted
+        with self.lock:
+            self.stats["rescans"] += 1
+            victims = []
+            while self.total > self.max_bytes * LOW_WATER and len(self.index) > 1:
+                old, size = self.index.popitem(last=False)
+                self.total -= size
+                victims.append(old)
+            self.stats["evictions"] += len(victims)
+        for old in victims:
+            try:
+                os.remove(self._path(old))
+            except OSError:
+                pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return dict(self.stats, entries=len(self.index), bytes=self.total, max_bytes=self.max_bytes)
+
+
+response_cache = DiskCache()
+
+
+async def lookup(agent: str, provider: str, model: str, request_body: Dict[str, Any]) -> Optional[Any]:
+    """Fresh stored response for this exact request, or None."""
+    return await anyio.to_thread.run_sync(response_cache.get, cache_key(provider, model, request_body), ttl_for(agent))
+
+
+async def store(provider: str, model: str, request_body: Dict[str, Any], value: Any) -> None:
+    await anyio.to_thread.run_sync(response_cache.put, cache_key(provider, model, request_body), value)
+
+
+async def cached_call(
+    agent: str,
+    provider: str,
+    model: str,
+    request_body: Dict[str, Any],
+    call: Callable[[], Awaitable[Any]],
+    policy: str = "prefer",
+) -> Tuple[Any, bool]:
+    """Run `call` through the cache. Returns (provider_response, served_from_cache)."""
+    if policy not in POLICIES:
+        raise ValueError(f"cache must be one of {', '.join(POLICIES)}")
+    if policy != "bypass":
+        hit = await lookup(agent, provider, model, request_body)
+        if hit is not None:
+            return hit, True
+        if policy == "only":
+            raise CacheMiss(f"no cached {agent} response for this request")
+    result = await call()
+    await store(provider, model, request_body, result)
+    return result, False
@@ -0,0 +1,107 @@
+# llm_stream.py
+# Provider streaming -> one Server-Sent Events schema for the content agents.
+#
+# Every stream, whatever the provider, is:
+#   event: start   data: {"provider": "...", "model": "...", "cached": bool}
+#   event: delta   data: {"text": "..."}                  (zero or more)
+#   event: done    data: <the same JSON body the non-streaming endpoint returns>
+#   event: error   data: {"error": "..."}                 (instead of done)
+#
+# The error frame ends the response normally, so the paywall dependency never sees the
+# failure: event_stream() releases the request's x402 payment itself when the generation
+# fails or the client goes away before "done", as the paywall does for the other paths.
+
+from __future__ import annotations
+
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional
+
+import providers
+import x402
+
+
+def sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'), ensure_ascii=False)}\n\n"
+
+
+# -----------------------------
+# Provider chunk parsers (one SSE data payload -> text pieces)
+# -----------------------------
+def openai_text(chunk: Dict[str, Any]) -> Iterable[str]:
+    for choice in chunk.get("choices") or ():
+        text = (choice.get("delta") or {}).get("content")
+        if text:
+            yield text
+
+
+def anthropic_text(chunk: Dict[str, Any]) -> Iterable[str]:
+    if chunk.get("type") == "content_block_delta":
+        text = (chunk.get("delta") or {}).get("text")
+        if text:
+            yield text
+    elif chunk.get("type") == "error":
+        raise RuntimeError((chunk.get("error") or {}).get("message", "anthropic stream error"))
+
+
+def gemini_text(chunk: Dict[str, Any]) -> Iterable[str]:
+    for cand in chunk.get("candidates") or ():
+        for part in (cand.get("content") or {}).get("parts") or ():
+            if part.get("text"):
+                yield part["text"]
+
+
+async def post_stream(
+    provider: str, url: str, headers: Dict[str, str], body: Dict[str, Any], parser, timeout: Optional[float] = None
+) -> AsyncIterator[str]:
+    """POST a streaming request through the shared provider pool and yield text chunks."""
+    async for chunk in providers.stream_events(provider, url, headers, body, timeout):
+        for text in parser(chunk):
+            yield text
+
+
+# -----------------------------
+# SSE driver
+# -----------------------------
+async def event_stream(
+    provider: str,
+    model: str,
+    chunks: Callable[[], AsyncIterator[str]],
+    finish: Callable[[str, bool], Dict[str, Any]],
+    cached_text: Optional[str] = None,
+    on_complete: Optional[Callable[[str], Awaitable[None]]] = None,
+    payment: Optional[x402.Payment] = None,
+) -> AsyncIterator[str]:
+    """Yield SSE frames for one generation.
+
+    `finish(text, cached)` builds the final body; `await on_complete(text)` runs once a live
+    stream finishes (the agents use it to fill the response cache). A cache hit
+    (`cached_text`) is replayed as a single delta. `payment` is released if the live
+    stream fails.
+    """
+    yield sse("start", {"provider": provider, "model": model, "cached": cached_text is not None})
+    if cached_text is not None:
+        yield sse("delta", {"text": cached_text})
+        yield sse("done", finish(cached_text, True))
+        return
+
+    parts = []
+    try:
+        async for text in chunks():
+            parts.append(text)
+            yield sse("delta", {"text": text})
+    except Exception as e:
+        if payment is not None:
+            await x402.release(payment)
+        yield sse("error", {"error": f"{provider} stream failed: {e}"})
+        return
+    except BaseException:
+        if payment is not None:
+            await x402.release(payment)  # client gone before "done"
+        raise
+    text = "".join(parts)
+    if on_complete is not None:
+        try:
+            await on_complete(text)
+        except Exception:
+            pass  # caching is best effort; the client already has the text
+    yield sse("done", finish(text, False))
@@ -131,15 +131,26 @@
 #         "fetched_at": datetime.now(timezone.utc).isoformat()
 #     }
 
-from fastapi import FastAPI, Query, Request, Response, HTTPException, Depends
+from fastapi import FastAPI, Query, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime, timezone
+from collections import OrderedDict
+import threading
 import requests
 import json
 import os
 
+import admission
+import circuit
+import metrics
+import profiler
+import x402
+
 app = FastAPI(title="Crypto OHLCV API", version="1.2")
+metrics.install(app)
+profiler.install(app)
+x402.install(app)
 
 # ---------------------------------------------------------------------
 # Authentication setup
@@ -167,10 +178,11 @@ app.add_middleware(
 # ---------------------------------------------------------------------
 # Config
 # ---------------------------------------------------------------------
-COINGECKO_BASE = "https://api.coingecko.com/api/v3"
+COINGECKO_BASE = os.getenv("COINGECKO_BASE", "https://api.coingecko.com/api/v3").rstrip("/")
 TIMEOUT = 10
-PRICE_USD = 0.01
-MERCHANT_URL = "http://localhost:7003"  # x402 merchant service
+PRICE_USD = float(os.getenv("OHLCV_PRICE_USD", "0.01"))
+# Last good answer per (coin, currency, days), served marked stale while CoinGecko is failing.
+STALE_ENTRIES = int(os.getenv("OHLCV_STALE_ENTRIES", "1024"))
 SYMBOL_MAP = {
     "btc": "bitcoin",
     "eth": "ethereum",
@@ -196,59 +208,47 @@ TIMEFRAME_MAP = {
     "max": "max",
 }
 
-# ---------------------------------------------------------------------
-# Payment Functions
-# ---------------------------------------------------------------------
-def create_invoice(price_usd: float):
-    """Create invoice with merchant service."""
-    try:
-        response = requests.post(
-            f"{MERCHANT_URL}/invoice",
-            json={"price_usd": price_usd},
-            timeout=TIMEOUT
-        )
-        if response.status_code == 402:
-            return {
-                "invoice": response.headers.get("X-402-Invoice"),
-                "price": response.headers.get("X-402-Price"),
-                "currency": response.headers.get("X-402-Currency"),
-                "payto": response.headers.get("X-402-PayTo"),
-                "body": response.json()
-            }
-        else:
-            raise Exception(f"Merchant service error: {response.status_code}")
-    except Exception as e:
-        raise Exception(f"Failed to create invoice: {str(e)}")
-
-def verify_payment(invoice_id: str, proof_data: dict):
-    """Verify payment with merchant service."""
-    try:
-        response = requests.post(
-            f"{MERCHANT_URL}/verify",
-            json={
-                "invoice": invoice_id,
-                "proof": proof_data
-            },
-            timeout=TIMEOUT
-        )
-        result = response.json()
-        return result.get("ok", False), result
-    except Exception as e:
-        return False, {"error": f"Payment verification failed: {str(e)}"}
-
 # ---------------------------------------------------------------------
 # Fetcher
 # ---------------------------------------------------------------------
+_last_good: "OrderedDict[tuple, tuple]" = OrderedDict()
+_last_good_lock = threading.Lock()
+
 def fetch_ohlc(coin_id: str, vs_currency: str = "usd", days: str = "1"):
     """Fetch OHLC data from CoinGecko."""
     url = f"{COINGECKO_BASE}/coins/{coin_id}/ohlc"
     params = {"vs_currency": vs_currency, "days": days}
-    r = requests.get(url, params=params, timeout=TIMEOUT)
+    circuit.check("coingecko")  # fail fast rather than queue for a slot we would waste
+    with admission.sync_slot("coingecko"):  # 429 + Retry-After instead of hammering the public API
+        with circuit.guard("coingecko"), metrics.stage("coingecko.fetch_ohlc"):
+            r = requests.get(url, params=params, timeout=TIMEOUT)
+            if r.status_code == 429 or r.status_code >= 500:
+                r.raise_for_status()
     if r.status_code == 404:
         return None
     r.raise_for_status()
     return r.json()
 
+def fetch_ohlc_or_stale(coin_id: str, vs_currency: str = "usd", days: str = "1"):
+    """fetch_ohlc, falling back to the last good answer while CoinGecko is failing. Returns (data, fetched_at)."""
+    key = (coin_id, vs_currency.lower(), str(days))
+    try:
+        data = fetch_ohlc(coin_id, vs_currency, days)
+    except (circuit.CircuitOpen, requests.RequestException):
+        with _last_good_lock:
+            hit = _last_good.get(key)
+        if hit is None:
+            raise
+        return hit
+    fetched_at = datetime.now(timezone.utc).isoformat()
+    if data:
+        with _last_good_lock:
+            _last_good[key] = (data, fetched_at)
+            _last_good.move_to_end(key)
+            while len(_last_good) > STALE_ENTRIES:
+                _last_good.popitem(last=False)
+    return data, None
+
 # ---------------------------------------------------------------------
 # Endpoints
 # ---------------------------------------------------------------------
@@ -259,67 +259,20 @@ def health_check():
         "status": "healthy",
         "service": "Crypto OHLCV API",
         "version": "1.2",
+        "admission": admission.snapshot(),
+        "upstreams": circuit.snapshot(),
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
 
 @app.get("/ohlcv")
 def get_ohlcv(
-    request: Request,
-    response: Response,
     symbol: str = Query(..., description="Symbol or CoinGecko ID (e.g. btc, eth, sol, bitcoin, ethereum)"),
     timeframe: str = Query("1d", description="1d, 7d, 14d, 30d, 90d, 180d, 365d, max"),
-    vs_currency: str = Query("usd", description="Quote currency (usd, eur, etc.)")
+    vs_currency: str = Query("usd", description="Quote currency (usd, eur, etc.)"),
+    payment: x402.Payment = Depends(x402.paywall(PRICE_USD, "Crypto OHLCV data")),
+    priority: float = Depends(admission.prioritize(PRICE_USD)),
 ):
-    # Check if client has payment proof headers (Flow B)
-    invoice_id = request.headers.get("X-402-Invoice")
-    proof_tx = request.headers.get("X-402-Proof-Tx")
-    proof_mint = request.headers.get("X-402-Proof-Mint")
-    proof_chain = request.headers.get("X-402-Chain")
-    proof_amount = request.headers.get("X-402-Amount")
-    
-    if invoice_id and proof_tx and proof_mint and proof_chain:
-        # Flow B: Client has paid, verify payment
-        proof_data = {
-            "txid": proof_tx,
-            "mint": proof_mint,
-            "chain": proof_chain,
-            "amount": proof_amount
-        }
-        
-        is_verified, verification_result = verify_payment(invoice_id, proof_data)
-        
-        if is_verified:
-            # Payment verified, return data
-            return _get_ohlcv_data(symbol, timeframe, vs_currency)
-        else:
-            # Payment verification failed, return 402 again
-            try:
-                invoice_data = create_invoice(PRICE_USD)
-                response.status_code = 402
-                response.headers["X-402-Price"] = invoice_data["price"]
-                response.headers["X-402-Currency"] = invoice_data["currency"]
-                response.headers["X-402-Invoice"] = invoice_data["invoice"]
-                response.headers["X-402-PayTo"] = invoice_data["payto"]
-                response.headers["X-402-Description"] = invoice_data["description"]
-                return {
-                    "error": "Payment verification failed",
-                    "verification_error": verification_result.get("error"),
-                    "invoice": invoice_data["body"]
-                }
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=f"Payment system error: {str(e)}")
-    else:
-        # Flow A: No payment yet, create invoice
-        try:
-            invoice_data = create_invoice(PRICE_USD)
-            response.status_code = 402
-            response.headers["X-402-Price"] = invoice_data["price"]
-            response.headers["X-402-Currency"] = invoice_data["currency"]
-            response.headers["X-402-Invoice"] = invoice_data["invoice"]
-            response.headers["X-402-PayTo"] = invoice_data["payto"]
-            return invoice_data["body"]
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Payment system error: {str(e)}")
+    return _get_ohlcv_data(symbol, timeframe, vs_currency)
 
 def _get_ohlcv_data(symbol: str, timeframe: str, vs_currency: str):
     """Internal function to get OHLCV data."""
@@ -327,7 +280,7 @@ def _get_ohlcv_data(symbol: str, timeframe: str, vs_currency: str):
     coin_id = SYMBOL_MAP.get(symbol_lower, symbol_lower)
     days = TIMEFRAME_MAP.get(timeframe.lower(), 1)
 
-    data = fetch_ohlc(coin_id, vs_currency, days)
+    data, stale_since = fetch_ohlc_or_stale(coin_id, vs_currency, days)
     if not data:
         # Suggest similar matches
         suggestions = [k for k in SYMBOL_MAP.keys() if k.startswith(symbol_lower[:2])]
@@ -356,5 +309,6 @@ def _get_ohlcv_data(symbol: str, timeframe: str, vs_currency: str):
         "timeframe": timeframe.lower(),
         "count": len(ohlcv),
         "ohlcv": ohlcv,
-        "fetched_at": datetime.now(timezone.utc).isoformat()
+        "fetched_at": stale_since or datetime.now(timezone.utc).isoformat(),
+        "stale": stale_since is not None
     }
\ No newline at end of file
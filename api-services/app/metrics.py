@@ -0,0 +1,262 @@
+# metrics.py
+# Prometheus-style metrics for every api-services app, without a client library.
+#
+#   metrics.install(app)                       # once per app: /metrics + request histograms
+#   with metrics.stage("x402.verify_payment"):  # sync or async code alike
+#       ...
+#
+# Exposed at GET /metrics in the Prometheus text format:
+#   http_requests_in_flight{app}
+#   http_request_duration_seconds{app, method, route, status}   histogram; route is the
+#       route template ("/jobs/{job_id}"), "unmatched" for 404s, so labels stay bounded
+#   stage_duration_seconds{stage, outcome}                      histogram; outcome is ok, error
+#       or cancelled (client went away, hedge lost)
+#
+#   jobs_total{kind, event}         counter; event is submitted, rejected, succeeded, failed,
+#       webhook_delivered or webhook_failed (jobs.py)
+#   jobs_queued{kind}, jobs_running{kind}                       gauges
+#   job_wait_seconds{kind}, job_run_seconds{kind}               histograms: queue wait, run time
+#
+# Stages recorded across the services: provider.<name> (one upstream HTTP call, after
+# admission), x402.create_invoice, x402.verify_payment, x402.spend, coingecko.fetch_ohlc and
+# json.encode (rendering the response body).
+#
+# METRICS=0 turns it all off: install() adds nothing and stage() returns a shared no-op.
+# Metrics are per process; behind supervisor.py each worker keeps its own, so scrape the
+# workers individually or aggregate with sum() over the pid label.
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+ENABLED = os.getenv("METRICS", "1") != "0"
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values."""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...], buckets: Tuple[float, ...] = BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels + ("pid",)
+        self.buckets = buckets
+        self.series: Dict[Tuple[str, ...], List[float]] = {}  # values -> [count per bucket..., +Inf, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, values: Tuple[str, ...], seconds: float) -> None:
+        i = bisect_left(self.buckets, seconds)
+        with self.lock:
+            row = self.series.get(values)
+            if row is None:
+                row = self.series[values] = [0] * (len(self.buckets) + 1) + [0.0]
+            row[i] += 1
+            row[-1] += seconds
+
+    def render(self, out: List[str]) -> None:
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} histogram")
+        pid = str(os.getpid())
+        with self.lock:
+            series = [(values + (pid,), list(row)) for values, row in self.series.items()]
+        bounds = [f'le="{b}"' for b in self.buckets] + ['le="+Inf"']
+        for values, row in sorted(series):
+            total = 0
+            for bound, n in zip(bounds, row):
+                total += n
+                out.append(f"{self.name}_bucket{_labels(self.labels, values, bound)} {total}")
+            out.append(f"{self.name}_sum{_labels(self.labels, values)} {row[-1]:.6f}")
+            out.append(f"{self.name}_count{_labels(self.labels, values)} {total}")
+
+
+class Gauge:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labels = labels + ("pid",)
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self.lock = threading.Lock()
+
+    def add(self, values: Tuple[str, ...], delta: float) -> None:
+        with self.lock:
+            self.values[values] = self.values.get(values, 0) + delta
+
+    def render(self, out: List[str]) -> None:
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} gauge")
+        pid = str(os.getpid())
+        with self.lock:
+            items = sorted(self.values.items())
+        for values, value in items:
+            out.append(f"{self.name}{_labels(self.labels, values + (pid,))} {value:g}")
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labels = labels + ("pid",)
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, values: Tuple[str, ...], n: float = 1) -> None:
+        with self.lock:
+            self.values[values] = self.values.get(values, 0) + n
+
+    def render(self, out: List[str]) -> None:
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} counter")
+        pid = str(os.getpid())
+        with self.lock:
+            items = sorted(self.values.items())
+        for values, value in items:
+            out.append(f"{self.name}{_labels(self.labels, values + (pid,))} {value:g}")
+
+
+requests_in_flight = Gauge("http_requests_in_flight", "Requests being handled.", ("app",))
+request_seconds = Histogram(
+    "http_request_duration_seconds", "Time from request start to the last response byte.", ("app", "method", "route", "status")
+)
+stage_seconds = Histogram("stage_duration_seconds", "Time spent in one instrumented stage of a request.", ("stage", "outcome"))
+REGISTRY = [requests_in_flight, request_seconds, stage_seconds]
+
+
+def register(metric):
+    """Add a subsystem's own metric to /metrics; returns it."""
+    REGISTRY.append(metric)
+    return metric
+
+
+def render() -> str:
+    out: List[str] = []
+    for metric in REGISTRY:
+        metric.render(out)
+    return "\n".join(out) + "\n"
+
+
+# ---------------------------------------------------------------------
+# Stage timers
+# ---------------------------------------------------------------------
+# Per-request list of (stage, outcome, seconds) when someone is collecting them
+# (profiler.py's slow-request recorder); None otherwise.
+trace: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("metrics_trace", default=None)
+
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            outcome = "ok"
+        elif issubclass(exc_type, (asyncio.CancelledError, GeneratorExit)):
+            outcome = "cancelled"
+        else:
+            outcome = "error"
+        seconds = time.perf_counter() - self.start
+        stage_seconds.observe((self.name, outcome), seconds)
+        stages = trace.get()
+        if stages is not None:
+            stages.append((self.name, outcome, seconds))
+        return False
+
+
+class _NoopStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopStage()
+
+
+def stage(name: str):
+    """Context manager timing one stage into stage_duration_seconds{stage=name}."""
+    return _Stage(name) if ENABLED else _NOOP
+
+
+# ---------------------------------------------------------------------
+# Request histograms (plain ASGI middleware: no per-request task or body copy)
+# ---------------------------------------------------------------------
+class MetricsMiddleware:
+    def __init__(self, app, name: str):
+        self.app = app
+        self.name = name
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        requests_in_flight.add((self.name,), 1)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            requests_in_flight.add((self.name,), -1)
+            route = scope.get("route")
+            request_seconds.observe(
+                (self.name, scope["method"], getattr(route, "path", "unmatched"), status), time.perf_counter() - start
+            )
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse whose body rendering is recorded as the json.encode stage."""
+
+    def render(self, content: Any) -> bytes:
+        with stage("json.encode"):
+            return super().render(content)
+
+
+def install(app, requests: bool = True) -> None:
+    """Add GET /metrics; with `requests`, also time every request and JSON body to this app.
+
+    Call it right after creating the app: routes declared afterwards render through
+    TimedJSONResponse. The gateway passes requests=False, its mounted apps record their own.
+    """
+    if not ENABLED:
+        return
+
+    def metrics_endpoint():
+        return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+    app.add_api_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
+    if requests:
+        app.add_middleware(MetricsMiddleware, name=app.title)
+        app.router.default_response_class = TimedJSONResponse
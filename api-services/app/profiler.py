@@ -0,0 +1,236 @@
+# profiler.py
+# On-demand sampling profiler and slow-request recorder, behind an admin token.
+#
+#   profiler.install(app)     # once per app, after metrics.install(app)
+#
+#   curl -H "X-Admin-Token: $ADMIN_TOKEN" "localhost:8000/admin/profile?seconds=10" > out.folded
+#   flamegraph.pl out.folded > out.svg        # or load it in speedscope
+#   curl -H "X-Admin-Token: $ADMIN_TOKEN" "localhost:8000/admin/slow-requests?limit=20"
+#
+# GET /admin/profile samples every thread's Python stack (sys._current_frames) from a
+# background thread every `interval_ms` for `seconds`, and returns collapsed stacks
+# ("thread;outer (file:line);...;inner (file:line) count"), the input format of
+# flamegraph.pl, speedscope and inferno. Idle threads (parked in select/epoll, lock or
+# queue waits) are left out unless idle=true. The event loop keeps serving while it runs,
+# so what gets sampled is real traffic. One profile per process at a time.
+#
+# Every request slower than SLOW_REQUEST_MS goes into a ring buffer of the last
+# SLOW_REQUESTS_MAX: route, query parameters (secrets redacted), status, duration and the
+# metrics.py stage timers it went through (upstream calls, x402, JSON encoding).
+#
+# Both are per process: behind supervisor.py a request lands on one worker, and the
+# response says which (pid). With ADMIN_TOKEN unset the admin routes answer 404.
+
+from __future__ import annotations
+
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+import anyio
+from fastapi import HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+
+import metrics
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+ADMIN_HEADER = "X-Admin-Token"
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+SLOW_REQUESTS_MAX = int(os.getenv("SLOW_REQUESTS_MAX", "200"))
+MAX_PROFILE_S = 60.0
+REDACT = ("key", "token", "secret", "signature", "password", "proof", "auth")
+# (file name, function) of frames where a thread is waiting rather than working.
+IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("_asyncio.py", "run"),  # anyio worker thread waiting for work
+}
+
+
+# ---------------------------------------------------------------------
+# Sampling profiler
+# ---------------------------------------------------------------------
+def _frame_label(code) -> str:
+    path = code.co_filename.replace("\\", "/").split("/")
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+
+def sample(seconds: float, interval_s: float = 0.01, include_idle: bool = False) -> Dict[str, Any]:
+    """Sample all other threads' stacks; blocking, so run it in a worker thread."""
+    me = threading.get_ident()
+    names = {}
+    stacks: Counter = Counter()
+    taken = idle = 0
+    labels: Dict[Any, str] = {}  # code object -> label, so each sample costs a few dict hits
+    cpu = time.thread_time()
+    deadline = time.perf_counter() + seconds
+    next_at = time.perf_counter()
+    while next_at < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            code = frame.f_code
+            if not include_idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+                idle += 1
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = _frame_label(code)
+                stack.append(label)
+                frame = frame.f_back
+            if ident not in names:
+                names = {t.ident: t.name for t in threading.enumerate()}
+            stack.append(names.get(ident, f"thread-{ident}"))
+            stacks[";".join(reversed(stack))] += 1
+        taken += 1
+        next_at += interval_s
+        time.sleep(max(0.0, next_at - time.perf_counter()))
+    # CPU the sampler itself used: the profiler's overhead on the worker.
+    return {"stacks": stacks, "ticks": taken, "idle_samples": idle, "cpu_s": time.thread_time() - cpu}
+
+
+def collapsed(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+_profiling = threading.Lock()
+
+
+# ---------------------------------------------------------------------
+# Slow-request recorder
+# ---------------------------------------------------------------------
+slow_requests: deque = deque(maxlen=SLOW_REQUESTS_MAX)
+stats = {"recorded": 0}
+
+
+def _redact(params) -> Dict[str, str]:
+    out = {}
+    for k, v in params.items():
+        out[k] = "<redacted>" if any(word in k.lower() for word in REDACT) else v[:200]
+    return out
+
+
+def _breakdown(stages: List[tuple]) -> Dict[str, Dict[str, Any]]:
+    out: Dict[str, Dict[str, Any]] = {}
+    for name, outcome, seconds in stages:
+        row = out.setdefault(name, {"calls": 0, "ms": 0.0, "errors": 0})
+        row["calls"] += 1
+        row["ms"] += seconds * 1000
+        row["errors"] += outcome == "error"
+    for row in out.values():
+        row["ms"] = round(row["ms"], 2)
+    return out
+
+
+class SlowRequestMiddleware:
+    """Collect each request's stage timers; keep the ones slower than SLOW_REQUEST_MS."""
+
+    def __init__(self, app, name: str):
+        self.app = app
+        self.name = name
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+        stages: list = []
+        reset = metrics.trace.set(stages)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            metrics.trace.reset(reset)
+            elapsed = time.perf_counter() - start
+            if elapsed * 1000 >= SLOW_REQUEST_MS:
+                self.record(scope, status, elapsed, stages)
+
+    def record(self, scope, status: int, elapsed: float, stages: list) -> None:
+        request = Request(scope)
+        route = scope.get("route")
+        staged = sum(s for _, _, s in stages)
+        stats["recorded"] += 1
+        slow_requests.append({
+            "app": self.name,
+            "at": datetime.now(timezone.utc).isoformat(),
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": getattr(route, "path", None),
+            "query": _redact(request.query_params),
+            "tenant": request.headers.get("x-tenant"),
+            "status": status,
+            "duration_ms": round(elapsed * 1000, 2),
+            "stages": _breakdown(stages),
+            # Stages can overlap (hedged calls, pipeline fan-out), so their sum may exceed duration_ms.
+            "unstaged_ms": round(max(0.0, elapsed - staged) * 1000, 2),
+        })
+
+
+# ---------------------------------------------------------------------
+# Admin endpoints
+# ---------------------------------------------------------------------
+def require_admin(request: Request) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(request.headers.get(ADMIN_HEADER, "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+async def profile(
+    request: Request,
+    seconds: float = Query(10.0, gt=0, le=MAX_PROFILE_S, description="How long to sample"),
+    interval_ms: float = Query(10.0, ge=1, le=1000, description="Sampling interval"),
+    idle: bool = Query(False, description="Include threads parked in select/lock/queue waits"),
+):
+    require_admin(request)
+    if not _profiling.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="a profile is already running in this worker")
+    try:
+        result = await anyio.to_thread.run_sync(sample, seconds, interval_ms / 1000, idle)
+    finally:
+        _profiling.release()
+    headers = {
+        "X-Profile-Pid": str(os.getpid()),
+        "X-Profile-Ticks": str(result["ticks"]),
+        "X-Profile-Idle-Samples": str(result["idle_samples"]),
+        "X-Profile-Overhead": f"{result['cpu_s'] / seconds:.2%}",
+    }
+    return PlainTextResponse(collapsed(result["stacks"]), headers=headers)
+
+
+def list_slow(request: Request, limit: int = Query(50, ge=1, le=SLOW_REQUESTS_MAX), clear: bool = Query(False)):
+    require_admin(request)
+    items = list(slow_requests)[-limit:][::-1]
+    if clear:
+        slow_requests.clear()
+    return {"pid": os.getpid(), "threshold_ms": SLOW_REQUEST_MS, "capacity": SLOW_REQUESTS_MAX,
+            "recorded": stats["recorded"], "requests": items}
+
+
+def install(app, requests: bool = True) -> None:
+    """Add /admin/profile and /admin/slow-requests; with `requests`, also record this app's slow requests.
+
+    The gateway passes requests=False: its mounted apps record their own.
+    """
+    app.add_api_route("/admin/profile", profile, methods=["GET"], include_in_schema=False)
+    app.add_api_route("/admin/slow-requests", list_slow, methods=["GET"], include_in_schema=False)
+    if requests:
+        app.add_middleware(SlowRequestMiddleware, name=app.title)
@@ -0,0 +1,163 @@
+# prompting.py
+# Prompt assembly helpers shared by the blog, tweet and script agents.
+#
+#   research, report = compact_research("blog", topic, research_data)
+#   max_tokens = output_budget(1500, "gpt-4o")
+#
+# research_data arrives as whatever the research step produced (often several KB of
+# Perplexity prose with citations and repeated sentences) and used to be spliced into the
+# prompt verbatim. compact_research() trims it to a token budget: drop boilerplate and
+# duplicate sentences, score the rest against the topic, keep the best in original order.
+
+from __future__ import annotations
+
+import math
+import os
+import re
+import threading
+from typing import Any, Dict, List, Tuple
+
+try:
+    import tiktoken  # optional; exact counts for the OpenAI models
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # pragma: no cover - depends on environment
+    _encoding = None
+
+DEFAULT_RESEARCH_BUDGET = int(os.getenv("PROMPT_RESEARCH_BUDGET_TOKENS", "1200"))
+
+# Tokens per English word for the tokenizers we target, plus headroom for markdown.
+TOKENS_PER_WORD = 1.35
+OUTPUT_HEADROOM = 1.15
+MIN_OUTPUT_TOKENS = 256
+
+# Largest max_tokens / maxOutputTokens each model accepts (matched by prefix, so dated
+# snapshots are covered); asking for more is an upstream 400. Unknown models get the
+# conservative default.
+OUTPUT_LIMITS = {
+    "gpt-4o": 16384,
+    "claude-3-5-sonnet": 8192,
+    "claude-3-5-haiku": 8192,
+    "gemini-1.5-pro": 8192,
+    "gemini-1.5-flash": 8192,
+}
+DEFAULT_OUTPUT_LIMIT = int(os.getenv("PROMPT_DEFAULT_OUTPUT_LIMIT", "4096"))
+
+_WORD = re.compile(r"\w+|[^\w\s]")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+|\n+")
+_TERM = re.compile(r"[a-z0-9]+")
+_CITATION = re.compile(r"\s*\[\d+(?:[,\s]*\d+)*\]")
+_BOILERPLATE = re.compile(
+    r"(^(sources|references|citations)\s*:|cookie|subscribe|sign up|newsletter|all rights reserved|click here|read more|"
+    r"advertisement|terms of (use|service)|privacy policy|as an ai|i hope this helps|"
+    r"let me know if)",
+    re.I,
+)
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were "
+    "will with what how why when which who about into than then their there these those".split()
+)
+
+
+def research_budget(agent: str) -> int:
+    return int(os.getenv(f"PROMPT_RESEARCH_BUDGET_{agent.upper()}", DEFAULT_RESEARCH_BUDGET))
+
+
+def count_tokens(text: str) -> int:
+    """Token count: exact with tiktoken installed, otherwise a close local estimate."""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    # Long words split into several BPE pieces; ~6 chars per piece is typical for English.
+    return sum(1 + (len(piece) - 1) // 6 for piece in _WORD.findall(text))
+
+
+def output_limit(model: str) -> int:
+    """The most output tokens `model` may be asked for."""
+    prefix = max((p for p in OUTPUT_LIMITS if model.startswith(p)), key=len, default=None)
+    return OUTPUT_LIMITS[prefix] if prefix else DEFAULT_OUTPUT_LIMIT
+
+
+def output_budget(words: int, model: str) -> int:
+    """max_tokens for an answer of about `words` words, within `model`'s output limit."""
+    limit = output_limit(model)
+    return min(limit, max(MIN_OUTPUT_TOKENS, math.ceil(words * TOKENS_PER_WORD * OUTPUT_HEADROOM)))
+
+
+def _terms(text: str) -> List[str]:
+    return [t for t in _TERM.findall(text.lower()) if t not in _STOPWORDS and len(t) > 1]
+
+
+def _score(sentence: str, topic_terms: frozenset) -> float:
+    terms = _terms(sentence)
+    if not terms:
+        return 0.0
+    overlap = sum(1 for t in terms if t in topic_terms)
+    facts = sum(1 for t in terms if t[0].isdigit())  # numbers, dates, percentages carry the research
+    return (overlap * 2 + facts) / math.sqrt(len(terms))
+
+
+def compact(text: str, topic: str, budget: int) -> str:
+    """`text` reduced to at most ~`budget` tokens of its most topic-relevant sentences."""
+    if count_tokens(text) <= budget:
+        return text.strip()
+
+    seen = set()
+    sentences: List[Tuple[int, str, int]] = []  # (position, sentence, tokens)
+    for raw in _SENTENCE.split(_CITATION.sub("", text)):
+        s = raw.strip(" \t-*#>")
+        if len(s) < 20 or _BOILERPLATE.search(s):
+            continue
+        norm = " ".join(_terms(s))
+        if not norm or norm in seen:
+            continue
+        seen.add(norm)
+        sentences.append((len(sentences), s, count_tokens(s)))
+
+    topic_terms = frozenset(_terms(topic))
+    ranked = sorted(sentences, key=lambda e: (-_score(e[1], topic_terms), e[0]))
+    kept, used = [], 0
+    for pos, s, n in ranked:
+        if used + n > budget:
+            continue
+        kept.append((pos, s))
+        used += n
+    return " ".join(s for _, s in sorted(kept))
+
+
+class _Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.by_agent: Dict[str, Dict[str, int]] = {}
+
+    def record(self, agent: str, before: int, after: int) -> None:
+        with self.lock:
+            s = self.by_agent.setdefault(agent, {"requests": 0, "compacted": 0, "tokens_before": 0, "tokens_after": 0})
+            s["requests"] += 1
+            s["compacted"] += int(after < before)
+            s["tokens_before"] += before
+            s["tokens_after"] += after
+
+    def snapshot(self, agent: str) -> Dict[str, Any]:
+        with self.lock:
+            s = dict(self.by_agent.get(agent) or {"requests": 0, "compacted": 0, "tokens_before": 0, "tokens_after": 0})
+        s["budget"] = research_budget(agent)
+        s["tokenizer"] = "tiktoken" if _encoding is not None else "estimate"
+        return s
+
+
+stats = _Stats()
+
+
+def compact_research(agent: str, topic: str, research_data: str) -> Tuple[str, Dict[str, int]]:
+    """Budgeted research text for `agent`'s prompt plus a before/after token report."""
+    before = count_tokens(research_data)
+    text = compact(research_data, topic, research_budget(agent)) if research_data else ""
+    after = count_tokens(text)
+    stats.record(agent, before, after)
+    return text, {"research_tokens_before": before, "research_tokens_after": after}
+
+
+def prompt_report(report: Dict[str, int], *parts: str, max_tokens: int) -> Dict[str, int]:
+    """Complete the compact_research report with the assembled prompt size and output budget."""
+    return dict(report, prompt_tokens=sum(count_tokens(p) for p in parts), max_tokens=max_tokens)
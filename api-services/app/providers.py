@@ -0,0 +1,222 @@
+# providers.py
+# Shared async HTTP client for the LLM / image providers.
+#
+# One pooled httpx.AsyncClient per provider host (keep-alive, HTTP/1.1), a per-provider
+# concurrency semaphore and timeout, admission control for the rate-limited providers
+# (admission.py), and helpers that tie an upstream call to the lifetime of the incoming
+# request so a client that hangs up stops costing us.
+#
+#   data = await providers.post_json("openai", OPENAI_BASE, headers, body)
+#   async for event in providers.stream_events("anthropic", ANTHROPIC_BASE, headers, body): ...
+#   result = await providers.until_disconnected(request, generate_blog(...))
+#   providers.install(app)   # once per app: a ClientDisconnected escaping a route -> 499
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Dict, Optional, Tuple, TypeVar
+
+import httpx
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+import admission
+import metrics
+
+T = TypeVar("T")
+
+
+@dataclass
+class ProviderConfig:
+    concurrency: int
+    timeout: float
+    max_connections: int
+
+
+def _config(name: str, concurrency: int, timeout: float) -> ProviderConfig:
+    env = name.upper()
+    c = int(os.getenv(f"PROVIDER_CONCURRENCY_{env}", concurrency))
+    return ProviderConfig(
+        concurrency=c,
+        timeout=float(os.getenv(f"PROVIDER_TIMEOUT_{env}", timeout)),
+        max_connections=int(os.getenv(f"PROVIDER_CONNECTIONS_{env}", c)),
+    )
+
+
+PROVIDERS: Dict[str, ProviderConfig] = {
+    "openai": _config("openai", 256, 60),
+    "anthropic": _config("anthropic", 256, 30),
+    "gemini": _config("gemini", 256, 60),
+    "perplexity": _config("perplexity", 128, 30),
+    # Fetching generated assets (image URLs) back from the providers' CDNs.
+    "download": _config("download", 32, 60),
+    # The x402 merchant (invoices / payment verification), see x402.py.
+    "merchant": _config("merchant", 256, 10),
+    # Async job completion callbacks to client-supplied URLs, see jobs.py.
+    "webhook": _config("webhook", 64, 10),
+}
+
+
+class ClientDisconnected(Exception):
+    """The HTTP client went away before the upstream call finished."""
+
+
+async def _client_disconnected(_request, exc: ClientDisconnected):
+    # nginx's "client closed request"; nobody reads it, but logs and metrics should not show a 500.
+    return JSONResponse({"detail": str(exc)}, status_code=499)
+
+
+def install(app) -> None:
+    """Answer a ClientDisconnected raised anywhere in a route with 499 instead of a 500."""
+    app.add_exception_handler(ClientDisconnected, _client_disconnected)
+
+
+class _Pool:
+    def __init__(self, name: str, cfg: ProviderConfig):
+        self.cfg = cfg
+        self.stage = f"provider.{name}"
+        self.client: Optional[httpx.AsyncClient] = None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+
+    def get(self) -> httpx.AsyncClient:
+        # Created lazily so the client binds to the running event loop.
+        if self.client is None or self.client.is_closed:
+            self.client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.cfg.timeout, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=self.cfg.max_connections,
+                    max_keepalive_connections=self.cfg.max_connections,
+                    keepalive_expiry=60.0,
+                ),
+            )
+            self.semaphore = asyncio.Semaphore(self.cfg.concurrency)
+        return self.client
+
+
+_pools: Dict[str, _Pool] = {name: _Pool(name, cfg) for name, cfg in PROVIDERS.items()}
+
+
+def _pool(provider: str) -> _Pool:
+    try:
+        return _pools[provider]
+    except KeyError:
+        raise ValueError(f"unknown provider '{provider}'")
+
+
+async def post_json(
+    provider: str, url: str, headers: Dict[str, str], body: Dict[str, Any], timeout: Optional[float] = None
+) -> Any:
+    """POST `body` and return the decoded JSON response; raises httpx.HTTPStatusError on 4xx/5xx."""
+    pool = _pool(provider)
+    client = pool.get()
+    async with admission.slot(provider), pool.semaphore:
+        pool.in_flight += 1
+        try:
+            with metrics.stage(pool.stage):
+                response = await client.post(url, headers=headers, json=body, timeout=timeout or client.timeout)
+                response.raise_for_status()
+                return response.json()
+        finally:
+            pool.in_flight -= 1
+
+
+async def request(
+    provider: str,
+    method: str,
+    url: str,
+    body: Optional[Dict[str, Any]] = None,
+    timeout: Optional[float] = None,
+    headers: Optional[Dict[str, str]] = None,
+    extensions: Optional[Dict[str, Any]] = None,
+) -> httpx.Response:
+    """Send one request through the provider's pool and return the response whatever its status."""
+    pool = _pool(provider)
+    client = pool.get()
+    async with admission.slot(provider), pool.semaphore:
+        pool.in_flight += 1
+        try:
+            with metrics.stage(pool.stage):
+                return await client.request(
+                    method, url, json=body, headers=headers, timeout=timeout or client.timeout, extensions=extensions
+                )
+        finally:
+            pool.in_flight -= 1
+
+
+async def get_bytes(provider: str, url: str, timeout: Optional[float] = None) -> Tuple[bytes, str]:
+    """GET `url` and return (body, content_type); raises httpx.HTTPStatusError on 4xx/5xx."""
+    pool = _pool(provider)
+    client = pool.get()
+    async with admission.slot(provider), pool.semaphore:
+        pool.in_flight += 1
+        try:
+            with metrics.stage(pool.stage):
+                response = await client.get(url, timeout=timeout or client.timeout, follow_redirects=True)
+                response.raise_for_status()
+                return response.content, response.headers.get("content-type", "application/octet-stream")
+        finally:
+            pool.in_flight -= 1
+
+
+async def stream_events(
+    provider: str, url: str, headers: Dict[str, str], body: Dict[str, Any], timeout: Optional[float] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """POST a streaming request and yield each SSE `data:` payload as a dict."""
+    pool = _pool(provider)
+    client = pool.get()
+    async with admission.slot(provider), pool.semaphore:
+        pool.in_flight += 1
+        try:
+            with metrics.stage(pool.stage):
+                async with client.stream("POST", url, headers=headers, json=body, timeout=timeout or client.timeout) as response:
+                    if response.is_error:
+                        await response.aread()
+                        response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        payload = line[5:].strip()
+                        if payload == "[DONE]":
+                            return
+                        yield json.loads(payload)
+        finally:
+            pool.in_flight -= 1
+
+
+async def until_disconnected(request: Request, work: Awaitable[T], poll_s: float = 0.5) -> T:
+    """Await `work`, cancelling it (and its upstream request) if the client disconnects first."""
+    task = asyncio.ensure_future(work)
+
+    async def watch():
+        while not await request.is_disconnected():
+            await asyncio.sleep(poll_s)
+
+    watcher = asyncio.ensure_future(watch())
+    try:
+        done, _ = await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if task in done:
+            return task.result()
+        task.cancel()
+        raise ClientDisconnected("client disconnected")
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
+
+
+def snapshot() -> Dict[str, Any]:
+    return {
+        name: {"in_flight": p.in_flight, "concurrency": p.cfg.concurrency, "timeout_s": p.cfg.timeout}
+        for name, p in _pools.items()
+    }
+
+
+async def aclose_all() -> None:
+    for p in _pools.values():
+        if p.client is not None:
+            await p.client.aclose()
+            p.client = None
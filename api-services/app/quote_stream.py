@@ -0,0 +1,149 @@
+# quote_stream.py
+# Shared, change-detecting quote pollers for watched swap pairs.
+#
+#   hub = QuoteStreamHub(JupiterClient())
+#   async for ev in hub.subscribe(in_mint, out_mint, amount_atoms, slippage_bps=50, threshold_bps=5):
+#       ...
+#
+# Every subscriber of the same (inputMint, outputMint, amount, slippageBps) shares one
+# poller. The poller backs off while the quote is unchanged and snaps back to the
+# fast interval as soon as it moves.
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from swap_agent import JupiterClient, as_int, route_fingerprint
+
+PairKey = Tuple[str, str, int, int]
+
+
+class _Subscriber:
+    __slots__ = ("queue", "threshold_bps", "last_out", "last_fp")
+
+    def __init__(self, threshold_bps: float):
+        # Only the newest update matters to a slow consumer, so keep one slot.
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self.threshold_bps = threshold_bps
+        self.last_out: Optional[int] = None
+        self.last_fp: Optional[str] = None
+
+    def offer(self, event: Dict[str, Any]) -> None:
+        out_amount = event["outAmount"]
+        fp = event["fingerprint"]
+        if self.last_out is not None:
+            route_changed = fp != self.last_fp
+            moved_bps = abs(out_amount - self.last_out) * 10_000 / self.last_out if self.last_out else float("inf")
+            if not route_changed and moved_bps <= self.threshold_bps:
+                return
+        else:
+            route_changed, moved_bps = True, 0.0
+        self.last_out, self.last_fp = out_amount, fp
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(dict(event, route_changed=route_changed, change_bps=round(moved_bps, 4)))
+
+
+class _PairPoller:
+    def __init__(self, hub: "QuoteStreamHub", key: PairKey):
+        self.hub = hub
+        self.key = key
+        self.subscribers: List[_Subscriber] = []
+        self.interval = hub.min_interval
+        self.last_sig: Optional[Tuple[str, int]] = None
+        self.last_event: Optional[Dict[str, Any]] = None
+        self.polls = 0
+        self.task: Optional[asyncio.Task] = None
+
+    async def run(self) -> None:
+        input_mint, output_mint, amount, slippage_bps = self.key
+        while self.subscribers:
+            try:
+                quote_json = await asyncio.to_thread(self.hub.client.quote, input_mint, output_mint, amount, slippage_bps)
+                best = JupiterClient.best_route_from_quote(quote_json)
+            except Exception:
+                best = None
+            self.polls += 1
+
+            if best is None:
+                self.interval = self.hub.max_interval
+            else:
+                sig = (route_fingerprint(best), as_int(best.get("outAmount")))
+                if sig == self.last_sig:
+                    self.interval = min(self.interval * self.hub.backoff, self.hub.max_interval)
+                else:
+                    self.last_sig = sig
+                    self.interval = self.hub.min_interval
+                    self.last_event = {
+                        "inputMint": input_mint,
+                        "outputMint": output_mint,
+                        "inAmount": as_int(best.get("inAmount")),
+                        "outAmount": sig[1],
+                        "slippage_bps": slippage_bps,
+                        "priceImpactPct": best.get("priceImpactPct"),
+                        "fingerprint": sig[0],
+                        "ts": time.time(),
+                        "raw": best,
+                    }
+                    for sub in list(self.subscribers):
+                        sub.offer(self.last_event)
+            await asyncio.sleep(self.interval)
+
+
+class QuoteStreamHub:
+    def __init__(
+        self,
+        client: JupiterClient,
+        min_interval: float = 0.5,
+        max_interval: float = 10.0,
+        backoff: float = 1.5,
+    ):
+        self.client = client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.pollers: Dict[PairKey, _PairPoller] = {}
+
+    async def subscribe(
+        self,
+        input_mint: str,
+        output_mint: str,
+        amount: int,
+        slippage_bps: int = 50,
+        threshold_bps: float = 0.0,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield a quote event whenever outAmount moves more than `threshold_bps` or the route changes."""
+        key = (input_mint, output_mint, int(amount), int(slippage_bps))
+        poller = self.pollers.get(key)
+        if poller is None:
+            poller = self.pollers[key] = _PairPoller(self, key)
+        sub = _Subscriber(threshold_bps)
+        poller.subscribers.append(sub)
+        if poller.last_event is not None:
+            sub.offer(poller.last_event)  # late joiners get the current quote right away
+        if poller.task is None or poller.task.done():
+            poller.task = asyncio.create_task(poller.run())
+        try:
+            while True:
+                yield await sub.queue.get()
+        finally:
+            poller.subscribers.remove(sub)
+            if not poller.subscribers:
+                self.pollers.pop(key, None)
+                poller.task.cancel()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "inputMint": k[0],
+                "outputMint": k[1],
+                "amount": k[2],
+                "slippage_bps": k[3],
+                "subscribers": len(p.subscribers),
+                "polls": p.polls,
+                "interval_s": round(p.interval, 3),
+            }
+            for k, p in self.pollers.items()
+        ]
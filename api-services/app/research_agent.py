@@ -1,11 +1,28 @@
-from fastapi import FastAPI, Query, HTTPException, Depends
+from fastapi import FastAPI, Query, Request, Response, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime, timezone
-import requests
 import os
 
+import providers
+import admission
+import metrics
+import profiler
+import llm_cache
+import x402
+import hedging
+from jobs import jobs, check_mode
+
+from llm_cache import cache_key, cached_call, CacheMiss, POLICIES
+from singleflight import flights
+
 app = FastAPI(title="Research Agent API", version="1.0")
+metrics.install(app)
+profiler.install(app)
+x402.install(app)
+llm_cache.install(app)
+providers.install(app)
+jobs.install(app)
 
 # ---------------------------------------------------------------------
 # Authentication setup
@@ -34,14 +51,17 @@ app.add_middleware(
 # Config
 # ---------------------------------------------------------------------
 PERPLEXITY_API_KEY = os.getenv("PERPLEXITY_API_KEY", "your-perplexity-api-key")
-PERPLEXITY_BASE = "https://api.perplexity.ai/chat/completions"
+PERPLEXITY_BASE = os.getenv("PERPLEXITY_API_BASE", "https://api.perplexity.ai").rstrip("/") + "/chat/completions"
 TIMEOUT = 30
+COST_USD = 0.30
+# x402 price per call; 0 (the default) leaves the endpoint behind the bearer token only
+PRICE_USD = float(os.getenv("RESEARCH_PRICE_USD", "0"))
 
 # ---------------------------------------------------------------------
 # Research Functions
 # ---------------------------------------------------------------------
-def call_perplexity(query: str, max_tokens: int = 1000):
-    """Call Perplexity API for research"""
+async def call_perplexity(query: str, max_tokens: int = 1000, cache: str = "prefer"):
+    """Call Perplexity API for research. Returns (response_json, served_from_cache, coalesced)."""
     headers = {
         "Authorization": f"Bearer {PERPLEXITY_API_KEY}",
         "Content-Type": "application/json"
@@ -63,13 +83,22 @@ def call_perplexity(query: str, max_tokens: int = 1000):
         "temperature": 0.2
     }
     
-    response = requests.post(PERPLEXITY_BASE, headers=headers, json=data, timeout=TIMEOUT)
-    response.raise_for_status()
-    return response.json()
+    def call():
+        return hedging.call("research", hedging.Target("perplexity", PERPLEXITY_BASE, headers, data), TIMEOUT)
+
+    key = f"{cache}:{cache_key('perplexity', data['model'], data)}"
+    (result, cached), shared = await flights.do(
+        "research", key, lambda: cached_call("research", "perplexity", data["model"], data, call, cache), COST_USD, free=lambda value: value[1]
+    )
+    return result, cached, shared
 
 # ---------------------------------------------------------------------
 # Endpoints
 # ---------------------------------------------------------------------
+@app.on_event("shutdown")
+async def close_provider_clients():
+    await providers.aclose_all()
+
 @app.get("/health")
 def health_check():
     """Health check endpoint (no authentication required)"""
@@ -77,29 +106,56 @@ def health_check():
         "status": "healthy",
         "service": "Research Agent API",
         "version": "1.0",
+        "coalescing": flights.snapshot("research"),
+        "payments": x402.snapshot(),
+        "jobs": jobs.snapshot("research"),
+        "admission": admission.snapshot(),
+        "hedging": hedging.snapshot("research"),
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
 
 @app.post("/research")
-def research(
+async def research(
+    request: Request,
+    response: Response,
     query: str = Query(..., description="Research query"),
     max_tokens: int = Query(1000, description="Maximum tokens to generate"),
-    token: str = Depends(verify_token)
+    cache: str = Query("prefer", description="Response cache: prefer, bypass or only"),
+    mode: str = Query("sync", description="sync, or async to get a job id and poll /jobs/{id}"),
+    webhook: str = Query(None, description="With mode=async: URL to POST the finished job to"),
+    token: str = Depends(verify_token),
+    priority: float = Depends(admission.prioritize(COST_USD)),
+    payment: x402.Payment = Depends(x402.paywall(PRICE_USD, "Research query"))
 ):
     """Conduct research using Perplexity API"""
-    try:
-        result = call_perplexity(query, max_tokens)
-        
-        return {
-            "query": query,
-            "max_tokens": max_tokens,
-            "result": result,
-            "source": "Perplexity",
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "cost_usd": 0.30
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Research failed: {str(e)}")
+    if cache not in POLICIES:
+        raise HTTPException(status_code=400, detail=f"cache must be one of {', '.join(POLICIES)}")
+    check_mode(mode)
+
+    async def run():
+        try:
+            result, cached, shared = await call_perplexity(query, max_tokens, cache)
+            return {
+                "query": query,
+                "max_tokens": max_tokens,
+                "result": result,
+                "source": hedging.label(hedging.served_by(result, "perplexity")),
+                "provider": hedging.served_by(result, "perplexity"),
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "cached": cached,
+                "coalesced": shared,
+                "cost_usd": 0.0 if cached or shared else COST_USD
+            }
+        except HTTPException:
+            raise  # admission control sheds with 429 + Retry-After
+        except CacheMiss as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Research failed: {str(e)}")
+
+    if mode == "async":
+        return await jobs.submit(request, response, "research", run, webhook, payment)
+    return await providers.until_disconnected(request, run())
 
 if __name__ == "__main__":
     import uvicorn
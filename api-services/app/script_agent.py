@@ -1,11 +1,31 @@
-from fastapi import FastAPI, Query, HTTPException, Depends
+from fastapi import FastAPI, Query, Request, Response, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime, timezone
-import requests
 import os
 
+import providers
+import admission
+import metrics
+import profiler
+import llm_cache
+import x402
+import hedging
+from jobs import jobs, check_mode
+
+from llm_cache import cache_key, cached_call, lookup, store, CacheMiss, POLICIES
+from singleflight import flights
+from prompting import compact_research, output_budget, prompt_report, stats as prompt_stats
+from llm_stream import event_stream
+
 app = FastAPI(title="Script Agent API", version="1.0")
+metrics.install(app)
+profiler.install(app)
+x402.install(app)
+llm_cache.install(app)
+providers.install(app)
+jobs.install(app)
 
 # ---------------------------------------------------------------------
 # Authentication setup
@@ -34,14 +54,21 @@ app.add_middleware(
 # Config
 # ---------------------------------------------------------------------
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "your-google-api-key")
-GEMINI_BASE = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-pro:generateContent"
+GEMINI_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta").rstrip("/") + "/models/gemini-1.5-pro:generateContent"
+GEMINI_STREAM_BASE = GEMINI_BASE.replace(":generateContent", ":streamGenerateContent")
 TIMEOUT = 60
+COST_USD = 0.30
+# x402 price per call; 0 (the default) leaves the endpoint behind the bearer token only
+PRICE_USD = float(os.getenv("SCRIPT_PRICE_USD", "0"))
+# ~2.5 spoken words per second, times three for scene, camera and timing directions.
+WORDS_PER_SECOND = 7.5
 
 # ---------------------------------------------------------------------
 # Script Generation Functions
 # ---------------------------------------------------------------------
-def generate_video_script(topic: str, duration: int = 60, style: str = "educational", research_data: str = ""):
-    """Generate video script using Gemini API"""
+def build_script_request(topic: str, duration: int = 60, style: str = "educational", research_data: str = ""):
+    """Headers, Gemini request body and prompt token report for a video script"""
+    research_data, report = compact_research("script", topic, research_data)
     headers = {
         "Content-Type": "application/json"
     }
@@ -71,6 +98,7 @@ def generate_video_script(topic: str, duration: int = 60, style: str = "educatio
     - Call-to-action ending
     - Estimated timing for each section"""
     
+    max_tokens = output_budget(duration * WORDS_PER_SECOND, "gemini-1.5-pro")
     data = {
         "contents": [
             {
@@ -83,18 +111,69 @@ def generate_video_script(topic: str, duration: int = 60, style: str = "educatio
             "temperature": 0.7,
             "topK": 40,
             "topP": 0.95,
-            "maxOutputTokens": 2000
+            "maxOutputTokens": max_tokens
         }
     }
-    
-    url = f"{GEMINI_BASE}?key={GOOGLE_API_KEY}"
-    response = requests.post(url, headers=headers, json=data, timeout=TIMEOUT)
-    response.raise_for_status()
-    return response.json()
+    return headers, data, prompt_report(report, system_prompt, user_prompt, max_tokens=max_tokens)
+
+def gemini_target(headers: dict, data: dict):
+    return hedging.Target(
+        "gemini", f"{GEMINI_BASE}?key={GOOGLE_API_KEY}", headers, data, stream_url=f"{GEMINI_STREAM_BASE}?alt=sse&key={GOOGLE_API_KEY}"
+    )
+
+async def generate_video_script(topic: str, duration: int = 60, style: str = "educational", research_data: str = "", cache: str = "prefer"):
+    """Generate video script using Gemini API. Returns (response_json, served_from_cache, coalesced, prompt_report)."""
+    headers, data, report = build_script_request(topic, duration, style, research_data)
+
+    def call():
+        return hedging.call("script", gemini_target(headers, data), TIMEOUT)
+
+    key = f"{cache}:{cache_key('gemini', GEMINI_BASE, data)}"
+    (result, cached), shared = await flights.do(
+        "script", key, lambda: cached_call("script", "gemini", GEMINI_BASE, data, call, cache), COST_USD, free=lambda value: value[1]
+    )
+    return result, cached, shared, report
+
+async def stream_video_script(topic: str, duration: int = 60, style: str = "educational", research_data: str = "", cache: str = "prefer", payment: x402.Payment = None):
+    """SSE frames for a video script streamed from Gemini (see llm_stream.py for the schema)"""
+    headers, data, report = build_script_request(topic, duration, style, research_data)
+    hit = await lookup("script", "gemini", GEMINI_BASE, data) if cache != "bypass" else None
+    if hit is None and cache == "only":
+        raise CacheMiss("no cached script response for this request")
+
+    served = {"provider": "gemini"}
+    return event_stream(
+        "gemini",
+        "gemini-1.5-pro",
+        lambda: hedging.stream("script", gemini_target(headers, data), TIMEOUT, lambda p: served.update(provider=p)),
+        lambda text, cached: script_response(topic, duration, style, text, cached, prompt_tokens=report, provider=served["provider"]),
+        cached_text=hit["candidates"][0]["content"]["parts"][0]["text"] if hit else None,
+        on_complete=lambda text: store("gemini", GEMINI_BASE, data, {"candidates": [{"content": {"parts": [{"text": text}]}}]}),
+        payment=payment,
+    )
+
+def script_response(topic: str, duration: int, style: str, script: str, cached: bool, coalesced: bool = False, prompt_tokens: dict = None, provider: str = "gemini"):
+    return {
+        "topic": topic,
+        "duration": duration,
+        "style": style,
+        "script": script,
+        "source": hedging.label(provider),
+        "provider": provider,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "cached": cached,
+        "coalesced": coalesced,
+        "prompt_tokens": prompt_tokens,
+        "cost_usd": 0.0 if cached or coalesced else COST_USD
+    }
 
 # ---------------------------------------------------------------------
 # Endpoints
 # ---------------------------------------------------------------------
+@app.on_event("shutdown")
+async def close_provider_clients():
+    await providers.aclose_all()
+
 @app.get("/health")
 def health_check():
     """Health check endpoint (no authentication required)"""
@@ -102,34 +181,53 @@ def health_check():
         "status": "healthy",
         "service": "Script Agent API",
         "version": "1.0",
+        "coalescing": flights.snapshot("script"),
+        "payments": x402.snapshot(),
+        "jobs": jobs.snapshot("script"),
+        "admission": admission.snapshot(),
+        "hedging": hedging.snapshot("script"),
+        "prompt_budget": prompt_stats.snapshot("script"),
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
 
 @app.post("/generate")
-def generate_script(
+async def generate_script(
+    request: Request,
+    response: Response,
     topic: str = Query(..., description="Video script topic"),
     duration: int = Query(60, description="Video duration in seconds"),
     style: str = Query("educational", description="Script style"),
     research_data: str = Query("", description="Research data to include"),
-    token: str = Depends(verify_token)
+    cache: str = Query("prefer", description="Response cache: prefer, bypass or only"),
+    stream: bool = Query(False, description="Stream tokens as Server-Sent Events"),
+    mode: str = Query("sync", description="sync, or async to get a job id and poll /jobs/{id}"),
+    webhook: str = Query(None, description="With mode=async: URL to POST the finished job to"),
+    token: str = Depends(verify_token),
+    priority: float = Depends(admission.prioritize(COST_USD)),
+    payment: x402.Payment = Depends(x402.paywall(PRICE_USD, "Video script generation"))
 ):
     """Generate a video script"""
-    try:
-        result = generate_video_script(topic, duration, style, research_data)
-        
-        script_content = result["candidates"][0]["content"]["parts"][0]["text"]
-        
-        return {
-            "topic": topic,
-            "duration": duration,
-            "style": style,
-            "script": script_content,
-            "source": "Gemini 1.5 Pro",
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "cost_usd": 0.30
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Script generation failed: {str(e)}")
+    if cache not in POLICIES:
+        raise HTTPException(status_code=400, detail=f"cache must be one of {', '.join(POLICIES)}")
+    check_mode(mode, stream)
+    if stream:
+        return StreamingResponse(await stream_video_script(topic, duration, style, research_data, cache, payment), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    async def run():
+        try:
+            result, cached, shared, report = await generate_video_script(topic, duration, style, research_data, cache)
+            script_content = result["candidates"][0]["content"]["parts"][0]["text"]
+            return script_response(topic, duration, style, script_content, cached, shared, report, hedging.served_by(result, "gemini"))
+        except HTTPException:
+            raise  # admission control sheds with 429 + Retry-After
+        except CacheMiss as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Script generation failed: {str(e)}")
+
+    if mode == "async":
+        return await jobs.submit(request, response, "script", run, webhook, payment)
+    return await providers.until_disconnected(request, run())
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,74 @@
+# singleflight.py
+# Coalesce identical in-flight generation requests onto one upstream call.
+#
+#   value, shared = await flights.do("research", key, lambda: call_perplexity(...), cost_usd=0.30,
+#                                    free=lambda value: value[1])   # (result, from_cache)
+#
+# The first caller for `key` starts the work as its own task; callers arriving before it
+# finishes wait on the same task and get the same result (shared=True). The task is only
+# cancelled when every waiter has gone away, so one client hanging up does not fail the rest;
+# the key is dropped at that moment, so a caller arriving just after starts afresh instead of
+# joining the cancelled task. saved_usd counts a folded caller only when the shared result
+# really cost `cost_usd`, i.e. `free(result)` says it was not served from a cache.
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self.calls: Dict[Tuple[str, str], _Call] = {}
+        self.stats: Dict[str, Dict[str, float]] = {}
+
+    def _agent_stats(self, agent: str) -> Dict[str, float]:
+        return self.stats.setdefault(agent, {"upstream": 0, "folded": 0, "saved_usd": 0.0})
+
+    async def do(
+        self,
+        agent: str,
+        key: str,
+        fn: Callable[[], Awaitable[Any]],
+        cost_usd: float = 0.0,
+        free: Optional[Callable[[Any], bool]] = None,
+    ) -> Tuple[Any, bool]:
+        """Run `fn` once per concurrent `key`. Returns (result, shared_with_an_earlier_caller)."""
+        stats = self._agent_stats(agent)
+        ck = (agent, key)
+        call = self.calls.get(ck)
+        shared = call is not None
+        if call is None:
+            call = self.calls[ck] = _Call(asyncio.ensure_future(fn()))
+            call.task.add_done_callback(lambda _t, ck=ck, call=call: self.calls.get(ck) is call and self.calls.pop(ck))
+            stats["upstream"] += 1
+        else:
+            stats["folded"] += 1
+
+        call.waiters += 1
+        try:
+            result = await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+                if self.calls.get(ck) is call:
+                    del self.calls[ck]
+        if shared and not (free is not None and free(result)):
+            stats["saved_usd"] = round(stats["saved_usd"] + cost_usd, 4)
+        return result, shared
+
+    def snapshot(self, agent: str) -> Dict[str, Any]:
+        in_flight = sum(1 for (a, _) in self.calls if a == agent)
+        return dict(self._agent_stats(agent), in_flight=in_flight)
+
+
+flights = SingleFlight()
@@ -4,15 +4,22 @@
 # Optional:
 #   --base-url https://lite-api.jup.ag         (default)
 #   --in-decimals 9                            (only if you pass a custom mint not in registry)
+#   --slim                                     (compact route, no raw; see compact_route.py)
+#   --raw                                      (with --slim: keep the raw best route)
 
 from __future__ import annotations
 
 import argparse
+import hashlib
 import json
 import re
+import sys
 from typing import Any, Dict, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from compact_route import encode, slim_route
 
 # -------------------------------------------------------------------
 # (Optional) Force IPv4 like your Node proxy did, to dodge IPv6/DNS flakiness
@@ -86,10 +93,15 @@ def as_int(x: Any, default: int = 0) -> int:
 # Jupiter client
 # ------------------------------
 class JupiterClient:
-    def __init__(self, base_url: str = "https://lite-api.jup.ag", timeout: int = 15):
+    def __init__(self, base_url: str = "https://lite-api.jup.ag", timeout: int = 15, pool_size: int = 10):
         self.base_url = base_url.rstrip("/")
         self.s = requests.Session()
         self.timeout = timeout
+        # Long-lived callers (swap_service) share one client across threads;
+        # size the keep-alive pool so concurrent quotes don't re-handshake.
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.s.mount("https://", adapter)
+        self.s.mount("http://", adapter)
         self.s.headers.update({
             "Accept": "application/json",
             "User-Agent": "swap-agent/1.0 (+https://jup.ag)"
@@ -190,6 +202,93 @@ def summarize_route(best: Dict[str, Any]) -> Any:
     return steps
 
 
+def route_fingerprint(best: Dict[str, Any]) -> str:
+    """Stable short hash of the hop structure in `routePlan` (venues, pools, mints, split).
+
+    Amounts are left out on purpose, so two quotes over the same path compare equal
+    even when the price moved.
+    """
+    h = hashlib.blake2b(digest_size=8)
+    for leg in best.get("routePlan", []):
+        info = leg.get("swapInfo", {}) or {}
+        h.update(
+            f"{info.get('ammKey')}|{info.get('label')}|{info.get('inputMint')}|"
+            f"{info.get('outputMint')}|{leg.get('percent')};".encode()
+        )
+    return h.hexdigest()
+
+
+def quote_swap(
+    client: JupiterClient,
+    inp: str,
+    out: str,
+    amount: float,
+    slippage_bps: int = 50,
+    in_decimals_override: Optional[int] = None,
+    slim: bool = False,
+    keep_raw: bool = True,
+) -> Dict[str, Any]:
+    """Quote `amount` UI units of `inp` -> `out` and return the agent's result dict.
+
+    With `slim`, "route" is the compact form from compact_route.py and "raw" is
+    only included when `keep_raw` is also set.
+    """
+    input_mint = to_mint(inp)
+    output_mint = to_mint(out)
+
+    indec = in_decimals(input_mint, in_decimals_override)
+    amount_int = int(round(amount * (10 ** indec)))
+
+    quote_json = client.quote(input_mint, output_mint, amount_int, slippage_bps)
+    best = client.best_route_from_quote(quote_json)
+
+    if not best:
+        return {"ok": False, "error": "no_route_found", "details": quote_json}
+
+    # Compute UI amounts and effective price; Jupiter returns string amounts
+    outdec = TOKEN_DECIMALS.get(output_mint, 6)
+
+    in_amount_atoms = as_int(best.get("inAmount"))
+    out_amount_atoms = as_int(best.get("outAmount"))
+
+    in_ui = in_amount_atoms / (10 ** indec) if indec >= 0 else None
+    out_ui = out_amount_atoms / (10 ** outdec) if outdec >= 0 else None
+    price = (out_ui / in_ui) if (in_ui and in_ui > 0) else None
+
+    result = {
+        "ok": True,
+        "input": {
+            "symbolOrMint": inp,
+            "mint": input_mint,
+            "decimals": indec,
+            "amount_ui": in_ui,
+            "amount_atoms": in_amount_atoms,
+        },
+        "output": {
+            "symbolOrMint": out,
+            "mint": output_mint,
+            "decimals": outdec,
+            "amount_ui": out_ui,
+            "amount_atoms": out_amount_atoms,
+        },
+        "slippage_bps": slippage_bps,
+        "price": price,  # output per 1 input
+        "priceImpactPct": best.get("priceImpactPct"),
+    }
+    if slim:
+        result["route"] = slim_route(best)
+        if keep_raw:
+            result["raw"] = best
+        return result
+
+    result["route"] = {
+        "swapMode": best.get("swapMode", "ExactIn"),
+        "steps": summarize_route(best),
+    }
+    result["raw"] = best  # include raw best route for downstream execution if needed
+    return result
+
+
 def main():
     ap = argparse.ArgumentParser(description="Return best swap route & price using Jupiter Lite Quote.")
     ap.add_argument("--in", dest="inp", required=True, help="Input token symbol or mint (e.g., SOL or So1111...)")
@@ -198,60 +297,20 @@ def main():
     ap.add_argument("--slippage-bps", type=int, default=50, help="Slippage in bps (default 50)")
     ap.add_argument("--base-url", type=str, default="https://lite-api.jup.ag", help="Base URL (use your proxy if needed)")
     ap.add_argument("--in-decimals", type=int, default=None, help="Override input token decimals if mint is unknown")
+    ap.add_argument("--slim", action="store_true", help="Emit the compact route and omit the raw best route")
+    ap.add_argument("--raw", action="store_true", help="With --slim, still include the raw best route")
     args = ap.parse_args()
 
     try:
-        input_mint = to_mint(args.inp)
-        output_mint = to_mint(args.out)
-
-        indec = in_decimals(input_mint, args.in_decimals)
-        amount_int = int(round(args.amount * (10 ** indec)))
-
         client = JupiterClient(base_url=args.base_url)
-        quote_json = client.quote(input_mint, output_mint, amount_int, args.slippage_bps)
-        best = client.best_route_from_quote(quote_json)
-
-        if not best:
-            print(json.dumps({"ok": False, "error": "no_route_found", "details": quote_json}, separators=(",", ":")))
-            return
-
-        # Compute UI amounts and effective price; Jupiter returns string amounts
-        outdec = TOKEN_DECIMALS.get(output_mint, 6)
-
-        in_amount_atoms = as_int(best.get("inAmount"))
-        out_amount_atoms = as_int(best.get("outAmount"))
-
-        in_ui = in_amount_atoms / (10 ** indec) if indec >= 0 else None
-        out_ui = out_amount_atoms / (10 ** outdec) if outdec >= 0 else None
-        price = (out_ui / in_ui) if (in_ui and in_ui > 0) else None
-
-        result = {
-            "ok": True,
-            "input": {
-                "symbolOrMint": args.inp,
-                "mint": input_mint,
-                "decimals": indec,
-                "amount_ui": in_ui,
-                "amount_atoms": in_amount_atoms,
-            },
-            "output": {
-                "symbolOrMint": args.out,
-                "mint": output_mint,
-                "decimals": outdec,
-                "amount_ui": out_ui,
-                "amount_atoms": out_amount_atoms,
-            },
-            "slippage_bps": args.slippage_bps,
-            "price": price,  # output per 1 input
-            "priceImpactPct": best.get("priceImpactPct"),
-            "route": {
-                "swapMode": best.get("swapMode", "ExactIn"),
-                "steps": summarize_route(best),
-            },
-            "raw": best,  # include raw best route for downstream execution if needed
-        }
-
-        print(json.dumps(result, separators=(",", ":")))
+        result = quote_swap(
+            client, args.inp, args.out, args.amount, args.slippage_bps, args.in_decimals,
+            slim=args.slim, keep_raw=args.raw,
+        )
+        if args.slim:
+            sys.stdout.write(encode(result).decode() + "\n")
+        else:
+            print(json.dumps(result, separators=(",", ":")))
     except Exception as e:
         print(json.dumps({"ok": False, "error": str(e)}, separators=(",", ":")))
 
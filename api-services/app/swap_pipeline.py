@@ -0,0 +1,223 @@
+# swap_pipeline.py
+# Speculative quote + swap-instructions prefetch for legs the planner expects to run.
+#
+#   pipe = SwapPipeline(JupiterClient())
+#   pipe.prefetch(user_pubkey, in_mint, out_mint, amount_atoms, slippage_bps=50, deadline_s=30, tolerance_bps=10)
+#   ...
+#   res = pipe.execute(user_pubkey, in_mint, out_mint, amount_atoms, slippage_bps=50)
+#   res["instructions"], res["prefetched"]
+#
+# Until its deadline a prefetched leg is re-quoted every `refresh_s` in the background;
+# swap-instructions are only rebuilt when outAmount drifts past the leg's tolerance or
+# the route changes. execute() therefore returns stored instructions with no network
+# call as long as the last check is recent, and otherwise falls back to the usual
+# quote -> swap_instructions sequence.
+#
+# Every pending leg costs a Jupiter quote per refresh, so the store is bounded:
+# `max_legs` in total and `max_legs_per_user` per user. prefetch() refuses new legs
+# past either limit (an existing leg can always have its deadline extended).
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from swap_agent import JupiterClient, as_int, route_fingerprint
+
+LegKey = Tuple[str, str, str, int, int]
+
+
+class _Prefetched:
+    __slots__ = ("key", "deadline", "tolerance_bps", "quote", "fingerprint", "instructions", "checked_at", "future")
+
+    def __init__(self, key: LegKey, deadline: float, tolerance_bps: float):
+        self.key = key
+        self.deadline = deadline
+        self.tolerance_bps = tolerance_bps
+        self.quote: Optional[Dict[str, Any]] = None
+        self.fingerprint: Optional[str] = None
+        self.instructions: Optional[Dict[str, Any]] = None
+        self.checked_at = 0.0
+        self.future: Optional[Future] = None
+
+
+class SwapPipeline:
+    def __init__(
+        self,
+        client: JupiterClient,
+        max_workers: int = 8,
+        refresh_s: float = 5.0,
+        max_legs: int = 1000,
+        max_legs_per_user: int = 20,
+    ):
+        self.client = client
+        self.refresh_s = refresh_s
+        self.max_legs = max_legs
+        self.max_legs_per_user = max_legs_per_user
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="swap-prefetch")
+        self.legs: Dict[LegKey, _Prefetched] = {}
+        self.lock = threading.Lock()
+        self.stats = {"prefetched": 0, "rebuilt": 0, "hits": 0, "stale": 0, "misses": 0, "refused": 0}
+        self._stop = threading.Event()
+        # Started on first use, not at import, so a pre-forking supervisor's workers each get one.
+        self._refresher: Optional[threading.Thread] = None
+
+    # -----------------------------
+    # Fetching
+    # -----------------------------
+    def _best(self, key: LegKey) -> Dict[str, Any]:
+        _, in_mint, out_mint, amount, slippage_bps = key
+        best = JupiterClient.best_route_from_quote(self.client.quote(in_mint, out_mint, amount, slippage_bps))
+        if not best:
+            raise RuntimeError("no_route_found")
+        return best
+
+    def _fetch(self, key: LegKey) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        quote = JupiterClient.prepare_quote_for_swap(self._best(key))
+        return quote, self.client.swap_instructions(key[0], quote)
+
+    def _fill(self, entry: _Prefetched) -> None:
+        """Re-quote the leg; rebuild instructions only if the quote moved out of tolerance."""
+        best = self._best(entry.key)
+        fp, out_amount = route_fingerprint(best), as_int(best.get("outAmount"))
+        with self.lock:
+            stored = as_int(entry.quote.get("outAmount")) if entry.quote else 0
+            still_good = (
+                entry.instructions is not None
+                and fp == entry.fingerprint
+                and stored > 0
+                and abs(out_amount - stored) * 10_000 / stored <= entry.tolerance_bps
+            )
+            if still_good:
+                entry.checked_at = time.monotonic()
+                return
+        quote = JupiterClient.prepare_quote_for_swap(best)
+        instructions = self.client.swap_instructions(entry.key[0], quote)
+        with self.lock:
+            entry.quote, entry.fingerprint, entry.instructions = quote, fp, instructions
+            entry.checked_at = time.monotonic()
+            self.stats["rebuilt"] += 1
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.wait(min(1.0, self.refresh_s)):
+            now = time.monotonic()
+            with self.lock:
+                for key, entry in list(self.legs.items()):
+                    if now >= entry.deadline:
+                        del self.legs[key]
+                    elif (
+                        now - entry.checked_at >= self.refresh_s
+                        and (entry.future is None or entry.future.done())
+                    ):
+                        entry.future = self.pool.submit(self._fill, entry)
+
+    def _room(self, user_pubkey: str) -> int:
+        # Caller holds self.lock.
+        mine = sum(1 for key in self.legs if key[0] == user_pubkey)
+        return max(0, min(self.max_legs - len(self.legs), self.max_legs_per_user - mine))
+
+    # -----------------------------
+    # Public API
+    # -----------------------------
+    def room(self, user_pubkey: str) -> int:
+        """How many new legs prefetch() would still accept for this user."""
+        with self.lock:
+            return self._room(user_pubkey)
+
+    def is_pending(self, user_pubkey: str, input_mint: str, output_mint: str, amount: int, slippage_bps: int = 50) -> bool:
+        with self.lock:
+            return (user_pubkey, input_mint, output_mint, int(amount), int(slippage_bps)) in self.legs
+
+    def prefetch(
+        self,
+        user_pubkey: str,
+        input_mint: str,
+        output_mint: str,
+        amount: int,
+        slippage_bps: int = 50,
+        deadline_s: float = 30.0,
+        tolerance_bps: float = 10.0,
+    ) -> bool:
+        """Start fetching quote + instructions for a likely leg and keep it fresh for `deadline_s`.
+
+        Returns False, without storing anything, when the leg is new and the store is full.
+        """
+        key = (user_pubkey, input_mint, output_mint, int(amount), int(slippage_bps))
+        deadline = time.monotonic() + deadline_s
+        with self.lock:
+            if self._refresher is None:
+                self._refresher = threading.Thread(target=self._refresh_loop, name="swap-prefetch-refresh", daemon=True)
+                self._refresher.start()
+            entry = self.legs.get(key)
+            if entry is not None:
+                entry.deadline = max(entry.deadline, deadline)
+                return True
+            if self._room(user_pubkey) <= 0:
+                self.stats["refused"] += 1
+                return False
+            entry = self.legs[key] = _Prefetched(key, deadline, tolerance_bps)
+            entry.future = self.pool.submit(self._fill, entry)
+            self.stats["prefetched"] += 1
+            return True
+
+    def execute(
+        self,
+        user_pubkey: str,
+        input_mint: str,
+        output_mint: str,
+        amount: int,
+        slippage_bps: int = 50,
+        max_age_s: Optional[float] = None,
+        wait_s: float = 2.0,
+    ) -> Dict[str, Any]:
+        """Return swap instructions for the leg, from the prefetch store when its last check is recent.
+
+        `max_age_s` (default 2 * refresh_s) bounds how old the last in-tolerance quote check
+        may be; older or missing entries are fetched synchronously.
+        """
+        key = (user_pubkey, input_mint, output_mint, int(amount), int(slippage_bps))
+        max_age_s = self.refresh_s * 2 if max_age_s is None else max_age_s
+        with self.lock:
+            entry = self.legs.pop(key, None)
+
+        if entry is not None and entry.instructions is None and entry.future is not None:
+            # First prefetch still in flight: waiting on it beats starting over.
+            try:
+                entry.future.result(timeout=wait_s)
+            except Exception:
+                pass
+
+        if entry is not None and entry.instructions is not None:
+            age = time.monotonic() - entry.checked_at
+            if age <= max_age_s:
+                with self.lock:
+                    self.stats["hits"] += 1
+                return {
+                    "ok": True,
+                    "prefetched": True,
+                    "age_s": round(age, 3),
+                    "quoteResponse": entry.quote,
+                    "instructions": entry.instructions,
+                }
+            outcome = "stale"
+        else:
+            outcome = "misses"
+        with self.lock:
+            self.stats[outcome] += 1
+
+        quote, instructions = self._fetch(key)
+        return {"ok": True, "prefetched": False, "age_s": 0.0, "quoteResponse": quote, "instructions": instructions}
+
+    def cancel(self, user_pubkey: str, input_mint: str, output_mint: str, amount: int, slippage_bps: int = 50) -> bool:
+        with self.lock:
+            return self.legs.pop((user_pubkey, input_mint, output_mint, int(amount), int(slippage_bps)), None) is not None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return dict(self.stats, pending=len(self.legs))
+
+    def close(self) -> None:
+        self._stop.set()
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,341 @@
+from fastapi import FastAPI, Query, Request, Response, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response as RawResponse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any
+import anyio
+import asyncio
+import json
+import math
+import os
+
+from swap_agent import TOKEN_REGISTRY, JupiterClient, quote_swap, summarize_route, to_mint, in_decimals
+from compact_route import encode
+from quote_stream import QuoteStreamHub
+from swap_pipeline import SwapPipeline
+import metrics
+import profiler
+import x402
+
+app = FastAPI(title="Swap Quote API", version="1.0")
+metrics.install(app)
+profiler.install(app)
+x402.install(app)
+
+# ---------------------------------------------------------------------
+# CORS setup
+# ---------------------------------------------------------------------
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# ---------------------------------------------------------------------
+# Config
+# ---------------------------------------------------------------------
+JUPITER_BASE = os.getenv("JUPITER_BASE", "https://lite-api.jup.ag")
+TIMEOUT = float(os.getenv("SWAP_TIMEOUT", "10"))  # per Jupiter request, seconds
+PRICE_USD = float(os.getenv("SWAP_QUOTE_PRICE_USD", "0.001"))
+WORKER_THREADS = int(os.getenv("SWAP_WORKER_THREADS", "200"))
+MAX_BATCH = 50
+MAX_DECIMALS = 18
+SYMBOLS = {mint: symbol for symbol, mint in TOKEN_REGISTRY.items()}
+# Prefetched legs are re-quoted in the background until their deadline, so both the
+# number per call and how long the client may keep them warm are capped server-side.
+PREFETCH_MAX_LEGS = int(os.getenv("SWAP_PREFETCH_MAX_LEGS", "10"))
+PREFETCH_MAX_DEADLINE_S = float(os.getenv("SWAP_PREFETCH_MAX_DEADLINE_S", "60"))
+
+# One warm client per worker process: the TLS session and keep-alive pool
+# are paid for once instead of on every quote like the CLI does.
+client = JupiterClient(base_url=JUPITER_BASE, timeout=TIMEOUT, pool_size=WORKER_THREADS)
+batch_pool = ThreadPoolExecutor(max_workers=MAX_BATCH, thread_name_prefix="swap-batch")
+stream_hub = QuoteStreamHub(
+    client,
+    min_interval=float(os.getenv("SWAP_STREAM_MIN_INTERVAL", "0.5")),
+    max_interval=float(os.getenv("SWAP_STREAM_MAX_INTERVAL", "10")),
+)
+pipeline = SwapPipeline(
+    client,
+    refresh_s=float(os.getenv("SWAP_PREFETCH_REFRESH", "5")),
+    max_legs=int(os.getenv("SWAP_PREFETCH_MAX_PENDING", "1000")),
+    max_legs_per_user=int(os.getenv("SWAP_PREFETCH_MAX_PENDING_PER_USER", "20")),
+)
+
+
+@app.on_event("startup")
+def raise_threadpool_limit():
+    """Quote handlers block on Jupiter I/O; let more of them run at once than anyio's default 40."""
+    anyio.to_thread.current_default_thread_limiter().total_tokens = WORKER_THREADS
+
+
+# ---------------------------------------------------------------------
+# Payment Functions
+# ---------------------------------------------------------------------
+def _pay(request: Request, response: Response, price_usd: float, description: str) -> x402.Payment:
+    """Charge for this request via the shared x402 paywall; raises so FastAPI answers 402 if unpaid.
+
+    Handlers here are sync and run in worker threads, so the async decision path is run on the loop.
+    """
+    payment = anyio.from_thread.run(x402.authorize, request, price_usd, description)
+    x402.apply_headers(response, payment)
+    return payment
+
+
+def _upstream_failed(payment: x402.Payment, detail: str) -> HTTPException:
+    """502 for a paid request Jupiter failed; the proof is released so the client can retry with it."""
+    anyio.from_thread.run(x402.release, payment)
+    return HTTPException(status_code=502, detail=detail)
+
+
+def _quote(params: dict):
+    """Run one quote, turning bad input and upstream failures into result dicts."""
+    try:
+        return quote_swap(
+            client,
+            params["in"],
+            params["out"],
+            float(params["amount"]),
+            int(params.get("slippage_bps", 50)),
+            params.get("in_decimals"),
+            slim=bool(params.get("slim")),
+            keep_raw=bool(params.get("raw", True)),
+        )
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+
+def _leg_key(inp: Any, out: Any, amount: Any, in_decimals_override):
+    """(input mint, output mint, amount in atoms) for a leg; 400 for input no quote could serve.
+
+    Paid routes call this before charging, so a client's own mistake is never billed.
+    """
+    try:
+        input_mint, output_mint = to_mint(str(inp)), to_mint(str(out))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        amount = float(amount)
+        indec = in_decimals(input_mint, in_decimals_override)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="amount and in_decimals must be numbers")
+    if not math.isfinite(amount) or amount <= 0:
+        raise HTTPException(status_code=400, detail="amount must be a positive number")
+    if not 0 <= indec <= MAX_DECIMALS:
+        raise HTTPException(status_code=400, detail=f"in_decimals must be between 0 and {MAX_DECIMALS}")
+    atoms = int(round(amount * (10 ** indec)))
+    if atoms < 1:
+        raise HTTPException(status_code=400, detail="amount is smaller than one unit of the input token")
+    return input_mint, output_mint, atoms
+
+
+def _describe(what: str, input_mint: str, output_mint: str) -> str:
+    """Payment description from validated mints (never raw client text: it goes into headers)."""
+    return f"{what} {SYMBOLS.get(input_mint, input_mint)}->{SYMBOLS.get(output_mint, output_mint)}"
+
+
+# ---------------------------------------------------------------------
+# Endpoints
+# ---------------------------------------------------------------------
+@app.get("/health")
+def health_check():
+    """Health check endpoint (no authentication required)"""
+    return {
+        "status": "healthy",
+        "service": "Swap Quote API",
+        "version": "1.0",
+        "upstream": client.base_url,
+        "streams": stream_hub.stats(),
+        "prefetch": pipeline.snapshot(),
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+
+
+@app.get("/quote")
+def quote(
+    request: Request,
+    response: Response,
+    inp: str = Query(..., alias="in", description="Input token symbol or mint (e.g. SOL)"),
+    out: str = Query(..., description="Output token symbol or mint (e.g. USDC)"),
+    amount: float = Query(..., description="Amount in input token units (e.g. 0.1)"),
+    slippage_bps: int = Query(50, description="Slippage in bps"),
+    in_decimals: int = Query(None, description="Override input token decimals if mint is unknown"),
+    slim: bool = Query(False, description="Compact route, raw best route omitted"),
+    raw: bool = Query(False, description="With slim, still include the raw best route"),
+):
+    """Best route and price for a single swap, same shape as `swap_agent.py` output."""
+    input_mint, output_mint, _ = _leg_key(inp, out, amount, in_decimals)
+    payment = _pay(request, response, PRICE_USD, _describe("Swap quote", input_mint, output_mint))
+
+    result = _quote({
+        "in": inp, "out": out, "amount": amount, "slippage_bps": slippage_bps,
+        "in_decimals": in_decimals, "slim": slim, "raw": raw or not slim,
+    })
+    if not result["ok"] and result.get("error") != "no_route_found":
+        raise _upstream_failed(payment, result["error"])
+    if slim:
+        return RawResponse(encode(result), media_type="application/json")
+    return result
+
+
+@app.post("/quote/batch")
+def quote_batch(request: Request, response: Response, payload: dict):
+    """Quote up to MAX_BATCH legs concurrently; results keep the request order.
+
+    Body: {"quotes": [{"in", "out", "amount", "slippage_bps"?}, ...], "slim"?: bool, "raw"?: bool}
+    """
+    legs = (payload or {}).get("quotes")
+    if not isinstance(legs, list) or not legs:
+        raise HTTPException(status_code=400, detail="quotes must be a non-empty list")
+    if len(legs) > MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"at most {MAX_BATCH} quotes per batch")
+    for i, leg in enumerate(legs):
+        if not isinstance(leg, dict) or not all(k in leg for k in ("in", "out", "amount")):
+            raise HTTPException(status_code=400, detail="each quote needs in, out and amount")
+        try:
+            _leg_key(leg["in"], leg["out"], leg["amount"], leg.get("in_decimals"))
+        except HTTPException as e:
+            raise HTTPException(status_code=400, detail=f"quotes[{i}]: {e.detail}")
+
+    _pay(request, response, PRICE_USD * len(legs), f"Batch of {len(legs)} swap quotes")
+
+    slim = bool(payload.get("slim"))
+    opts = {"slim": slim, "raw": bool(payload.get("raw")) or not slim}
+    results = list(batch_pool.map(_quote, [dict(leg, **opts) for leg in legs]))
+    body = {"ok": True, "count": len(results), "results": results}
+    if slim:
+        return RawResponse(encode(body), media_type="application/json")
+    return body
+
+
+@app.post("/route/summary")
+def route_summary(payload: dict):
+    """Summarize a raw Jupiter route and prepare it for /swap-instructions (no upstream call)."""
+    best = (payload or {}).get("route") or payload
+    if not isinstance(best, dict) or "inAmount" not in best:
+        raise HTTPException(status_code=400, detail="route must be a Jupiter quote route")
+    try:
+        return {
+            "ok": True,
+            "steps": summarize_route(best),
+            "quoteResponse": JupiterClient.prepare_quote_for_swap(best),
+        }
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"route missing field {e}")
+
+
+@app.get("/quote/stream")
+def quote_stream(
+    request: Request,
+    response: Response,
+    inp: str = Query(..., alias="in", description="Input token symbol or mint (e.g. SOL)"),
+    out: str = Query(..., description="Output token symbol or mint (e.g. USDC)"),
+    amount: float = Query(..., description="Amount in input token units (e.g. 0.1)"),
+    slippage_bps: int = Query(50, description="Slippage in bps"),
+    threshold_bps: float = Query(5.0, description="Emit only when outAmount moves more than this many bps"),
+    in_decimals: int = Query(None, description="Override input token decimals if mint is unknown"),
+):
+    """Server-Sent Events stream of quote changes for one pair."""
+    input_mint, output_mint, amount_atoms = _leg_key(inp, out, amount, in_decimals)
+    _pay(request, response, PRICE_USD, _describe("Swap quote stream", input_mint, output_mint))
+
+    async def events():
+        async for ev in stream_hub.subscribe(input_mint, output_mint, amount_atoms, slippage_bps, threshold_bps):
+            yield f"event: quote\ndata: {json.dumps(ev, separators=(',', ':'))}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.websocket("/quote/ws")
+async def quote_ws(websocket: WebSocket):
+    """WebSocket variant of /quote/stream; same query parameters, same events."""
+    q = websocket.query_params
+    try:
+        input_mint, output_mint, amount_atoms = _leg_key(
+            q["in"], q["out"], q["amount"], int(q["in_decimals"]) if "in_decimals" in q else None
+        )
+        slippage_bps = int(q.get("slippage_bps", 50))
+        threshold_bps = float(q.get("threshold_bps", 5.0))
+    except (KeyError, ValueError, HTTPException):
+        await websocket.close(code=1008)
+        return
+    try:
+        await x402.authorize(websocket, PRICE_USD, _describe("Swap quote stream", input_mint, output_mint))
+    except (x402.PaymentRequired, HTTPException):
+        await websocket.close(code=4402)  # 4000-4999 are app-defined; mirrors HTTP 402
+        return
+
+    await websocket.accept()
+
+    async def pump():
+        async for ev in stream_hub.subscribe(input_mint, output_mint, amount_atoms, slippage_bps, threshold_bps):
+            await websocket.send_json(ev)
+
+    # A quiet pair may not emit for minutes; watch the receive side so a
+    # disconnect releases the subscription (and possibly the poller) right away.
+    sender = asyncio.create_task(pump())
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+
+
+@app.post("/pipeline/prefetch")
+def pipeline_prefetch(request: Request, response: Response, payload: dict):
+    """Start keeping quote + swap instructions warm for likely legs; paid per leg like /quote/batch.
+
+    Body: {"user": pubkey, "legs": [{"in", "out", "amount", "slippage_bps"?, "deadline_s"?, "tolerance_bps"?}, ...]}
+    deadline_s is clamped to SWAP_PREFETCH_MAX_DEADLINE_S.
+    """
+    user = (payload or {}).get("user")
+    legs = (payload or {}).get("legs")
+    if not user or not isinstance(legs, list) or not legs or len(legs) > PREFETCH_MAX_LEGS:
+        raise HTTPException(status_code=400, detail=f"user and 1..{PREFETCH_MAX_LEGS} legs required")
+    if not all(isinstance(leg, dict) and all(k in leg for k in ("in", "out", "amount")) for leg in legs):
+        raise HTTPException(status_code=400, detail="each leg needs in, out and amount")
+    plan = []
+    for leg in legs:
+        input_mint, output_mint, amount_atoms = _leg_key(leg["in"], leg["out"], leg["amount"], leg.get("in_decimals"))
+        plan.append((
+            input_mint, output_mint, amount_atoms,
+            int(leg.get("slippage_bps", 50)),
+            min(max(float(leg.get("deadline_s", 30)), 0.0), PREFETCH_MAX_DEADLINE_S),
+            min(max(float(leg.get("tolerance_bps", 10)), 0.0), 10_000.0),
+        ))
+    new_legs = sum(1 for p in plan if not pipeline.is_pending(user, *p[:4]))
+    if new_legs > pipeline.room(user):
+        raise HTTPException(status_code=429, detail="too many prefetched legs pending; execute or let some expire first")
+    _pay(request, response, PRICE_USD * len(plan), f"Prefetch of {len(plan)} swap legs")
+    accepted = sum(1 for p in plan if pipeline.prefetch(user, *p))
+    return {"ok": True, "prefetching": accepted, "refused": len(plan) - accepted, "stats": pipeline.snapshot()}
+
+
+@app.post("/pipeline/execute")
+def pipeline_execute(request: Request, response: Response, payload: dict):
+    """Swap instructions for one leg; served from the prefetch store when it is still fresh.
+
+    Body: {"user": pubkey, "in", "out", "amount", "slippage_bps"?, "max_age_s"?}
+    """
+    p = payload or {}
+    if not p.get("user") or not all(k in p for k in ("in", "out", "amount")):
+        raise HTTPException(status_code=400, detail="user, in, out and amount required")
+    input_mint, output_mint, amount_atoms = _leg_key(p["in"], p["out"], p["amount"], p.get("in_decimals"))
+    payment = _pay(request, response, PRICE_USD, _describe("Swap instructions", input_mint, output_mint))
+    try:
+        return pipeline.execute(
+            p["user"], input_mint, output_mint, amount_atoms,
+            int(p.get("slippage_bps", 50)), p.get("max_age_s"),
+        )
+    except Exception as e:
+        raise _upstream_failed(payment, str(e))
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8006)
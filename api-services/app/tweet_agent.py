@@ -1,11 +1,31 @@
-from fastapi import FastAPI, Query, HTTPException, Depends
+from fastapi import FastAPI, Query, Request, Response, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime, timezone
-import requests
 import os
 
+import providers
+import admission
+import metrics
+import profiler
+import llm_cache
+import x402
+import hedging
+from jobs import jobs, check_mode
+
+from llm_cache import cache_key, cached_call, lookup, store, CacheMiss, POLICIES
+from singleflight import flights
+from prompting import compact_research, output_budget, prompt_report, stats as prompt_stats
+from llm_stream import event_stream
+
 app = FastAPI(title="Tweet Agent API", version="1.0")
+metrics.install(app)
+profiler.install(app)
+x402.install(app)
+llm_cache.install(app)
+providers.install(app)
+jobs.install(app)
 
 # ---------------------------------------------------------------------
 # Authentication setup
@@ -34,14 +54,19 @@ app.add_middleware(
 # Config
 # ---------------------------------------------------------------------
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY", "your-anthropic-api-key")
-ANTHROPIC_BASE = "https://api.anthropic.com/v1/messages"
+ANTHROPIC_BASE = os.getenv("ANTHROPIC_API_BASE", "https://api.anthropic.com/v1").rstrip("/") + "/messages"
 TIMEOUT = 30
+COST_USD = 0.40
+# x402 price per call; 0 (the default) leaves the endpoint behind the bearer token only
+PRICE_USD = float(os.getenv("TWEET_PRICE_USD", "0"))
+WORDS_PER_TWEET = 60  # 280 chars plus numbering, hashtags and emoji
 
 # ---------------------------------------------------------------------
 # Tweet Generation Functions
 # ---------------------------------------------------------------------
-def generate_tweet_thread(topic: str, research_data: str = "", post_count: int = 10):
-    """Generate a Twitter thread using Claude API"""
+def build_tweet_request(topic: str, research_data: str = "", post_count: int = 10):
+    """Headers, Anthropic request body and prompt token report for a tweet thread"""
+    research_data, report = compact_research("tweet", topic, research_data)
     headers = {
         "x-api-key": ANTHROPIC_API_KEY,
         "Content-Type": "application/json",
@@ -65,22 +90,69 @@ def generate_tweet_thread(topic: str, research_data: str = "", post_count: int =
     
     Make it engaging, educational, and shareable. Include hooks, valuable insights, and a strong CTA."""
     
+    max_tokens = output_budget(post_count * WORDS_PER_TWEET, "claude-3-5-sonnet-20241022")
     data = {
         "model": "claude-3-5-sonnet-20241022",
-        "max_tokens": 2000,
+        "max_tokens": max_tokens,
         "system": system_prompt,
         "messages": [
             {"role": "user", "content": user_prompt}
         ]
     }
-    
-    response = requests.post(ANTHROPIC_BASE, headers=headers, json=data, timeout=TIMEOUT)
-    response.raise_for_status()
-    return response.json()
+    return headers, data, prompt_report(report, system_prompt, user_prompt, max_tokens=max_tokens)
+
+async def generate_tweet_thread(topic: str, research_data: str = "", post_count: int = 10, cache: str = "prefer"):
+    """Generate a Twitter thread using Claude API. Returns (response_json, served_from_cache, coalesced, prompt_report)."""
+    headers, data, report = build_tweet_request(topic, research_data, post_count)
+
+    def call():
+        return hedging.call("tweet", hedging.Target("anthropic", ANTHROPIC_BASE, headers, data), TIMEOUT)
+
+    key = f"{cache}:{cache_key('anthropic', data['model'], data)}"
+    (result, cached), shared = await flights.do(
+        "tweet", key, lambda: cached_call("tweet", "anthropic", data["model"], data, call, cache), COST_USD, free=lambda value: value[1]
+    )
+    return result, cached, shared, report
+
+async def stream_tweet_thread(topic: str, research_data: str = "", post_count: int = 10, cache: str = "prefer", payment: x402.Payment = None):
+    """SSE frames for a tweet thread streamed from Claude (see llm_stream.py for the schema)"""
+    headers, data, report = build_tweet_request(topic, research_data, post_count)
+    hit = await lookup("tweet", "anthropic", data["model"], data) if cache != "bypass" else None
+    if hit is None and cache == "only":
+        raise CacheMiss("no cached tweet response for this request")
+
+    served = {"provider": "anthropic"}
+    return event_stream(
+        "anthropic",
+        data["model"],
+        lambda: hedging.stream("tweet", hedging.Target("anthropic", ANTHROPIC_BASE, headers, data), TIMEOUT, lambda p: served.update(provider=p)),
+        lambda text, cached: tweet_response(topic, post_count, text, cached, prompt_tokens=report, provider=served["provider"]),
+        cached_text=hit["content"][0]["text"] if hit else None,
+        on_complete=lambda text: store("anthropic", data["model"], data, {"content": [{"type": "text", "text": text}]}),
+        payment=payment,
+    )
+
+def tweet_response(topic: str, post_count: int, thread: str, cached: bool, coalesced: bool = False, prompt_tokens: dict = None, provider: str = "anthropic"):
+    return {
+        "topic": topic,
+        "post_count": post_count,
+        "thread": thread,
+        "source": hedging.label(provider),
+        "provider": provider,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "cached": cached,
+        "coalesced": coalesced,
+        "prompt_tokens": prompt_tokens,
+        "cost_usd": 0.0 if cached or coalesced else COST_USD
+    }
 
 # ---------------------------------------------------------------------
 # Endpoints
 # ---------------------------------------------------------------------
+@app.on_event("shutdown")
+async def close_provider_clients():
+    await providers.aclose_all()
+
 @app.get("/health")
 def health_check():
     """Health check endpoint (no authentication required)"""
@@ -88,30 +160,51 @@ def health_check():
         "status": "healthy",
         "service": "Tweet Agent API",
         "version": "1.0",
+        "coalescing": flights.snapshot("tweet"),
+        "payments": x402.snapshot(),
+        "jobs": jobs.snapshot("tweet"),
+        "admission": admission.snapshot(),
+        "hedging": hedging.snapshot("tweet"),
+        "prompt_budget": prompt_stats.snapshot("tweet"),
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
 
 @app.post("/generate")
-def generate_tweets(
+async def generate_tweets(
+    request: Request,
+    response: Response,
     topic: str = Query(..., description="Tweet thread topic"),
     research_data: str = Query("", description="Research data to include"),
     post_count: int = Query(10, description="Number of tweets in thread"),
-    token: str = Depends(verify_token)
+    cache: str = Query("prefer", description="Response cache: prefer, bypass or only"),
+    stream: bool = Query(False, description="Stream tokens as Server-Sent Events"),
+    mode: str = Query("sync", description="sync, or async to get a job id and poll /jobs/{id}"),
+    webhook: str = Query(None, description="With mode=async: URL to POST the finished job to"),
+    token: str = Depends(verify_token),
+    priority: float = Depends(admission.prioritize(COST_USD)),
+    payment: x402.Payment = Depends(x402.paywall(PRICE_USD, "Tweet thread generation"))
 ):
     """Generate a Twitter thread"""
-    try:
-        result = generate_tweet_thread(topic, research_data, post_count)
-        
-        return {
-            "topic": topic,
-            "post_count": post_count,
-            "thread": result["content"][0]["text"],
-            "source": "Claude 3.5 Sonnet",
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "cost_usd": 0.40
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Tweet generation failed: {str(e)}")
+    if cache not in POLICIES:
+        raise HTTPException(status_code=400, detail=f"cache must be one of {', '.join(POLICIES)}")
+    check_mode(mode, stream)
+    if stream:
+        return StreamingResponse(await stream_tweet_thread(topic, research_data, post_count, cache, payment), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    async def run():
+        try:
+            result, cached, shared, report = await generate_tweet_thread(topic, research_data, post_count, cache)
+            return tweet_response(topic, post_count, result["content"][0]["text"], cached, shared, report, hedging.served_by(result, "anthropic"))
+        except HTTPException:
+            raise  # admission control sheds with 429 + Retry-After
+        except CacheMiss as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Tweet generation failed: {str(e)}")
+
+    if mode == "async":
+        return await jobs.submit(request, response, "tweet", run, webhook, payment)
+    return await providers.until_disconnected(request, run())
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,340 @@
+# x402.py
+# Shared x402 paywall: challenge, proof verification, replay protection and receipts.
+#
+#   x402.install(app)                                               # once per app: renders 402s
+#   @app.post("/research")
+#   async def research(..., payment: x402.Payment = Depends(x402.paywall(0.30, "Research query"))):
+#
+#   payment = await x402.authorize(request, price_usd, description, resource)   # programmatic
+#
+# Decision order, cheapest first; the route body only runs once one of them succeeds:
+#   1. price <= 0                          -> free (lets a deployment leave a route open)
+#   2. valid X-402-Access-Token / cookie   -> paid earlier; local HMAC check, no network
+#   3. proof headers                       -> local checks (complete, amount covers the price,
+#                                             not already spent), then one async merchant /verify
+#   4. otherwise                           -> 402 with a fresh merchant invoice
+#
+# A proof is spent before the route body runs; if the body then fails (shed, breaker open,
+# upstream 5xx, client gone) paywall() releases it again, so the client can resend it.
+#
+# The merchant answers "already_verified" for a paid invoice forever and does not bind a
+# transaction to one invoice, so a verified proof is recorded as spent (invoice and txid) in
+# a SQLite table shared by all workers; presenting it again is refused locally. Successful
+# payments get an X-402-Receipt header: a signed record of what was paid for.
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import anyio
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+from starlette.requests import HTTPConnection
+
+import access_token
+import circuit
+import metrics
+import providers
+
+MERCHANT_URL = os.getenv("X402_URL", "http://localhost:7003")
+TIMEOUT = float(os.getenv("X402_TIMEOUT", "10"))
+DB_PATH = os.getenv("X402_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "x402.db"))
+ACCESS_COOKIE = "x402_access"
+# Proof amounts are raw token units; the merchant settles in USDC (6 decimals).
+UNITS_PER_USD = 1_000_000
+# The existing payers (services/api-gateway run.ts and sip_run.ts, frontend/app/chat) pay a
+# flat 1000 units (0.001 USDC) whatever the price, and the merchant only checks that the
+# transfer matches the claimed amount. So by default a proof must cover min(price,
+# X402_FLAT_UNITS); X402_ENFORCE_PRICE=1 requires the route's full price once payers send it.
+FLAT_UNITS = int(os.getenv("X402_FLAT_UNITS", "1000"))
+ENFORCE_PRICE = os.getenv("X402_ENFORCE_PRICE", "0") == "1"
+
+
+@dataclass
+class Payment:
+    via: str                              # "free", "access_token" or "proof"
+    resource: str
+    invoice: Optional[str] = None
+    txid: Optional[str] = None
+    receipt: Optional[str] = None
+    access_token: Optional[str] = None
+
+
+class PaymentRequired(Exception):
+    """Rendered as a 402 by the handler install() registers."""
+
+    def __init__(self, body: Any, headers: Dict[str, str]):
+        self.body = body
+        self.headers = headers
+
+
+stats = {"free": 0, "access_token": 0, "verified": 0, "challenged": 0, "rejected_local": 0, "rejected_merchant": 0, "replayed": 0, "released": 0}
+
+
+# ---------------------------------------------------------------------
+# Merchant
+# ---------------------------------------------------------------------
+async def create_invoice(price_usd: float) -> Dict[str, Any]:
+    try:
+        with circuit.guard("merchant"), metrics.stage("x402.create_invoice"):
+            r = await providers.request("merchant", "POST", f"{MERCHANT_URL}/invoice", {"price_usd": price_usd}, TIMEOUT)
+            if r.status_code != 402:
+                raise Exception(f"merchant returned {r.status_code}")
+    except circuit.CircuitOpen:
+        raise
+    except Exception as e:
+        raise Exception(f"Failed to create invoice: {e}")
+    return {
+        "invoice": r.headers.get("X-402-Invoice"),
+        "price": r.headers.get("X-402-Price"),
+        "currency": r.headers.get("X-402-Currency"),
+        "payto": r.headers.get("X-402-PayTo"),
+        "body": r.json(),
+    }
+
+
+async def verify_payment(invoice_id: str, proof: Dict[str, Any]) -> Tuple[bool, Dict[str, Any]]:
+    try:
+        with circuit.guard("merchant"), metrics.stage("x402.verify_payment"):
+            r = await providers.request("merchant", "POST", f"{MERCHANT_URL}/verify", {"invoice": invoice_id, "proof": proof}, TIMEOUT)
+            if r.status_code >= 500:
+                r.raise_for_status()
+            result = r.json()
+        return bool(result.get("ok")), result
+    except circuit.CircuitOpen:
+        raise  # 503 + Retry-After; the proof was not checked, so the client can resend it
+    except Exception as e:
+        return False, {"error": f"Payment verification failed: {e}"}
+
+
+# ---------------------------------------------------------------------
+# Replay protection
+# ---------------------------------------------------------------------
+class SpentProofs:
+    """Invoices and transactions that already bought something, shared across workers via SQLite."""
+
+    def __init__(self, path: str = DB_PATH):
+        self.path = os.path.abspath(path)
+        self.local = threading.local()
+        self.seen: set = set()  # per-process fast path for repeat offenders
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS spent (kind TEXT NOT NULL, id TEXT NOT NULL, resource TEXT NOT NULL,"
+            " spent_at REAL NOT NULL, PRIMARY KEY (kind, id)) WITHOUT ROWID"
+        )
+        conn.commit()
+        conn.close()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn, self.local.pid = conn, os.getpid()
+        return conn
+
+    def is_spent(self, invoice: str, txid: str) -> bool:
+        if ("invoice", invoice) in self.seen or ("tx", txid) in self.seen:
+            return True
+        row = self._conn().execute(
+            "SELECT 1 FROM spent WHERE (kind = 'invoice' AND id = ?) OR (kind = 'tx' AND id = ?) LIMIT 1", (invoice, txid)
+        ).fetchone()
+        return row is not None
+
+    def spend(self, invoice: str, txid: str, resource: str) -> bool:
+        """Record both ids; False if another request (or worker) spent either one first."""
+        conn = self._conn()
+        now = time.time()
+        try:
+            with metrics.stage("x402.spend"), conn:
+                conn.execute("INSERT INTO spent VALUES ('invoice', ?, ?, ?)", (invoice, resource, now))
+                conn.execute("INSERT INTO spent VALUES ('tx', ?, ?, ?)", (txid, resource, now))
+        except sqlite3.IntegrityError:
+            return False
+        finally:
+            self.seen.update((("invoice", invoice), ("tx", txid)))
+        return True
+
+    def release(self, invoice: str, txid: str) -> None:
+        """Un-spend a proof whose request failed after paying, so the client can resend it."""
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM spent WHERE (kind = 'invoice' AND id = ?) OR (kind = 'tx' AND id = ?)", (invoice, txid))
+        self.seen.difference_update((("invoice", invoice), ("tx", txid)))
+
+
+spent = SpentProofs()
+
+
+# ---------------------------------------------------------------------
+# Receipts
+# ---------------------------------------------------------------------
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _sign(payload: str) -> str:
+    return _b64(hmac.new(access_token.SECRET, payload.encode(), hashlib.sha256).digest())
+
+
+def make_receipt(resource: str, invoice: str, txid: str, amount: Optional[str], price_usd: float) -> str:
+    claims = {"res": resource, "inv": invoice, "tx": txid, "amt": amount, "usd": price_usd, "iat": int(time.time())}
+    payload = _b64(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_receipt(receipt: str) -> Optional[Dict[str, Any]]:
+    """The receipt's claims if it was issued by this deployment, else None."""
+    try:
+        payload, mac = receipt.split(".", 1)
+        if not hmac.compare_digest(mac, _sign(payload)):
+            return None
+        return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except (ValueError, TypeError):
+        return None
+
+
+# ---------------------------------------------------------------------
+# Decision path
+# ---------------------------------------------------------------------
+def required_units(price_usd: float) -> int:
+    units = round(price_usd * UNITS_PER_USD)
+    return units if ENFORCE_PRICE else min(units, FLAT_UNITS)
+
+
+async def challenge(price_usd: float, description: str, error: Optional[str] = None, detail: Any = None) -> PaymentRequired:
+    stats["challenged"] += 1
+    try:
+        invoice = await create_invoice(price_usd)
+    except circuit.CircuitOpen:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Payment system error: {e}")
+    headers = {
+        "X-402-Price": invoice["price"] or f"{price_usd:.2f}",
+        "X-402-Currency": invoice["currency"] or "",
+        "X-402-Invoice": invoice["invoice"] or "",
+        "X-402-PayTo": invoice["payto"] or "",
+        "X-402-Description": description,
+    }
+    body = invoice["body"] if error is None else {"error": error, "verification_error": detail, "invoice": invoice["body"]}
+    return PaymentRequired(body, headers)
+
+
+async def authorize(
+    request: HTTPConnection,
+    price_usd: float,
+    description: str,
+    resource: Optional[str] = None,
+    access_ttl: Optional[int] = None,
+) -> Payment:
+    """Return how the request paid for `resource`, or raise PaymentRequired / HTTPException(500)."""
+    resource = resource or request.url.path
+    if price_usd <= 0:
+        stats["free"] += 1
+        return Payment("free", resource)
+
+    token = request.headers.get("X-402-Access-Token") or request.cookies.get(ACCESS_COOKIE)
+    if token and access_token.verify(token, resource):
+        stats["access_token"] += 1
+        return Payment("access_token", resource)
+
+    h = request.headers
+    invoice, txid, mint, chain, amount = (
+        h.get("X-402-Invoice"), h.get("X-402-Proof-Tx"), h.get("X-402-Proof-Mint"), h.get("X-402-Chain"), h.get("X-402-Amount")
+    )
+    if not (invoice or txid):
+        raise await challenge(price_usd, description)
+
+    # Local checks first: each failure here costs no merchant round trip for verification.
+    problem = None
+    if not (invoice and txid and mint and chain and amount):
+        problem = "incomplete proof: X-402-Invoice, -Proof-Tx, -Proof-Mint, -Chain and -Amount are required"
+    elif not amount.isdigit() or int(amount) < required_units(price_usd):
+        problem = f"amount {amount} is below the {required_units(price_usd)} units required for {price_usd} USD"
+    elif spent.is_spent(invoice, txid):
+        problem = "proof already used"
+        stats["replayed"] += 1
+    if problem:
+        stats["rejected_local"] += 1
+        raise await challenge(price_usd, description, "Payment verification failed", problem)
+
+    ok, result = await verify_payment(invoice, {"txid": txid, "mint": mint, "chain": chain, "amount": amount})
+    if not ok:
+        stats["rejected_merchant"] += 1
+        raise await challenge(price_usd, description, "Payment verification failed", result.get("error"))
+    if not await anyio.to_thread.run_sync(spent.spend, invoice, txid, resource):
+        stats["replayed"] += 1
+        raise await challenge(price_usd, description, "Payment verification failed", "proof already used")
+
+    stats["verified"] += 1
+    return Payment(
+        "proof",
+        resource,
+        invoice=invoice,
+        txid=txid,
+        receipt=make_receipt(resource, invoice, txid, amount, price_usd),
+        access_token=access_token.mint(resource, access_ttl) if access_ttl else None,
+    )
+
+
+def apply_headers(response, payment: Payment) -> None:
+    if payment.receipt:
+        response.headers["X-402-Receipt"] = payment.receipt
+    if payment.access_token:
+        response.headers["X-402-Access-Token"] = payment.access_token
+
+
+async def release(payment: Payment) -> None:
+    """Give back a proof spent by a request that then failed (shed, upstream down, client gone).
+
+    The merchant answers "already_verified" for the invoice, so resending the same proof works.
+    """
+    if payment.via != "proof":
+        return
+    with anyio.CancelScope(shield=True):
+        await anyio.to_thread.run_sync(spent.release, payment.invoice, payment.txid)
+    stats["released"] += 1
+
+
+def paywall(price_usd: float, description: str, resource: Optional[str] = None, access_ttl: Optional[int] = None):
+    """FastAPI dependency: the route body runs only for requests that paid `price_usd`.
+
+    If the route then raises (429 from admission, 503 from a breaker, 5xx, client disconnect)
+    the proof is released, so the Retry-After those errors carry is honest.
+    """
+
+    async def dependency(request: Request, response: Response):
+        payment = await authorize(request, price_usd, description, resource, access_ttl)
+        apply_headers(response, payment)
+        try:
+            yield payment
+        except BaseException:
+            await release(payment)
+            raise
+
+    return dependency
+
+
+async def _payment_required(_request, exc: PaymentRequired):
+    return JSONResponse(exc.body, status_code=402, headers=exc.headers)
+
+
+def install(app) -> None:
+    app.add_exception_handler(PaymentRequired, _payment_required)
+
+
+def snapshot() -> Dict[str, Any]:
+    return dict(stats, merchant=MERCHANT_URL, circuit=circuit.breakers["merchant"].snapshot())
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Goodput under overload with and without admission control (app/admission.py).
+
+    python bench/bench_admission.py [--loads 10,20,40,80,160] [--seconds 5] [--json]
+
+Simulated upstream, modelled on an LLM API: requests take --service-s while at most
+--upstream-concurrency are in flight and slow down proportionally beyond that, and a token
+bucket of --upstream-rate req/s answers everything over it with a 429 (which the agents turn
+into a 500). Clients arrive open-loop (Poisson) at each offered load with a mix of $0.30
+and $0.80 requests. "direct" sends everything upstream as the agents used to; "admitted"
+goes through an admission Gate sized just under the upstream limits, so excess waits in the
+bounded priority queue or is shed early with 429 + Retry-After.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "app"))
+os.environ.setdefault("ADMIT_MAX_WAIT_S", "3")
+
+import admission  # noqa: E402
+
+PRICES = (0.30, 0.80)
+
+
+class Upstream:
+    def __init__(self, concurrency, rate, service_s):
+        self.concurrency = concurrency
+        self.rate = rate
+        self.service_s = service_s
+        self.tokens = rate
+        self.stamp = time.monotonic()
+        self.in_flight = 0
+
+    async def call(self):
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens < 1:
+            await asyncio.sleep(0.05)
+            raise RuntimeError("upstream 429")
+        self.tokens -= 1
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(self.service_s * max(1.0, self.in_flight / self.concurrency))
+        finally:
+            self.in_flight -= 1
+
+
+async def one(mode, upstream, gate, price, out):
+    start = time.monotonic()
+    try:
+        if mode == "admitted":
+            await gate.acquire(price)
+            try:
+                await upstream.call()
+            finally:
+                gate.release(time.monotonic() - start)
+        else:
+            await upstream.call()
+        out.append(("ok", price, time.monotonic() - start))
+    except admission.Overloaded:
+        out.append(("shed", price, time.monotonic() - start))
+    except RuntimeError:
+        out.append(("error", price, time.monotonic() - start))
+
+
+async def run(mode, load, args):
+    upstream = Upstream(args.upstream_concurrency, args.upstream_rate, args.service_s)
+    cfg = admission.GateConfig(
+        concurrency=args.upstream_concurrency, rate=args.upstream_rate * 0.9, burst=args.upstream_rate * 0.9, max_queue=args.queue
+    )
+    gate = admission.Gate("bench", cfg)
+    out, tasks = [], []
+    start = time.monotonic()
+    while time.monotonic() - start < args.seconds:
+        tasks.append(asyncio.ensure_future(one(mode, upstream, gate, random.choice(PRICES), out)))
+        await asyncio.sleep(random.expovariate(load))
+    await asyncio.gather(*tasks)
+    took = time.monotonic() - start
+    ok = [r for r in out if r[0] == "ok"]
+    lat = sorted(r[2] for r in ok)
+    return {
+        "offered_rps": load,
+        "goodput_rps": round(len(ok) / took, 1),
+        "ok": len(ok),
+        "shed_429": sum(r[0] == "shed" for r in out),
+        "errors_500": sum(r[0] == "error" for r in out),
+        "ok_share_0.80": round(sum(r[1] == 0.80 for r in ok) / max(len(ok), 1), 2),
+        "p50_s": round(lat[len(lat) // 2], 2) if lat else None,
+        "p95_s": round(lat[int(len(lat) * 0.95)], 2) if lat else None,
+        "shed_p50_s": round(statistics.median(r[2] for r in out if r[0] == "shed"), 3) if any(r[0] == "shed" for r in out) else None,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--loads", default="10,20,40,80,160", help="offered loads, requests/s")
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--upstream-concurrency", type=int, default=10)
+    ap.add_argument("--upstream-rate", type=float, default=25.0)
+    ap.add_argument("--service-s", type=float, default=0.4)
+    ap.add_argument("--queue", type=int, default=64)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    random.seed(7)
+    results = []
+    for load in (float(x) for x in args.loads.split(",")):
+        for mode in ("direct", "admitted"):
+            r = asyncio.run(run(mode, load, args))
+            r["mode"] = mode
+            results.append(r)
+            if not args.json:
+                print(
+                    f"{mode:9} offered {load:6.0f}/s  goodput {r['goodput_rps']:6.1f}/s  ok {r['ok']:5}  "
+                    f"429 {r['shed_429']:5}  500 {r['errors_500']:5}  $0.80 share {r['ok_share_0.80']:.2f}  "
+                    f"p50 {r['p50_s']}s  p95 {r['p95_s']}s  shed p50 {r['shed_p50_s']}s"
+                )
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Caller latency through an upstream brown-out, with and without a circuit breaker (app/circuit.py).
+
+    python bench/bench_circuit.py [--rps 20] [--seconds 12] [--brownout 3,9] [--timeout-s 2] [--json]
+
+Simulated upstream: answers in --service-s normally; between the --brownout start and end
+(seconds into the run) every call hangs until the caller's --timeout-s and fails, as a
+degraded CoinGecko or merchant does. Callers arrive open-loop at --rps. "timeout" lets every
+call wait the timeout as main.py and x402.py used to; "breaker" runs each call through a
+Breaker with the coingecko defaults scaled to the run (last 10 calls, slow at half the
+timeout, probe after --open-s). "worker-seconds" is the time callers spent blocked.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "app"))
+
+import circuit  # noqa: E402
+
+
+async def one(mode, breaker, args, t0, out):
+    start = time.monotonic()
+    phase = "brownout" if args.down[0] <= start - t0 < args.down[1] else "healthy"
+    try:
+        if mode == "breaker":
+            with breaker.guard():
+                await upstream(args, t0)
+        else:
+            await upstream(args, t0)
+        outcome = "ok"
+    except circuit.CircuitOpen:
+        outcome = "fast_fail"
+    except RuntimeError:
+        outcome = "timeout"
+    out.append((phase, outcome, time.monotonic() - start))
+
+
+async def upstream(args, t0):
+    if args.down[0] <= time.monotonic() - t0 < args.down[1]:
+        await asyncio.sleep(args.timeout_s)
+        raise RuntimeError("upstream timeout")
+    await asyncio.sleep(random.lognormvariate(0, 0.3) * args.service_s)
+
+
+async def run(mode, args):
+    cfg = circuit.BreakerConfig(
+        window_calls=10, window_s=10, min_calls=5, failure_ratio=0.5, slow_s=args.timeout_s * 0.5, slow_ratio=0.5,
+        open_s=args.open_s, open_max_s=args.open_s * 2, probes=1,
+    )
+    breaker = circuit.Breaker("bench", cfg)
+    out, tasks = [], []
+    t0 = time.monotonic()
+    while time.monotonic() - t0 < args.seconds:
+        tasks.append(asyncio.ensure_future(one(mode, breaker, args, t0, out)))
+        await asyncio.sleep(random.expovariate(args.rps))
+    await asyncio.gather(*tasks)
+    results = []
+    for phase in ("healthy", "brownout"):
+        rows = [r for r in out if r[0] == phase]
+        lat = sorted(r[2] for r in rows)
+        results.append({
+            "mode": mode,
+            "phase": phase,
+            "calls": len(rows),
+            "ok": sum(r[1] == "ok" for r in rows),
+            "timeouts": sum(r[1] == "timeout" for r in rows),
+            "fast_fails": sum(r[1] == "fast_fail" for r in rows),
+            "p50_s": round(lat[len(lat) // 2], 3) if lat else None,
+            "p99_s": round(lat[int(len(lat) * 0.99)], 3) if lat else None,
+            "worker_seconds": round(sum(lat), 1),
+        })
+    results[-1]["breaker"] = breaker.snapshot() if mode == "breaker" else None
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--rps", type=float, default=20)
+    ap.add_argument("--seconds", type=float, default=12)
+    ap.add_argument("--brownout", default="3,9", help="start,end seconds into the run")
+    ap.add_argument("--timeout-s", type=float, default=2.0)
+    ap.add_argument("--service-s", type=float, default=0.05)
+    ap.add_argument("--open-s", type=float, default=1.0)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+    args.down = [float(x) for x in args.brownout.split(",")]
+
+    random.seed(7)
+    results = [r for mode in ("timeout", "breaker") for r in asyncio.run(run(mode, args))]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        print(
+            f"{r['mode']:8} {r['phase']:9} calls {r['calls']:4}  ok {r['ok']:4}  timeouts {r['timeouts']:4}  "
+            f"fast-fail {r['fast_fails']:4}  p50 {r['p50_s']}s  p99 {r['p99_s']}s  worker-seconds {r['worker_seconds']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Memory and cold start: one uvicorn process per app vs app/gateway.py mounting them all.
+
+    python bench/bench_gateway.py [--timeout 60] [--json]
+
+"separate" starts `uvicorn <module>:app` for every app the gateway mounts, each on its own
+port; "gateway" starts `uvicorn gateway:app`. Cold start is spawn -> every /health answers;
+memory is the summed RSS/PSS of the launched process trees (see bench_supervisor.py).
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+sys.path.insert(0, HERE)
+
+from bench_supervisor import healthy_path, memory_kib, tree  # noqa: E402
+
+# module -> (standalone port, gateway prefix)
+APPS = {
+    "main": (8000, "/ohlcv"),
+    "research_agent": (8001, "/research"),
+    "blog_agent": (8002, "/blog"),
+    "tweet_agent": (8003, "/tweet"),
+    "image_agent": (8004, "/image"),
+    "script_agent": (8005, "/script"),
+    "swap_service": (8006, "/swap"),
+    "content_pipeline": (8007, "/pipeline"),
+    "link_shortner": (8010, "/links"),
+}
+GATEWAY_PORT = 8080
+
+
+def uvicorn_cmd(spec, port):
+    return [sys.executable, "-m", "uvicorn", spec, "--app-dir", "app", "--port", str(port), "--log-level", "error"]
+
+
+def measure(label, commands, probes, timeout):
+    start = time.perf_counter()
+    procs = [
+        subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+        for cmd in commands
+    ]
+    up = {probe: None for probe in probes}
+    while time.perf_counter() - start < timeout and any(v is None for v in up.values()):
+        for probe in up:
+            if up[probe] is None and healthy_path(*probe):
+                up[probe] = time.perf_counter() - start
+        time.sleep(0.05)
+    time.sleep(1.0)
+    pids = [p for proc in procs for p in tree(proc.pid)]
+    rss, pss = memory_kib(pids)
+    for proc in procs:
+        os.killpg(proc.pid, signal.SIGTERM)
+    for proc in procs:
+        proc.wait(30)
+    ready = [t for t in up.values() if t is not None]
+    time.sleep(2)
+    return {
+        "mode": label,
+        "apps_up": len(ready),
+        "apps": len(up),
+        "cold_start_s": round(max(ready), 2) if len(ready) == len(up) else None,
+        "processes": len(pids),
+        "rss_mib": round(rss / 1024, 1),
+        "pss_mib": round(pss / 1024, 1),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--timeout", type=float, default=60)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    runs = [
+        measure(
+            "separate",
+            [uvicorn_cmd(f"{m}:app", port) for m, (port, _) in APPS.items()],
+            [(port, "/health") for port, _ in APPS.values()],
+            args.timeout,
+        ),
+        measure(
+            "gateway",
+            [uvicorn_cmd("gateway:app", GATEWAY_PORT)],
+            [(GATEWAY_PORT, f"{prefix}/health") for _, prefix in APPS.values()],
+            args.timeout,
+        ),
+    ]
+    if args.json:
+        print(json.dumps(runs, indent=2))
+        return
+    print(f"{'mode':10} {'apps up':>8} {'cold start s':>13} {'procs':>6} {'RSS MiB':>9} {'PSS MiB':>9}")
+    for r in runs:
+        print(
+            f"{r['mode']:10} {r['apps_up']:>4}/{r['apps']:<3} {r['cold_start_s'] or '-':>13} "
+            f"{r['processes']:>6} {r['rss_mib']:>9} {r['pss_mib']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Tail latency with and without hedged requests (app/hedging.py).
+
+    python bench/bench_hedging.py [--requests 2000] [--concurrency 32] [--slow-p 0.05] [--json]
+
+Simulated providers, modelled on LLM APIs: each answers in a lognormal time around
+--median-s, and with probability --slow-p a request lands in the slow tail (--slow-s,
+e.g. a queued or overloaded replica). "single" calls the primary only, as the agents used
+to; "hedged" sets HEDGE_BENCH=anthropic so a second request goes out once the primary
+passes its learned p95. Reports p50/p95/p99 and how many extra requests hedging cost.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "app"))
+
+import hedging  # noqa: E402
+import providers  # noqa: E402
+
+
+def simulate(args, sent):
+    async def post_json(provider, url, headers, body, timeout=None):
+        sent.append(provider)
+        slow = random.random() < args.slow_p
+        await asyncio.sleep(args.slow_s if slow else random.lognormvariate(0, 0.25) * args.median_s)
+        return hedging.shaped(provider, provider)
+
+    providers.post_json = post_json
+
+
+async def run(mode, args):
+    os.environ["HEDGE_BENCH"] = "anthropic" if mode == "hedged" else ""
+    hedging.latencies = hedging.Latencies()
+    hedging.stats.clear()
+    sent, lat = [], []
+    simulate(args, sent)
+    target = hedging.Target("openai", hedging.OPENAI_BASE, {}, {"model": "gpt-4o", "messages": [{"role": "user", "content": "hi"}]})
+    queue = asyncio.Queue()
+    for _ in range(args.requests):
+        queue.put_nowait(None)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.monotonic()
+            await hedging.call("bench", target)
+            lat.append(time.monotonic() - start)
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    lat.sort()
+    pct = lambda q: round(lat[min(len(lat) - 1, int(len(lat) * q))], 3)  # noqa: E731
+    return {
+        "mode": mode,
+        "requests": len(lat),
+        "p50_s": pct(0.50),
+        "p95_s": pct(0.95),
+        "p99_s": pct(0.99),
+        "max_s": round(lat[-1], 3),
+        "extra_requests_pct": round(100 * (len(sent) - len(lat)) / len(lat), 1),
+        "won_by": dict(hedging.stats.get("bench", {}).get("won_by", {})),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--median-s", type=float, default=0.05)
+    ap.add_argument("--slow-p", type=float, default=0.05)
+    ap.add_argument("--slow-s", type=float, default=1.0)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    random.seed(7)
+    results = [asyncio.run(run(mode, args)) for mode in ("single", "hedged")]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        print(
+            f"{r['mode']:7} n {r['requests']:5}  p50 {r['p50_s']:.3f}s  p95 {r['p95_s']:.3f}s  p99 {r['p99_s']:.3f}s  "
+            f"max {r['max_s']:.3f}s  extra requests {r['extra_requests_pct']}%  won_by {r['won_by']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
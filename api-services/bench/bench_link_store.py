@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Link shortener storage: bulk load N links, then measure /s/{sid} resolve throughput.
+
+    python bench/bench_link_store.py [--links 10000000] [--lookups 500000] [--db /tmp/links-bench.db]
+
+Resolves are drawn from a skewed (Zipf-like) distribution over all stored ids, the way
+short links are actually clicked, and run against the raw SQLite backend and against the
+LRU-fronted store the service uses. An existing --db with enough rows is reused.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "app"))
+
+from link_store import CachedLinkStore, SQLiteLinkStore  # noqa: E402
+
+BATCH = 100_000
+
+
+def sid_for(i):
+    return f"lnk_{i:08x}"
+
+
+def load(store, n):
+    have = store.count()
+    if have >= n:
+        print(f"reusing {have:,} links")
+        return
+    start = time.perf_counter()
+    created = "2025-01-01T00:00:00+00:00"
+    for lo in range(have, n, BATCH):
+        hi = min(lo + BATCH, n)
+        store.put_many(
+            (sid_for(i), {"url": f"https://example.com/articles/{i}", "price_usd": 0.01, "created_at": created})
+            for i in range(lo, hi)
+        )
+    took = time.perf_counter() - start
+    print(f"loaded {n - have:,} links in {took:.1f}s ({(n - have) / took:,.0f}/s)")
+
+
+def skewed_ids(n, count, seed=7):
+    rng = random.Random(seed)
+    # Log-uniform ranks: each decade of popularity gets the same share of clicks, so a few ids
+    # are very hot and the long tail still sees traffic. The multiply scatters ranks over ids.
+    return [sid_for((int(n ** rng.random()) - 1) * 7919 % n) for _ in range(count)]
+
+
+def run(label, store, ids, threads):
+    chunks = [ids[i::threads] for i in range(threads)]
+    lat = [[] for _ in range(threads)]
+
+    def worker(k):
+        out, get, clock = lat[k], store.get, time.perf_counter
+        for sid in chunks[k]:
+            t0 = clock()
+            if get(sid) is None:
+                raise SystemExit(f"missing {sid}")
+            out.append(clock() - t0)
+
+    start = time.perf_counter()
+    ts = [threading.Thread(target=worker, args=(k,)) for k in range(threads)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    took = time.perf_counter() - start
+    all_lat = sorted(x for l in lat for x in l)
+    q = statistics.quantiles(all_lat, n=100)
+    print(
+        f"{label:22} {len(ids) / took:>12,.0f} ops/s   p50 {q[49] * 1e6:7.1f}us   p99 {q[98] * 1e6:7.1f}us"
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--links", type=int, default=10_000_000)
+    ap.add_argument("--lookups", type=int, default=500_000)
+    ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--cache", type=int, default=100_000, help="LRU capacity")
+    ap.add_argument("--db", default="/tmp/links-bench.db")
+    args = ap.parse_args()
+
+    backend = SQLiteLinkStore(args.db)
+    load(backend, args.links)
+    print(f"db size {os.path.getsize(args.db) / 2**20:,.0f} MiB")
+
+    ids = skewed_ids(args.links, args.lookups)
+    uniform = [sid_for(random.randrange(args.links)) for _ in range(args.lookups // 5)]
+    print(f"{len(set(ids)):,} distinct ids in {len(ids):,} skewed lookups, {args.threads} threads")
+    run("sqlite (uniform)", backend, uniform, args.threads)
+    run("sqlite (skewed)", backend, ids, args.threads)
+    cached = CachedLinkStore(backend, args.cache)
+    run("lru+sqlite (cold)", cached, ids, args.threads)
+    run("lru+sqlite (warm)", cached, ids, args.threads)
+    print(f"lru {cached.snapshot()['cache']}")
+
+
+if __name__ == "__main__":
+    main()
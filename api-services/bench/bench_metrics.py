@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Overhead of the metrics instrumentation (app/metrics.py).
+
+    python bench/bench_metrics.py [--requests 20000] [--stages 200000] [--json]
+
+Two measurements, in process so network noise does not hide the difference:
+  stage    cost of one `with metrics.stage(...)` block, enabled vs the METRICS=0 no-op
+  request  per-request latency of a small JSON route driven straight through the ASGI app
+           (no sockets), plain vs metrics.install(app): middleware, route label, histogram
+           and the json.encode timer
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "app"))
+
+from fastapi import FastAPI  # noqa: E402
+
+import metrics  # noqa: E402
+
+BODY = {"symbol": "btc", "count": 3, "ohlcv": [{"open": 1.0, "high": 2.0, "low": 0.5, "close": 1.5}] * 3}
+
+
+def bench_stage(n):
+    out = {}
+    for label, enabled in (("disabled", False), ("enabled", True)):
+        metrics.ENABLED = enabled
+        start = time.perf_counter()
+        for _ in range(n):
+            with metrics.stage("bench.stage"):
+                pass
+        out[label] = (time.perf_counter() - start) / n * 1e9
+    metrics.ENABLED = True
+    return {"stage_ns_disabled": round(out["disabled"]), "stage_ns_enabled": round(out["enabled"])}
+
+
+def build(instrumented):
+    app = FastAPI(title=f"bench-{instrumented}")
+    if instrumented:
+        metrics.install(app)
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: str):
+        return dict(BODY, id=item_id)
+
+    return app
+
+
+async def drive(app, n):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/items/42", "raw_path": b"/items/42", "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    lat = []
+    for _ in range(n):
+        start = time.perf_counter()
+        await app(dict(scope), receive, send)
+        lat.append(time.perf_counter() - start)
+    return lat
+
+
+def bench_requests(n, rounds=20):
+    apps = {"plain": build(False), "metrics": build(True)}
+    lat = {label: [] for label in apps}
+    for app in apps.values():
+        asyncio.run(drive(app, 500))  # warm up (middleware stack is built on first call)
+    for _ in range(rounds):  # interleaved, so drift on a busy machine hits both sides alike
+        for label, app in apps.items():
+            lat[label] += asyncio.run(drive(app, n // rounds))
+    out = {}
+    for label, xs in lat.items():
+        out[f"request_us_p50_{label}"] = round(statistics.median(xs) * 1e6, 1)
+        out[f"request_us_mean_{label}"] = round(statistics.fmean(xs) * 1e6, 1)
+    out["request_overhead_us_p50"] = round(out["request_us_p50_metrics"] - out["request_us_p50_plain"], 1)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--requests", type=int, default=20000)
+    ap.add_argument("--stages", type=int, default=200000)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    result = dict(bench_stage(args.stages), **bench_requests(args.requests))
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    for key, value in result.items():
+        print(f"{key:28} {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Prompt size before/after research compaction for the blog, tweet and script agents.
+
+    python bench/bench_prompt_budget.py [--copies 4] [--budget 1200]
+
+Builds each agent's provider request from fixtures/research_*.txt (repeated --copies
+times, the way fanned-out research tends to repeat itself) with and without the
+research budget, and prints research/prompt tokens and the assembly time.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "app"))
+
+import prompting  # noqa: E402
+from blog_agent import build_blog_request  # noqa: E402
+from tweet_agent import build_tweet_request  # noqa: E402
+from script_agent import build_script_request  # noqa: E402
+
+TOPIC = "Solana DeFi adoption in India"
+BUILDERS = {
+    "blog": lambda research: build_blog_request(TOPIC, research, 1500),
+    "tweet": lambda research: build_tweet_request(TOPIC, research, 10),
+    "script": lambda research: build_script_request(TOPIC, 60, "educational", research),
+}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--copies", type=int, default=4, help="times the research fixture is repeated")
+    ap.add_argument("--budget", type=int, default=prompting.DEFAULT_RESEARCH_BUDGET)
+    args = ap.parse_args()
+
+    print(f"tokenizer: {'tiktoken' if prompting._encoding is not None else 'local estimate'}")
+    for path in sorted(glob.glob(os.path.join(HERE, "fixtures", "research_*.txt"))):
+        with open(path) as f:
+            research = "\n\n".join([f.read()] * args.copies)
+        print(f"\n{os.path.basename(path)} x{args.copies}")
+        print(f"{'agent':8} {'research':>14} {'prompt':>14} {'max_tokens':>10} {'build_ms':>9}")
+        for agent, build in BUILDERS.items():
+            os.environ[f"PROMPT_RESEARCH_BUDGET_{agent.upper()}"] = str(10 ** 9)
+            _, _, full = build(research)
+            os.environ[f"PROMPT_RESEARCH_BUDGET_{agent.upper()}"] = str(args.budget)
+            start = time.perf_counter()
+            _, _, slim = build(research)
+            build_ms = (time.perf_counter() - start) * 1000
+            print(
+                f"{agent:8} {full['research_tokens_after']:>6} -> {slim['research_tokens_after']:<5} "
+                f"{full['prompt_tokens']:>6} -> {slim['prompt_tokens']:<5} {slim['max_tokens']:>10} {build_ms:>9.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Serialized size and encode time of swap-agent results: full vs --slim.
+
+    python bench/bench_route_encoding.py [--iterations 20000]
+
+Runs over every fixtures/quote_*.json. The checked-in quote fixtures are hand-assembled
+in the /swap/v1/quote schema (real mints and AMM labels, made-up keys and amounts), not
+recorded responses; to measure real routes, save responses next to them, e.g.
+
+    curl 'https://lite-api.jup.ag/swap/v1/quote?inputMint=...&outputMint=...&amount=...&slippageBps=50' \\
+        > bench/fixtures/quote_<name>.json
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "app"))
+
+from swap_agent import quote_swap  # noqa: E402
+from compact_route import encode, orjson  # noqa: E402
+
+
+class FixtureClient:
+    """Stands in for JupiterClient: returns one recorded quote, no network."""
+
+    def __init__(self, quote_json):
+        self.quote_json = quote_json
+
+    def quote(self, *_):
+        return self.quote_json
+
+    best_route_from_quote = staticmethod(lambda q: q)
+
+
+def per_call_us(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--iterations", type=int, default=20000)
+    args = ap.parse_args()
+
+    print(f"encoder: {'orjson' if orjson else 'stdlib json'}")
+    print(f"{'fixture':<28}{'hops':>5}{'full B':>9}{'slim B':>9}{'size x':>8}{'full us':>10}{'slim us':>10}{'time x':>8}")
+    for path in sorted(glob.glob(os.path.join(HERE, "fixtures", "quote_*.json"))):
+        with open(path) as f:
+            quote_json = json.load(f)
+        in_mint, out_mint = quote_json["inputMint"], quote_json["outputMint"]
+        client = FixtureClient(quote_json)
+        args_ = (client, in_mint, out_mint, 1.0, quote_json["slippageBps"], 9)
+
+        # Everything the agent does per route after the network call: build the
+        # result (steps or compact route) and serialize it.
+        def full():
+            return json.dumps(quote_swap(*args_), separators=(",", ":")).encode()
+
+        def slim():
+            return encode(quote_swap(*args_, slim=True, keep_raw=False))
+
+        full_b, slim_b = full(), slim()
+        full_us = per_call_us(full, args.iterations)
+        slim_us = per_call_us(slim, args.iterations)
+
+        name = os.path.basename(path)[len("quote_"):-len(".json")]
+        print(
+            f"{name:<28}{len(quote_json['routePlan']):>5}{len(full_b):>9}{len(slim_b):>9}"
+            f"{len(full_b) / len(slim_b):>8.1f}{full_us:>10.1f}{slim_us:>10.1f}{full_us / slim_us:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Startup time and memory: start_services.py (legacy launcher) vs supervisor.py.
+
+    python bench/bench_supervisor.py [--workers 1 4] [--timeout 60] [--json]
+
+For each launcher: time from spawn until every service answers GET /health, then the
+process tree's total RSS and PSS (PSS splits copy-on-write pages shared between forked
+workers, so it is the honest number for "how much memory does this cost").
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+sys.path.insert(0, ROOT)
+
+from start_services import SERVICES  # noqa: E402
+
+
+def tree(pid):
+    children = {}
+    for p in os.listdir("/proc"):
+        if p.isdigit():
+            try:
+                with open(f"/proc/{p}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError):
+                continue
+            children.setdefault(ppid, []).append(int(p))
+    out, stack = [], [pid]
+    while stack:
+        p = stack.pop()
+        out.append(p)
+        stack.extend(children.get(p, []))
+    return out
+
+
+def memory_kib(pids):
+    rss = pss = 0
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/smaps_rollup") as f:
+                for line in f:
+                    if line.startswith("Rss:"):
+                        rss += int(line.split()[1])
+                    elif line.startswith("Pss:"):
+                        pss += int(line.split()[1])
+        except OSError:
+            pass
+    return rss, pss
+
+
+def healthy_path(port, path="/health"):
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=1) as r:
+            return r.status == 200
+    except Exception:
+        return False
+
+
+def measure(label, cmd, timeout):
+    env = dict(os.environ, LOG_LEVEL="error")
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    ports = {port: None for _, port, _ in SERVICES}
+    while time.perf_counter() - start < timeout and any(v is None for v in ports.values()):
+        for port in ports:
+            if ports[port] is None and healthy_path(port):
+                ports[port] = time.perf_counter() - start
+        time.sleep(0.05)
+    time.sleep(1.0)  # let lazily-started threads settle before sampling memory
+    pids = tree(proc.pid)
+    rss, pss = memory_kib(pids)
+    os.killpg(proc.pid, signal.SIGTERM)
+    try:
+        proc.wait(30)
+    except subprocess.TimeoutExpired:
+        os.killpg(proc.pid, signal.SIGKILL)
+    up = [t for t in ports.values() if t is not None]
+    result = {
+        "launcher": label,
+        "services_up": len(up),
+        "services": len(ports),
+        "all_up_s": round(max(up), 2) if len(up) == len(ports) else None,
+        "last_up_s": round(max(up), 2) if up else None,
+        "processes": len(pids),
+        "rss_mib": round(rss / 1024, 1),
+        "pss_mib": round(pss / 1024, 1),
+        "not_up": [p for p, t in ports.items() if t is None],
+    }
+    time.sleep(2)  # ports free again
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    ap.add_argument("--timeout", type=float, default=60)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    runs = [measure("start_services.py", [sys.executable, "start_services.py"], args.timeout)]
+    for w in args.workers:
+        runs.append(measure(f"supervisor x{w}", [sys.executable, "supervisor.py", "--workers", str(w)], args.timeout))
+
+    if args.json:
+        print(json.dumps(runs, indent=2))
+        return
+    print(f"{'launcher':20} {'up':>6} {'last up s':>10} {'procs':>6} {'RSS MiB':>9} {'PSS MiB':>9}  not up")
+    for r in runs:
+        print(
+            f"{r['launcher']:20} {r['services_up']:>2}/{r['services']:<3} {r['last_up_s'] or '-':>10} "
+            f"{r['processes']:>6} {r['rss_mib']:>9} {r['pss_mib']:>9}  {r['not_up'] or ''}"
+        )
+
+
+if __name__ == "__main__":
+    main()
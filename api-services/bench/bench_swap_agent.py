@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Swap-agent load benchmark: throughput and tail latency at increasing concurrency.
+
+    python bench/bench_swap_agent.py --spawn-standin                  # library + CLI against the stand-in
+    python bench/bench_swap_agent.py --base-url http://127.0.0.1:8099 --mode lib --levels 1,8,32,128
+    python bench/bench_swap_agent.py --spawn-standin --json bench_swap.json
+
+Modes:
+  lib  one shared JupiterClient driven from a thread pool (what swap_service does)
+  cli  one `python app/swap_agent.py` process per quote (what the runner does today)
+
+Point --base-url at jupiter_standin.py; never at the public lite-api.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP = os.path.join(HERE, "..", "app")
+sys.path.insert(0, APP)
+
+from swap_agent import JupiterClient, quote_swap  # noqa: E402
+
+PAIRS = [("SOL", "USDC", 0.1), ("SOL", "USDC", 25.0), ("BONK", "SOL", 5_000_000.0), ("USDC", "mSOL", 100.0)]
+USER_PUBKEY = "9WzDXwBbmkg8ZTbNMqUxvQRAyrZzDsGYdLVL9zYtAWWM"
+
+
+def percentile(sorted_vals, p):
+    if not sorted_vals:
+        return None
+    k = min(len(sorted_vals) - 1, max(0, int(round(p / 100 * (len(sorted_vals) - 1)))))
+    return sorted_vals[k]
+
+
+def lib_call(client, with_instructions):
+    def call(i):
+        inp, out, amount = PAIRS[i % len(PAIRS)]
+        res = quote_swap(client, inp, out, amount, 50)
+        if not res.get("ok"):
+            raise RuntimeError(res.get("error"))
+        if with_instructions:
+            client.swap_instructions(USER_PUBKEY, JupiterClient.prepare_quote_for_swap(res["raw"]))
+    return call
+
+
+def cli_call(base_url, slim):
+    def call(i):
+        inp, out, amount = PAIRS[i % len(PAIRS)]
+        cmd = [sys.executable, os.path.join(APP, "swap_agent.py"), "--in", inp, "--out", out,
+               "--amount", str(amount), "--base-url", base_url]
+        if slim:
+            cmd.append("--slim")
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if not json.loads(proc.stdout).get("ok"):
+            raise RuntimeError(proc.stdout[:200])
+    return call
+
+
+def run_level(call, concurrency, requests_per_level):
+    latencies, errors = [], 0
+
+    def timed(i):
+        t0 = time.perf_counter()
+        try:
+            call(i)
+            return time.perf_counter() - t0, None
+        except Exception as e:  # noqa: BLE001 - any failure counts as an error sample
+            return time.perf_counter() - t0, e
+
+    t_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for dt, err in pool.map(timed, range(requests_per_level)):
+            if err is None:
+                latencies.append(dt)
+            else:
+                errors += 1
+    wall = time.perf_counter() - t_start
+    latencies.sort()
+    ms = lambda v: round(v * 1000, 2) if v is not None else None  # noqa: E731
+    return {
+        "concurrency": concurrency,
+        "requests": requests_per_level,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else None,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+    }
+
+
+def spawn_standin(port, latency, error_rate):
+    proc = subprocess.Popen([
+        sys.executable, os.path.join(HERE, "jupiter_standin.py"), "--port", str(port),
+        "--latency", latency, "--error-rate", str(error_rate),
+    ])
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            requests.get(f"{base_url}/_standin/stats", timeout=0.5)
+            return proc, base_url
+        except requests.RequestException:
+            time.sleep(0.1)
+    proc.terminate()
+    raise SystemExit("stand-in did not come up")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Swap-agent throughput / tail-latency benchmark.")
+    ap.add_argument("--base-url", default="http://127.0.0.1:8099")
+    ap.add_argument("--mode", choices=["lib", "cli", "both"], default="both")
+    ap.add_argument("--levels", default="1,4,16,64", help="Library concurrency levels")
+    ap.add_argument("--cli-levels", default="1,4,8", help="CLI concurrency levels (each request is a process)")
+    ap.add_argument("--requests", type=int, default=400, help="Requests per library level")
+    ap.add_argument("--cli-requests", type=int, default=40, help="Requests per CLI level")
+    ap.add_argument("--with-instructions", action="store_true", help="Library mode: also fetch swap-instructions")
+    ap.add_argument("--slim", action="store_true", help="CLI mode: pass --slim")
+    ap.add_argument("--spawn-standin", action="store_true", help="Start jupiter_standin.py for the run")
+    ap.add_argument("--standin-port", type=int, default=8099)
+    ap.add_argument("--standin-latency", default="lognormal:40,0.4")
+    ap.add_argument("--standin-error-rate", type=float, default=0.0)
+    ap.add_argument("--json", dest="json_out", default=None, help="Write results to this file")
+    args = ap.parse_args()
+
+    standin = None
+    base_url = args.base_url
+    if args.spawn_standin:
+        standin, base_url = spawn_standin(args.standin_port, args.standin_latency, args.standin_error_rate)
+
+    results = []
+    try:
+        if args.mode in ("lib", "both"):
+            levels = [int(x) for x in args.levels.split(",")]
+            client = JupiterClient(base_url=base_url, pool_size=max(levels))
+            call = lib_call(client, args.with_instructions)
+            call(0)  # warm the connection pool
+            for c in levels:
+                results.append(dict(mode="lib", **run_level(call, c, args.requests)))
+        if args.mode in ("cli", "both"):
+            call = cli_call(base_url, args.slim)
+            for c in [int(x) for x in args.cli_levels.split(",")]:
+                results.append(dict(mode="cli", **run_level(call, c, args.cli_requests)))
+    finally:
+        if standin:
+            standin.terminate()
+            standin.wait()
+
+    print(f"{'mode':<5}{'conc':>6}{'reqs':>7}{'errs':>6}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for r in results:
+        print(f"{r['mode']:<5}{r['concurrency']:>6}{r['requests']:>7}{r['errors']:>6}{r['throughput_rps']:>9}"
+              f"{r['p50_ms']!s:>9}{r['p95_ms']!s:>9}{r['p99_ms']!s:>9}")
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump({"base_url": base_url, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Per-request cost of the shared x402 paywall (app/x402.py), by decision path.
+
+    python bench/bench_x402.py [--requests 2000] [--latency fixed:0] [--json]
+
+A throwaway FastAPI app exposes the same handler three ways: unpaywalled (baseline), behind
+paywall(0) (free) and behind paywall(0.01). Requests go through the ASGI stack in-process,
+so the numbers are the paywall's own overhead plus, where the path needs it, the round trip
+to bench/merchant_standin.py (started here with --latency) over the shared merchant pool.
+
+Paths: baseline, free, access_token (signed token from an earlier payment), proof (fresh
+invoice + proof, one merchant /verify), replay (already-spent proof, refused locally before
+/verify, then re-challenged), challenge (no payment headers: one merchant /invoice).
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "app"))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_merchant(port, latency):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "merchant_standin.py"), "--port", str(port), "--latency", latency],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise SystemExit("merchant stand-in did not start")
+
+
+def build_app(x402):
+    from fastapi import Depends, FastAPI
+
+    app = FastAPI()
+    x402.install(app)
+
+    @app.get("/open")
+    async def open_():
+        return {"ok": True}
+
+    @app.get("/free")
+    async def free(payment: x402.Payment = Depends(x402.paywall(0, "bench"))):
+        return {"ok": True}
+
+    @app.get("/paid")
+    async def paid(payment: x402.Payment = Depends(x402.paywall(PRICE, "bench"))):
+        return {"ok": True}
+
+    return app
+
+
+PRICE = 0.01
+
+
+async def run(args):
+    import httpx
+    import access_token
+    import providers
+    import x402
+
+    app = build_app(x402)
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+    token = access_token.mint("/paid", 3600)
+    amount = str(round(PRICE * 1_000_000))
+
+    async def invoice():
+        r = await client.get("/paid")
+        assert r.status_code == 402, r.status_code
+        return r.headers["X-402-Invoice"]
+
+    def proof(inv, txid):
+        return {"X-402-Invoice": inv, "X-402-Proof-Tx": txid, "X-402-Proof-Mint": "mint", "X-402-Chain": "solana", "X-402-Amount": amount}
+
+    spent_inv = await invoice()
+    spent_tx = uuid.uuid4().hex
+    r = await client.get("/paid", headers=proof(spent_inv, spent_tx))
+    assert r.status_code == 200 and "X-402-Receipt" in r.headers, (r.status_code, r.text)
+
+    async def proof_path():
+        # A fresh invoice per request, fetched outside the timed section.
+        return "/paid", proof(await invoice(), uuid.uuid4().hex), 200
+
+    cases = {
+        "baseline": lambda: ("/open", {}, 200),
+        "free": lambda: ("/free", {}, 200),
+        "access_token": lambda: ("/paid", {"X-402-Access-Token": token}, 200),
+        "proof": proof_path,
+        "replay": lambda: ("/paid", proof(spent_inv, spent_tx), 402),
+        "challenge": lambda: ("/paid", {}, 402),
+    }
+    results = {}
+    for name, make in cases.items():
+        n = args.requests // 4 if name in ("proof", "replay", "challenge") else args.requests
+        lat = []
+        for _ in range(n):
+            req = make()
+            path, headers, want = await req if asyncio.iscoroutine(req) else req
+            t0 = time.perf_counter()
+            r = await client.get(path, headers=headers)
+            lat.append(time.perf_counter() - t0)
+            assert r.status_code == want, (name, r.status_code, r.text)
+        q = statistics.quantiles(lat, n=100)
+        results[name] = {"requests": n, "p50_us": q[49] * 1e6, "p99_us": q[98] * 1e6}
+
+    base = results["baseline"]["p50_us"]
+    for v in results.values():
+        v["overhead_p50_us"] = v["p50_us"] - base
+    await client.aclose()
+    await providers.aclose_all()
+    return results, x402.snapshot()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--latency", default="fixed:0", help="merchant stand-in latency spec (ms)")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    port = free_port()
+    os.environ["X402_URL"] = f"http://127.0.0.1:{port}"
+    os.environ["X402_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="x402-bench-"), "x402.db")
+    merchant = start_merchant(port, args.latency)
+    try:
+        results, stats = asyncio.run(run(args))
+    finally:
+        merchant.terminate()
+        merchant.wait()
+
+    if args.json:
+        print(json.dumps({"merchant_latency": args.latency, "paths": results, "stats": stats}, indent=2))
+        return
+    print(f"merchant latency {args.latency}")
+    for name, v in results.items():
+        print(
+            f"{name:13} n={v['requests']:<5} p50 {v['p50_us']:9.1f}us  p99 {v['p99_us']:9.1f}us"
+            f"  overhead p50 {v['overhead_p50_us']:+9.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Local CoinGecko stand-in for the OHLCV service (app/main.py).
+
+    python bench/coingecko_standin.py --port 8097 --latency lognormal:120,0.5 --error-rate 0.02 --error-status 429
+    COINGECKO_BASE=http://127.0.0.1:8097/api/v3 python app/main.py
+
+Endpoints:
+  GET /api/v3/coins/{id}/ohlc?vs_currency=&days=   [[ms, open, high, low, close], ...] with
+                                                   CoinGecko's candle sizes: 30 minutes up to 2
+                                                   days, 4 hours up to 30, 4 days beyond
+  GET /api/v3/ping
+
+Prices are a seeded random walk per coin, so the same request gets the same candles for
+the current 30-minute slot. Unknown coin ids answer 404 like the real API. Latency specs
+as in jupiter_standin.py; --error-status 429 carries Retry-After.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from jupiter_standin import parse_latency
+
+COINS = {
+    "bitcoin": 65000.0, "ethereum": 3200.0, "solana": 150.0, "avalanche-2": 30.0, "dogecoin": 0.15,
+    "matic-network": 0.7, "cardano": 0.45, "binancecoin": 580.0, "polkadot": 6.5, "litecoin": 80.0, "ripple": 0.55,
+}
+MINUTE_MS = 60_000
+
+
+def candles(coin_id: str, vs_currency: str, days: str) -> list:
+    n_days = 365 * 5 if days == "max" else max(1, int(float(days)))
+    step = 30 if n_days <= 2 else 240 if n_days <= 30 else 4 * 1440
+    rows = n_days * 1440 // step
+    now = int(time.time() * 1000) // (30 * MINUTE_MS) * (30 * MINUTE_MS)
+    rng = random.Random(f"{coin_id}:{vs_currency}:{days}:{now}")
+    price = COINS[coin_id]
+    out = []
+    for i in range(rows):
+        o = price
+        c = max(o * (1 + rng.gauss(0, 0.01)), 1e-9)
+        h = max(o, c) * (1 + abs(rng.gauss(0, 0.004)))
+        lo = min(o, c) * (1 - abs(rng.gauss(0, 0.004)))
+        out.append([now - (rows - 1 - i) * step * MINUTE_MS, round(o, 6), round(h, 6), round(lo, 6), round(c, 6)])
+        price = c
+    return out
+
+
+def create_app(latency, error_rate: float = 0.0, error_status: int = 500) -> FastAPI:
+    app = FastAPI(title="CoinGecko stand-in")
+    app.state.counts = {"ohlc": 0, "not_found": 0, "errors": 0}
+
+    @app.get("/api/v3/ping")
+    def ping():
+        return {"gecko_says": "(V3) To the Moon!"}
+
+    @app.get("/api/v3/coins/{coin_id}/ohlc")
+    async def ohlc(coin_id: str, vs_currency: str = "usd", days: str = "1"):
+        app.state.counts["ohlc"] += 1
+        await asyncio.sleep(latency())
+        if error_rate and random.random() < error_rate:
+            app.state.counts["errors"] += 1
+            headers = {"Retry-After": "1"} if error_status == 429 else None
+            return JSONResponse({"status": {"error_code": error_status, "error_message": "injected failure"}},
+                                status_code=error_status, headers=headers)
+        if coin_id not in COINS:
+            app.state.counts["not_found"] += 1
+            return JSONResponse({"error": "coin not found"}, status_code=404)
+        if days != "max":
+            try:
+                float(days)
+            except ValueError:
+                return JSONResponse({"error": "invalid days"}, status_code=400)
+        return candles(coin_id, vs_currency, days)
+
+    @app.get("/_standin/stats")
+    def stats():
+        return app.state.counts
+
+    return app
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Serve CoinGecko-shaped OHLC candles locally.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8097)
+    ap.add_argument("--latency", default="lognormal:120,0.5", help="latency spec in ms")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with --error-status")
+    ap.add_argument("--error-status", type=int, default=500)
+    args = ap.parse_args()
+
+    import uvicorn
+    uvicorn.run(create_app(parse_latency(args.latency), args.error_rate, args.error_status),
+                host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Local Jupiter stand-in that replays recorded responses from bench/fixtures.
+
+    python bench/jupiter_standin.py --port 8099 --latency lognormal:40,0.5 --error-rate 0.01
+    python app/swap_agent.py --in SOL --out USDC --amount 0.1 --base-url http://127.0.0.1:8099
+
+Endpoints:
+  GET  /swap/v1/quote              quote_*.json picked by (inputMint, outputMint), amounts rescaled
+  GET  /ultra/v1/search            search_tokens.json filtered by ?query=
+  POST /swap/v1/swap-instructions  swap_instructions.json
+
+Latency specs (milliseconds): fixed:MS | uniform:LO,HI | normal:MEAN,SD | lognormal:MEDIAN,SIGMA
+Any response saved from the real API can be dropped into fixtures/ under the same names.
+"""
+import argparse
+import asyncio
+import copy
+import glob
+import json
+import math
+import os
+import random
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join(HERE, "fixtures")
+
+
+def parse_latency(spec: str):
+    """Turn a latency spec into a zero-arg sampler returning seconds."""
+    kind, _, args = spec.partition(":")
+    nums = [float(x) for x in args.split(",")] if args else []
+    if kind == "fixed":
+        return lambda: nums[0] / 1000
+    if kind == "uniform":
+        return lambda: random.uniform(nums[0], nums[1]) / 1000
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(nums[0], nums[1])) / 1000
+    if kind == "lognormal":
+        mu = math.log(nums[0])
+        return lambda: random.lognormvariate(mu, nums[1]) / 1000
+    raise ValueError(f"bad latency spec '{spec}'")
+
+
+def load_fixtures(path: str = FIXTURES):
+    quotes = {}
+    for p in sorted(glob.glob(os.path.join(path, "quote_*.json"))):
+        with open(p) as f:
+            q = json.load(f)
+        quotes.setdefault((q["inputMint"], q["outputMint"]), q)
+    with open(os.path.join(path, "search_tokens.json")) as f:
+        tokens = json.load(f)
+    with open(os.path.join(path, "swap_instructions.json")) as f:
+        instructions = json.load(f)
+    return quotes, tokens, instructions
+
+
+def rescale_quote(q: dict, input_mint: str, output_mint: str, amount: int, slippage_bps: int) -> dict:
+    """Reuse a recorded route for any amount/pair, keeping its shape and price."""
+    q = copy.deepcopy(q)
+    ratio = amount / int(q["inAmount"]) if int(q["inAmount"]) else 1.0
+    out_amount = int(int(q["outAmount"]) * ratio)
+    q.update({
+        "inputMint": input_mint,
+        "outputMint": output_mint,
+        "inAmount": str(amount),
+        "outAmount": str(out_amount),
+        "otherAmountThreshold": str(out_amount * (10_000 - slippage_bps) // 10_000),
+        "slippageBps": slippage_bps,
+    })
+    for leg in q["routePlan"]:
+        info = leg["swapInfo"]
+        info["inAmount"] = str(int(int(info["inAmount"]) * ratio))
+        info["outAmount"] = str(int(int(info["outAmount"]) * ratio))
+    return q
+
+
+def create_app(latency: dict, error_rate: float = 0.0, error_status: int = 500, fixtures: str = FIXTURES) -> FastAPI:
+    """Build the stand-in; `latency` maps quote/search/instructions to samplers."""
+    quotes, tokens, instructions = load_fixtures(fixtures)
+    fallback = next(iter(quotes.values()))
+    app = FastAPI(title="Jupiter stand-in")
+    app.state.counts = {"quote": 0, "search": 0, "instructions": 0, "errors": 0}
+
+    async def shape(kind: str):
+        app.state.counts[kind] += 1
+        await asyncio.sleep(latency[kind]())
+        if error_rate and random.random() < error_rate:
+            app.state.counts["errors"] += 1
+            return JSONResponse({"error": "injected failure"}, status_code=error_status)
+        return None
+
+    @app.get("/swap/v1/quote")
+    async def quote(inputMint: str, outputMint: str, amount: int, slippageBps: int = 50):
+        err = await shape("quote")
+        if err:
+            return err
+        recorded = quotes.get((inputMint, outputMint), fallback)
+        return rescale_quote(recorded, inputMint, outputMint, amount, slippageBps)
+
+    @app.get("/ultra/v1/search")
+    async def search(query: str = ""):
+        err = await shape("search")
+        if err:
+            return err
+        q = query.lower()
+        return [t for t in tokens if q in t["symbol"].lower() or q in t["name"].lower() or q == t["id"].lower()]
+
+    @app.post("/swap/v1/swap-instructions")
+    async def swap_instructions(request: Request):
+        err = await shape("instructions")
+        if err:
+            return err
+        body = await request.json()
+        if "quoteResponse" not in body or "userPublicKey" not in body:
+            return JSONResponse({"error": "quoteResponse and userPublicKey required"}, status_code=400)
+        return instructions
+
+    @app.get("/_standin/stats")
+    def stats():
+        return app.state.counts
+
+    return app
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay recorded Jupiter responses locally.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8099)
+    ap.add_argument("--latency", default="lognormal:40,0.4", help="Default latency spec for every endpoint")
+    ap.add_argument("--quote-latency", default=None)
+    ap.add_argument("--search-latency", default=None)
+    ap.add_argument("--instructions-latency", default=None)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with --error-status")
+    ap.add_argument("--error-status", type=int, default=500)
+    ap.add_argument("--fixtures", default=FIXTURES)
+    args = ap.parse_args()
+
+    latency = {
+        "quote": parse_latency(args.quote_latency or args.latency),
+        "search": parse_latency(args.search_latency or args.latency),
+        "instructions": parse_latency(args.instructions_latency or args.latency),
+    }
+
+    import uvicorn
+    uvicorn.run(
+        create_app(latency, args.error_rate, args.error_status, args.fixtures),
+        host=args.host, port=args.port, log_level="warning",
+    )
+
+
+if __name__ == "__main__":
+    main()
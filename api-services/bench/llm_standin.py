@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the LLM and image providers the content agents call.
+
+    python bench/llm_standin.py --port 8098 --latency lognormal:300,0.4 --token-latency fixed:5 --error-rate 0.01
+    OPENAI_API_BASE=http://127.0.0.1:8098/openai/v1 \\
+    ANTHROPIC_API_BASE=http://127.0.0.1:8098/anthropic/v1 \\
+    GEMINI_API_BASE=http://127.0.0.1:8098/gemini/v1beta \\
+    PERPLEXITY_API_BASE=http://127.0.0.1:8098/perplexity python app/gateway.py
+
+Endpoints (one path prefix per provider, same request/response shapes as the real APIs):
+  POST /openai/v1/chat/completions                   chat.completion, or SSE chunks + [DONE] with "stream": true
+  POST /openai/v1/images/generations                 n images as "url" (served from /openai/files/) or "b64_json"
+  POST /anthropic/v1/messages                        message, or message_start .. content_block_delta .. message_stop
+  POST /gemini/v1beta/models/{model}:generateContent
+  POST /gemini/v1beta/models/{model}:streamGenerateContent?alt=sse
+  POST /perplexity/chat/completions                  OpenAI shape plus "citations"
+
+--latency is the time to the first byte; every generated token then takes --token-latency,
+so a non-streaming answer arrives after latency + tokens x token latency and a stream
+delivers its tokens at that pace. --error-rate answers that share of calls with
+--error-status (429 carries Retry-After); --abort-rate cuts that share of streams halfway
+with no terminator, as a dropped upstream connection does. Latency specs as in jupiter_standin.py.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import random
+import struct
+import time
+import uuid
+import zlib
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from jupiter_standin import parse_latency
+
+WORDS = (
+    "market liquidity token growth signal founders crypto analysis launch community builders yield "
+    "strategy users protocol adoption wallet volume traders insight narrative product onchain data"
+).split()
+PROVIDERS = ("openai", "anthropic", "gemini", "perplexity")
+
+
+def png(seed: str, size_kib: int) -> bytes:
+    """A PNG signature and header followed by `size_kib` of seeded filler: unique per seed, cheap to make."""
+    ihdr = struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0)
+    header = b"\x89PNG\r\n\x1a\n" + struct.pack(">I", len(ihdr)) + b"IHDR" + ihdr + struct.pack(">I", zlib.crc32(b"IHDR" + ihdr))
+    return header + random.Random(seed).randbytes(size_kib * 1024)
+
+
+def create_app(latency, token_latency, tokens: int = 64, error_rate: float = 0.0, error_status: int = 500,
+               abort_rate: float = 0.0, image_kib: int = 64) -> FastAPI:
+    """Build the stand-in; `latency` and `token_latency` are samplers from parse_latency."""
+    app = FastAPI(title="LLM provider stand-in")
+    app.state.counts = {p: 0 for p in PROVIDERS}
+    app.state.counts.update(images=0, streams=0, errors=0, aborted=0)
+
+    def text_tokens(limit) -> list:
+        n = max(1, min(tokens, int(limit or tokens)))
+        return [("" if i == 0 else " ") + random.choice(WORDS) for i in range(n)]
+
+    async def shape(provider: str):
+        app.state.counts[provider] += 1
+        await asyncio.sleep(latency())
+        if error_rate and random.random() < error_rate:
+            app.state.counts["errors"] += 1
+            headers = {"Retry-After": "1"} if error_status == 429 else None
+            body = {"error": {"type": "injected_failure", "message": f"stand-in injected {error_status}"}}
+            return JSONResponse(body, status_code=error_status, headers=headers)
+        return None
+
+    async def generate(parts: list) -> str:
+        await asyncio.sleep(sum(token_latency() for _ in parts))
+        return "".join(parts)
+
+    def sse_stream(parts: list, frame, terminator: str = "", head: str = ""):
+        """Yield `head`, one frame per token at --token-latency, then the provider's terminator."""
+        abort = abort_rate and random.random() < abort_rate
+        app.state.counts["streams"] += 1
+
+        async def events():
+            if head:
+                yield head
+            for i, part in enumerate(parts):
+                if abort and i == len(parts) // 2:
+                    app.state.counts["aborted"] += 1
+                    raise ConnectionAbortedError("stand-in dropped the stream")
+                await asyncio.sleep(token_latency())
+                yield frame(part)
+            if terminator:
+                yield terminator
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    def data(payload) -> str:
+        return f"data: {json.dumps(payload)}\n\n"
+
+    # -----------------------------------------------------------------
+    # OpenAI-compatible chat (openai, perplexity)
+    # -----------------------------------------------------------------
+    async def chat(provider: str, request: Request):
+        err = await shape(provider)
+        if err:
+            return err
+        body = await request.json()
+        model = body.get("model", "stand-in")
+        parts = text_tokens(body.get("max_tokens"))
+        cid = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        if body.get("stream"):
+            chunk = lambda t: data({"id": cid, "object": "chat.completion.chunk", "model": model,  # noqa: E731
+                                    "choices": [{"index": 0, "delta": {"content": t}, "finish_reason": None}]})
+            return sse_stream(parts, chunk, "data: [DONE]\n\n")
+        text = await generate(parts)
+        out = {
+            "id": cid, "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 32, "completion_tokens": len(parts), "total_tokens": 32 + len(parts)},
+        }
+        if provider == "perplexity":
+            out["citations"] = ["https://example.com/source-1", "https://example.com/source-2"]
+        return out
+
+    @app.post("/openai/v1/chat/completions")
+    async def openai_chat(request: Request):
+        return await chat("openai", request)
+
+    @app.post("/perplexity/chat/completions")
+    async def perplexity_chat(request: Request):
+        return await chat("perplexity", request)
+
+    @app.post("/openai/v1/images/generations")
+    async def images(request: Request):
+        err = await shape("openai")
+        if err:
+            return err
+        body = await request.json()
+        n = int(body.get("n", 1))
+        app.state.counts["images"] += n
+        await asyncio.sleep(sum(token_latency() for _ in range(tokens)))  # rendering time
+        seeds = [uuid.uuid4().hex for _ in range(n)]
+        if body.get("response_format") == "b64_json":
+            items = [{"b64_json": base64.b64encode(png(s, image_kib)).decode()} for s in seeds]
+        else:
+            base = str(request.base_url).rstrip("/")
+            items = [{"url": f"{base}/openai/files/{s}.png"} for s in seeds]
+        return {"created": int(time.time()), "data": [dict(item, revised_prompt=body.get("prompt", "")) for item in items]}
+
+    @app.get("/openai/files/{name}")
+    def image_file(name: str):
+        return Response(png(name.rsplit(".", 1)[0], image_kib), media_type="image/png")
+
+    # -----------------------------------------------------------------
+    # Anthropic messages
+    # -----------------------------------------------------------------
+    @app.post("/anthropic/v1/messages")
+    async def messages(request: Request):
+        err = await shape("anthropic")
+        if err:
+            return err
+        body = await request.json()
+        model = body.get("model", "stand-in")
+        parts = text_tokens(body.get("max_tokens"))
+        mid = f"msg_{uuid.uuid4().hex[:24]}"
+        if body.get("stream"):
+            def event(kind, payload):
+                return f"event: {kind}\ndata: {json.dumps(dict(payload, type=kind))}\n\n"
+
+            head = event("message_start", {"message": {"id": mid, "type": "message", "role": "assistant", "model": model, "content": []}})
+            head += event("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})
+            tail = event("content_block_stop", {"index": 0})
+            tail += event("message_delta", {"delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": len(parts)}})
+            tail += event("message_stop", {})
+            delta = lambda t: event("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": t}})  # noqa: E731
+            return sse_stream(parts, delta, tail, head)
+        text = await generate(parts)
+        return {
+            "id": mid, "type": "message", "role": "assistant", "model": model,
+            "content": [{"type": "text", "text": text}], "stop_reason": "end_turn",
+            "usage": {"input_tokens": 32, "output_tokens": len(parts)},
+        }
+
+    # -----------------------------------------------------------------
+    # Gemini generateContent / streamGenerateContent
+    # -----------------------------------------------------------------
+    @app.post("/gemini/v1beta/models/{call}")
+    async def gemini(call: str, request: Request):
+        model, _, method = call.partition(":")
+        if method not in ("generateContent", "streamGenerateContent"):
+            return JSONResponse({"error": {"code": 404, "message": f"unknown method {method}"}}, status_code=404)
+        err = await shape("gemini")
+        if err:
+            return err
+        body = await request.json()
+        parts = text_tokens((body.get("generationConfig") or {}).get("maxOutputTokens"))
+
+        def candidate(text):
+            return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}], "modelVersion": model}
+
+        if method == "streamGenerateContent":
+            return sse_stream(parts, lambda t: data(candidate(t)))
+        return candidate(await generate(parts))
+
+    @app.get("/_standin/stats")
+    def stats():
+        return app.state.counts
+
+    return app
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Emulate the OpenAI, Anthropic, Gemini and Perplexity APIs locally.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8098)
+    ap.add_argument("--latency", default="lognormal:300,0.4", help="Time to first byte (latency spec, ms)")
+    ap.add_argument("--token-latency", default="fixed:5", help="Time per generated token (latency spec, ms)")
+    ap.add_argument("--tokens", type=int, default=64, help="Tokens per answer (capped by the request's max tokens)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with --error-status")
+    ap.add_argument("--error-status", type=int, default=500)
+    ap.add_argument("--abort-rate", type=float, default=0.0, help="Fraction of streams dropped halfway")
+    ap.add_argument("--image-kib", type=int, default=64, help="Size of each generated image")
+    args = ap.parse_args()
+
+    import uvicorn
+    uvicorn.run(
+        create_app(parse_latency(args.latency), parse_latency(args.token_latency), args.tokens,
+                   args.error_rate, args.error_status, args.abort_rate, args.image_kib),
+        host=args.host, port=args.port, log_level="warning",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,541 @@
+#!/usr/bin/env python3
+"""
+Offline load test of every api-services endpoint, through the gateway, against local stand-ins.
+
+    python bench/loadtest.py [--seconds 10] [--concurrency 8] [--only ohlcv_pay,blog_stream] [--out results.json]
+                             [--baseline previous.json --max-regression 20] [--json]
+
+Starts llm_standin.py, coingecko_standin.py, merchant_standin.py and jupiter_standin.py plus
+app/gateway.py on free ports, with every upstream base URL pointed at the stand-ins and all
+state (x402 spent proofs, jobs, links, images, LLM cache) in a temp dir, so nothing leaves
+the machine. Then, one scenario at a time, --concurrency clients each send their next request
+as soon as the previous one finishes (closed loop) for --warmup + --seconds; only the last
+--seconds are recorded.
+
+Paid endpoints run the whole x402 flow as one sample: request -> 402 + invoice -> proof
+headers (a fresh txid each time) -> retry -> 200/302. LLM calls use cache=bypass so every
+request reaches the stand-in. Stream scenarios read the SSE body to its done event and also
+report time to the first event; async ones poll /jobs/{id} until the job finishes.
+
+Per scenario: requests, throughput, p50/p95/p99/max latency, error rate and status counts.
+--out writes them as JSON with the git commit and the run's settings. --baseline compares
+with an earlier file and exits 1 when any scenario's p95 or throughput is worse by more than
+--max-regression percent, or its error rate is up by more than --max-error-increase.
+
+The stand-ins do not rate limit, so the upstream admission gates (app/admission.py) are
+lifted unless --keep-admission; their concurrency caps stay. Stand-in latency and error
+injection come from the --llm-*, --coingecko-*, --merchant-* and --jupiter-* flags.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+sys.path.insert(0, HERE)
+
+from bench_gateway import uvicorn_cmd  # noqa: E402
+from bench_supervisor import healthy_path  # noqa: E402
+from bench_x402 import free_port  # noqa: E402
+
+try:
+    import websockets
+except ImportError:  # optional: only the swap_ws scenario needs it (and uvicorn needs it to serve websockets)
+    websockets = None
+
+API_KEY = "loadtest-secret-key"
+AUTH = {"Authorization": f"Bearer {API_KEY}"}
+USER = "LoadTestUser11111111111111111111111111111111"
+MINT = "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v"
+GATES = ("openai", "anthropic", "gemini", "perplexity", "coingecko")
+TOPICS = ("solana defi", "stablecoin payments", "memecoin launches", "validator economics", "onchain gaming")
+
+
+def topic() -> str:
+    return f"{random.choice(TOPICS)} {uuid.uuid4().hex[:6]}"
+
+
+# ---------------------------------------------------------------------
+# x402 flow and stream helpers
+# ---------------------------------------------------------------------
+def proof(challenge: httpx.Response) -> dict:
+    """Proof headers paying the invoice in a 402 answer, as a client wallet would send them."""
+    body = challenge.json()
+    invoice = body.get("invoice", body)  # a rejected proof nests the fresh invoice
+    amount = math.ceil(float(invoice["price_usd"]) * 1_000_000 - 1e-6)
+    return {
+        "X-402-Invoice": challenge.headers["X-402-Invoice"],
+        "X-402-Proof-Tx": f"tx_{uuid.uuid4().hex}",
+        "X-402-Proof-Mint": MINT,
+        "X-402-Chain": "solana",
+        "X-402-Amount": str(amount),
+    }
+
+
+async def paid(http, method, url, headers=None, **kw) -> httpx.Response:
+    """Request -> 402 -> pay -> retry; a route that answers without a challenge is returned as is."""
+    r = await http.request(method, url, headers=headers, **kw)
+    if r.status_code != 402:
+        return r
+    return await http.request(method, url, headers=dict(headers or {}, **proof(r)), **kw)
+
+
+async def read_sse(http, method, url, headers=None, until=("done", "error"), **kw):
+    """Read an SSE response up to an `until` event; returns (status, first event seconds, last event)."""
+    start = time.perf_counter()
+    first, event = None, None
+    async with http.stream(method, url, headers=headers, **kw) as r:
+        if r.status_code != 200:
+            await r.aread()
+            return r.status_code, None, None
+        async for line in r.aiter_lines():
+            if not line.startswith("event:"):
+                continue
+            event = line[6:].strip()
+            if first is None and event != "start":
+                first = time.perf_counter() - start
+            if event in until:
+                break
+    return 200 if event not in (None, "error") else f"sse_{event or 'truncated'}", first, event
+
+
+async def poll_job(http, location, timeout=120.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        r = await http.get(location)
+        status = r.json().get("status")
+        if status == "succeeded":
+            return 200
+        if status == "failed":
+            return "job_failed"
+        await asyncio.sleep(0.05)
+    return "job_timeout"
+
+
+# ---------------------------------------------------------------------
+# Scenarios: async fn(http, ctx) -> (status, first event seconds or None)
+# ---------------------------------------------------------------------
+async def gateway_health(http, ctx):
+    return (await http.get("/health")).status_code, None
+
+
+async def ohlcv_pay(http, ctx):
+    params = {"symbol": random.choice(("btc", "eth", "sol")), "timeframe": random.choice(("1d", "7d", "30d"))}
+    return (await paid(http, "GET", "/ohlcv/ohlcv", params=params)).status_code, None
+
+
+async def research(http, ctx):
+    params = {"query": topic(), "max_tokens": 256, "cache": "bypass"}
+    return (await http.post("/research/research", params=params, headers=AUTH)).status_code, None
+
+
+def generate(prefix, stream=False, mode="sync"):
+    async def scenario(http, ctx):
+        params = {"topic": topic(), "cache": "bypass"}
+        if stream:
+            params["stream"] = "true"
+            status, first, _ = await read_sse(http, "POST", f"{prefix}/generate", headers=AUTH, params=params)
+            return status, first
+        if mode == "async":
+            r = await http.post(f"{prefix}/generate", params=dict(params, mode="async"), headers=AUTH)
+            if r.status_code != 202:
+                return r.status_code, None
+            return await poll_job(http, r.headers["Location"]), None
+        return (await http.post(f"{prefix}/generate", params=params, headers=AUTH)).status_code, None
+
+    return scenario
+
+
+async def image(http, ctx):
+    params = {"prompt": topic(), "count": 2, "fresh": "true"}
+    return (await http.post("/image/generate", params=params, headers=AUTH)).status_code, None
+
+
+async def image_fetch(http, ctx):
+    return (await http.get(ctx["image_url"])).status_code, None
+
+
+async def campaign(http, ctx):
+    body = {"topic": topic(), "cache": "bypass"}
+    r = await http.post("/pipeline/campaign", json=body, headers=AUTH)
+    if r.status_code == 200 and r.json()["status"] != "complete":
+        return f"campaign_{r.json()['status']}", None  # a stage failed or timed out
+    return r.status_code, None
+
+
+async def campaign_stream(http, ctx):
+    body = {"topic": topic(), "cache": "bypass", "stream": True}
+    status, first, _ = await read_sse(http, "POST", "/pipeline/campaign", headers=AUTH, json=body)
+    return status, first
+
+
+async def links_shorten(http, ctx):
+    body = {"url": f"https://example.com/{uuid.uuid4().hex[:8]}"}
+    return (await http.post("/links/shorten", json=body)).status_code, None
+
+
+async def links_pay(http, ctx):
+    return (await paid(http, "GET", ctx["short"])).status_code, None
+
+
+SOL_USDC = {"in": "SOL", "out": "USDC", "amount": 0.1}
+
+
+async def swap_quote_pay(http, ctx):
+    return (await paid(http, "GET", "/swap/quote", params=dict(SOL_USDC, amount=random.choice((0.1, 0.5, 2.0))))).status_code, None
+
+
+async def swap_batch_pay(http, ctx):
+    body = {"quotes": [SOL_USDC, {"in": "USDC", "out": "SOL", "amount": 25}, dict(SOL_USDC, amount=1.5)], "slim": True}
+    return (await paid(http, "POST", "/swap/quote/batch", json=body)).status_code, None
+
+
+async def swap_route_summary(http, ctx):
+    return (await http.post("/swap/route/summary", json={"route": ctx["route"]})).status_code, None
+
+
+async def swap_quote_stream(http, ctx):
+    r = await http.get("/swap/quote/stream", params=SOL_USDC)
+    headers = proof(r) if r.status_code == 402 else None
+    status, first, _ = await read_sse(http, "GET", "/swap/quote/stream", headers=headers, params=SOL_USDC, until=("quote",))
+    return status, first
+
+
+async def swap_pipeline_pay(http, ctx):
+    body = dict(SOL_USDC, user=USER)
+    return (await paid(http, "POST", "/swap/pipeline/execute", json=body)).status_code, None
+
+
+async def swap_ws(http, ctx):
+    """Pay over HTTP for an access token, then open the socket and wait for the first quote."""
+    r = await paid(http, "GET", "/swap/quote", params=SOL_USDC)
+    token = r.headers.get("X-402-Access-Token")
+    url = f"{ctx['ws_base']}/swap/quote/ws?in=SOL&out=USDC&amount=0.1"
+    start = time.perf_counter()
+    async with websockets.connect(url, extra_headers={"X-402-Access-Token": token} if token else {}) as ws:
+        await asyncio.wait_for(ws.recv(), 30)
+    return 200, time.perf_counter() - start
+
+
+# name -> (scenario, expected final status)
+SCENARIOS = {
+    "gateway_health": (gateway_health, 200),
+    "ohlcv_pay": (ohlcv_pay, 200),
+    "research": (research, 200),
+    "blog": (generate("/blog"), 200),
+    "blog_stream": (generate("/blog", stream=True), 200),
+    "blog_async": (generate("/blog", mode="async"), 200),
+    "tweet": (generate("/tweet"), 200),
+    "tweet_stream": (generate("/tweet", stream=True), 200),
+    "script": (generate("/script"), 200),
+    "script_stream": (generate("/script", stream=True), 200),
+    "image": (image, 200),
+    "image_fetch": (image_fetch, 200),
+    "campaign": (campaign, 200),
+    "campaign_stream": (campaign_stream, 200),
+    "links_shorten": (links_shorten, 200),
+    "links_pay": (links_pay, 302),
+    "swap_quote_pay": (swap_quote_pay, 200),
+    "swap_batch_pay": (swap_batch_pay, 200),
+    "swap_route_summary": (swap_route_summary, 200),
+    "swap_quote_stream": (swap_quote_stream, 200),
+    "swap_pipeline_pay": (swap_pipeline_pay, 200),
+    "swap_ws": (swap_ws, 200),
+}
+
+
+async def setup(http, gateway_port) -> dict:
+    """Fixtures some scenarios read instead of create: a stored image, a short link, a raw route, a warm leg."""
+    ctx = {"ws_base": f"ws://127.0.0.1:{gateway_port}"}
+    r = await http.post("/image/generate", params={"prompt": "loadtest fixture", "count": 1}, headers=AUTH)
+    r.raise_for_status()
+    ctx["image_url"] = r.json()["images"][0]["url"]
+    r = await http.post("/links/shorten", json={"url": "https://example.com/loadtest"})
+    r.raise_for_status()
+    ctx["short"] = f"/links/s/{r.json()['id']}"
+    r = await paid(http, "GET", "/swap/quote", params=SOL_USDC)
+    r.raise_for_status()
+    ctx["route"] = r.json()["raw"]
+    r = await paid(http, "POST", "/swap/pipeline/prefetch", json={"user": USER, "legs": [SOL_USDC]})
+    r.raise_for_status()
+    return ctx
+
+
+# ---------------------------------------------------------------------
+# Closed-loop driver and summaries
+# ---------------------------------------------------------------------
+async def drive(fn, http, ctx, concurrency, warmup, seconds):
+    samples = []  # (latency s, status, first event s)
+    record_from = time.perf_counter() + warmup
+    end = record_from + seconds
+
+    async def client():
+        while time.perf_counter() < end:
+            start = time.perf_counter()
+            try:
+                status, first = await fn(http, ctx)
+            except Exception as e:
+                status, first = type(e).__name__, None
+            if start >= record_from:
+                samples.append((time.perf_counter() - start, status, first))
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return samples, time.perf_counter() - record_from
+
+
+def pct(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))] if sorted_values else None
+
+
+def ms(seconds):
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+def summarize(samples, elapsed, expected):
+    lat = sorted(s[0] for s in samples)
+    firsts = sorted(s[2] for s in samples if s[2] is not None)
+    statuses = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(1 for _, status, _ in samples if status != expected)
+    out = {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else None,
+        "rps": round(len(samples) / elapsed, 2) if elapsed > 0 else None,
+        "p50_ms": ms(pct(lat, 0.50)),
+        "p95_ms": ms(pct(lat, 0.95)),
+        "p99_ms": ms(pct(lat, 0.99)),
+        "max_ms": ms(lat[-1] if lat else None),
+        "status": statuses,
+    }
+    if firsts:
+        out["first_event_p50_ms"] = ms(pct(firsts, 0.50))
+        out["first_event_p95_ms"] = ms(pct(firsts, 0.95))
+    return out
+
+
+def compare(current, baseline, max_regression, max_error_increase):
+    """Human-readable regressions of `current` against `baseline` (both `scenarios` dicts)."""
+    problems = []
+    limit = 1 + max_regression / 100
+    for name, now in current.items():
+        then = baseline.get(name)
+        if not then or not then.get("requests") or now.get("skipped"):
+            continue
+        if then.get("p95_ms") and now.get("p95_ms") and now["p95_ms"] > then["p95_ms"] * limit:
+            problems.append(f"{name}: p95 {then['p95_ms']}ms -> {now['p95_ms']}ms")
+        if then.get("rps") and (now.get("rps") or 0) < then["rps"] / limit:
+            problems.append(f"{name}: throughput {then['rps']} -> {now.get('rps')} req/s")
+        if (now.get("error_rate") or 0) > (then.get("error_rate") or 0) + max_error_increase:
+            problems.append(f"{name}: error rate {then.get('error_rate')} -> {now.get('error_rate')}")
+    return problems
+
+
+# ---------------------------------------------------------------------
+# Processes
+# ---------------------------------------------------------------------
+def git_commit():
+    try:
+        sha = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True, timeout=30).stdout.strip()
+        return {"commit": sha or None, "dirty": bool(dirty)}
+    except (OSError, subprocess.SubprocessError):
+        return {"commit": None, "dirty": None}
+
+
+def spawn(cmd, log_dir, name, env=None):
+    log = open(os.path.join(log_dir, f"{name}.log"), "wb")
+    return subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+
+
+def start_all(args, tmp):
+    ports = {name: free_port() for name in ("llm", "coingecko", "merchant", "jupiter", "gateway")}
+    py = sys.executable
+    procs = {
+        "llm": spawn([py, os.path.join(HERE, "llm_standin.py"), "--port", str(ports["llm"]), "--latency", args.llm_latency,
+                      "--token-latency", args.llm_token_latency, "--tokens", str(args.llm_tokens),
+                      "--error-rate", str(args.llm_error_rate), "--error-status", str(args.llm_error_status),
+                      "--abort-rate", str(args.llm_abort_rate)], tmp, "llm"),
+        "coingecko": spawn([py, os.path.join(HERE, "coingecko_standin.py"), "--port", str(ports["coingecko"]),
+                            "--latency", args.coingecko_latency, "--error-rate", str(args.coingecko_error_rate),
+                            "--error-status", str(args.coingecko_error_status)], tmp, "coingecko"),
+        "merchant": spawn([py, os.path.join(HERE, "merchant_standin.py"), "--port", str(ports["merchant"]),
+                           "--latency", args.merchant_latency, "--error-rate", str(args.merchant_error_rate)], tmp, "merchant"),
+        "jupiter": spawn([py, os.path.join(HERE, "jupiter_standin.py"), "--port", str(ports["jupiter"]),
+                          "--latency", args.jupiter_latency, "--error-rate", str(args.jupiter_error_rate)], tmp, "jupiter"),
+    }
+    llm = f"http://127.0.0.1:{ports['llm']}"
+    env = dict(
+        os.environ,
+        OPENAI_API_BASE=f"{llm}/openai/v1",
+        ANTHROPIC_API_BASE=f"{llm}/anthropic/v1",
+        GEMINI_API_BASE=f"{llm}/gemini/v1beta",
+        PERPLEXITY_API_BASE=f"{llm}/perplexity",
+        COINGECKO_BASE=f"http://127.0.0.1:{ports['coingecko']}/api/v3",
+        X402_URL=f"http://127.0.0.1:{ports['merchant']}",
+        JUPITER_BASE=f"http://127.0.0.1:{ports['jupiter']}",
+        API_KEY=API_KEY,
+        X402_DB_PATH=os.path.join(tmp, "x402.db"),
+        JOBS_DB_PATH=os.path.join(tmp, "jobs.db"),
+        LINK_DB_PATH=os.path.join(tmp, "links.db"),
+        IMAGE_STORE_DIR=os.path.join(tmp, "images"),
+        LLM_CACHE_DIR=os.path.join(tmp, "llm"),
+    )
+    if not args.keep_admission:
+        for gate in GATES:
+            env[f"ADMIT_RATE_{gate.upper()}"] = env[f"ADMIT_BURST_{gate.upper()}"] = "1000000"
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    procs["gateway"] = spawn(uvicorn_cmd("gateway:app", ports["gateway"]), tmp, "gateway", env)
+
+    probes = {"llm": "/_standin/stats", "coingecko": "/api/v3/ping", "merchant": "/_standin/stats",
+              "jupiter": "/_standin/stats", "gateway": "/health"}
+    deadline = time.perf_counter() + args.startup_timeout
+    for name, path in probes.items():
+        while not healthy_path(ports[name], path):
+            if procs[name].poll() is not None or time.perf_counter() > deadline:
+                stop_all(procs)
+                with open(os.path.join(tmp, f"{name}.log"), errors="replace") as f:
+                    sys.exit(f"{name} did not come up:\n{f.read()[-2000:]}")
+            time.sleep(0.1)
+    return procs, ports
+
+
+def stop_all(procs):
+    for proc in procs.values():
+        if proc.poll() is None:
+            os.killpg(proc.pid, signal.SIGTERM)
+    for proc in procs.values():
+        try:
+            proc.wait(15)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+
+
+def standin_stats(ports):
+    out = {}
+    for name in ("llm", "coingecko", "merchant", "jupiter"):
+        try:
+            out[name] = httpx.get(f"http://127.0.0.1:{ports[name]}/_standin/stats", timeout=5).json()
+        except (httpx.HTTPError, ValueError):
+            out[name] = None
+    return out
+
+
+async def run(args, ports):
+    base = f"http://127.0.0.1:{ports['gateway']}"
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=base, timeout=args.request_timeout, limits=limits) as http:
+        ctx = await setup(http, ports["gateway"])
+        results = {}
+        for name in args.only:
+            fn, expected = SCENARIOS[name]
+            if fn is swap_ws and websockets is None:
+                results[name] = {"skipped": "the websockets package is not installed"}
+            else:
+                samples, elapsed = await drive(fn, http, ctx, args.concurrency, args.warmup, args.seconds)
+                results[name] = summarize(samples, elapsed, expected)
+            if not args.json:
+                print(line(name, results[name]), flush=True)
+        return results
+
+
+def line(name, r):
+    if "skipped" in r:
+        return f"{name:20} skipped: {r['skipped']}"
+    first = f"  first {r['first_event_p50_ms']}ms" if "first_event_p50_ms" in r else ""
+    return (
+        f"{name:20} {r['requests']:6} req  {r['rps']:8} req/s  p50 {r['p50_ms']}ms  p95 {r['p95_ms']}ms  "
+        f"p99 {r['p99_ms']}ms  errors {r['error_rate']:.2%}{first}"
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--seconds", type=float, default=10, help="Recorded seconds per scenario")
+    ap.add_argument("--warmup", type=float, default=2, help="Unrecorded seconds before each scenario")
+    ap.add_argument("--concurrency", type=int, default=8, help="Closed-loop clients per scenario")
+    ap.add_argument("--only", default=",".join(SCENARIOS), help="Comma-separated scenarios (default: all)")
+    ap.add_argument("--request-timeout", type=float, default=60)
+    ap.add_argument("--startup-timeout", type=float, default=90)
+    ap.add_argument("--keep-admission", action="store_true", help="Keep the upstream admission rate limits")
+    ap.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Extra gateway environment (repeatable)")
+    ap.add_argument("--llm-latency", default="lognormal:300,0.4")
+    ap.add_argument("--llm-token-latency", default="fixed:2")
+    ap.add_argument("--llm-tokens", type=int, default=64)
+    ap.add_argument("--llm-error-rate", type=float, default=0.0)
+    ap.add_argument("--llm-error-status", type=int, default=500)
+    ap.add_argument("--llm-abort-rate", type=float, default=0.0)
+    ap.add_argument("--coingecko-latency", default="lognormal:120,0.5")
+    ap.add_argument("--coingecko-error-rate", type=float, default=0.0)
+    ap.add_argument("--coingecko-error-status", type=int, default=500)
+    ap.add_argument("--merchant-latency", default="lognormal:30,0.4")
+    ap.add_argument("--merchant-error-rate", type=float, default=0.0)
+    ap.add_argument("--jupiter-latency", default="lognormal:40,0.4")
+    ap.add_argument("--jupiter-error-rate", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--out", help="Write the results JSON here")
+    ap.add_argument("--baseline", help="Earlier results JSON to compare against")
+    ap.add_argument("--max-regression", type=float, default=20, help="Allowed p95 / throughput regression, percent")
+    ap.add_argument("--max-error-increase", type=float, default=0.01, help="Allowed error-rate increase (absolute)")
+    ap.add_argument("--keep-tmp", action="store_true", help="Keep the temp dir (process logs, databases)")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+    args.only = [s.strip() for s in args.only.split(",") if s.strip()]
+    unknown = [s for s in args.only if s not in SCENARIOS]
+    if unknown:
+        ap.error(f"unknown scenarios: {', '.join(unknown)}; choose from {', '.join(SCENARIOS)}")
+
+    random.seed(args.seed)
+    tmp = tempfile.mkdtemp(prefix="loadtest-")
+    procs, ports = start_all(args, tmp)
+    started = datetime.now(timezone.utc).isoformat()
+    try:
+        scenarios = asyncio.run(run(args, ports))
+        standins = standin_stats(ports)
+    finally:
+        stop_all(procs)
+        if not args.keep_tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    settings = {k: v for k, v in vars(args).items() if k not in ("out", "baseline", "json", "keep_tmp")}
+    result = {
+        "meta": dict(git_commit(), started_at=started, python=platform.python_version(), host=platform.node(),
+                     cpus=os.cpu_count(), settings=settings),
+        "scenarios": scenarios,
+        "standins": standins,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            result["regressions"] = compare(scenarios, json.load(f)["scenarios"], args.max_regression, args.max_error_increase)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    elif args.baseline:
+        for problem in result["regressions"]:
+            print(f"REGRESSION {problem}")
+        print(f"{len(result['regressions'])} regression(s) against {args.baseline}")
+    if result.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Local x402 merchant stand-in with the same HTTP contract as services/x402-merchant.
+
+    python bench/merchant_standin.py --port 7003 --latency lognormal:30,0.4
+    X402_URL=http://127.0.0.1:7003 python app/main.py
+
+Endpoints:
+  POST /invoice   402 + X-402-Price/-Currency/-Invoice/-PayTo headers, body {id, price_usd, ...}
+  POST /verify    {invoice, proof} -> {ok, status}; a proof on chain "solana" with a positive raw
+                  amount counts as paid, no RPC involved. Like the real merchant it checks the
+                  transfer against the proof's own amount, not the invoice price (that is
+                  x402.py's job), and answers "already_verified" for an invoice paid before.
+
+Latency specs as in jupiter_standin.py; latency and --error-rate apply to both endpoints.
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from jupiter_standin import parse_latency
+
+PAYTO = "StandinPayTo1111111111111111111111111111111"
+
+
+def build_app(latency: str = "fixed:0", currency: str = "USDC", error_rate: float = 0.0, error_status: int = 500) -> FastAPI:
+    app = FastAPI(title="x402 merchant stand-in")
+    app.state.counts = {"invoice": 0, "verify": 0, "errors": 0}
+    delay = parse_latency(latency)
+    invoices = {}
+
+    async def shape(kind: str):
+        app.state.counts[kind] += 1
+        await asyncio.sleep(delay())
+        if error_rate and random.random() < error_rate:
+            app.state.counts["errors"] += 1
+            return JSONResponse({"ok": False, "error": "injected failure"}, status_code=error_status)
+        return None
+
+    @app.post("/invoice")
+    async def invoice(request: Request):
+        err = await shape("invoice")
+        if err:
+            return err
+        body = await request.json()
+        inv = {
+            "id": f"inv_{uuid.uuid4()}",
+            "price_usd": float(body.get("price_usd", 0.10)),
+            "currency": currency,
+            "expires_at": int(time.time()) + 600,
+            "paid": False,
+        }
+        invoices[inv["id"]] = inv
+        headers = {
+            "X-402-Price": f"{inv['price_usd']:.2f}",
+            "X-402-Currency": currency,
+            "X-402-Invoice": inv["id"],
+            "X-402-PayTo": PAYTO,
+        }
+        return JSONResponse(inv, status_code=402, headers=headers)
+
+    @app.post("/verify")
+    async def verify(request: Request):
+        err = await shape("verify")
+        if err:
+            return err
+        body = await request.json()
+        inv = invoices.get(str(body.get("invoice")))
+        proof = body.get("proof") or {}
+        if inv is None:
+            return JSONResponse({"ok": False, "error": "bad invoice"}, status_code=400)
+        if inv["paid"]:
+            return {"ok": True, "invoice": inv["id"], "status": "already_verified"}
+        if proof.get("chain") != "solana":
+            return JSONResponse({"ok": False, "error": "chain must be solana"}, status_code=400)
+        try:
+            received = int(proof.get("amount")) / 1_000_000
+        except (TypeError, ValueError):
+            received = 0.0
+        if received <= 0:
+            return JSONResponse({"ok": False, "error": f"payment shortfall: {received} < {proof.get('amount')}"}, status_code=400)
+        inv["paid"] = True
+        return {"ok": True, "invoice": inv["id"], "status": "verified"}
+
+    @app.get("/_standin/stats")
+    def stats():
+        return app.state.counts
+
+    return app
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=7003)
+    ap.add_argument("--latency", default="fixed:0", help="latency spec in ms")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with --error-status")
+    ap.add_argument("--error-status", type=int, default=500)
+    args = ap.parse_args()
+
+    import uvicorn
+    uvicorn.run(build_app(args.latency, error_rate=args.error_rate, error_status=args.error_status), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
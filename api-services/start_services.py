@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 """
 Startup script to run all API services
+
+    python start_services.py           # development: one auto-reloading process per service
+    python start_services.py --prod    # production: supervisor.py (workers, restarts, graceful reload)
 """
 import subprocess
 import time
@@ -8,6 +11,17 @@ import os
 import sys
 from multiprocessing import Process
 
+SERVICES = [
+    ("app/main.py", 8000, "Crypto OHLCV API"),
+    ("app/research_agent.py", 8001, "Research Agent"),
+    ("app/blog_agent.py", 8002, "Blog Agent"),
+    ("app/tweet_agent.py", 8003, "Tweet Agent"),
+    ("app/image_agent.py", 8004, "Image Agent"),
+    ("app/script_agent.py", 8005, "Script Agent"),
+    ("app/swap_service.py", 8006, "Swap Quote API"),
+    ("app/content_pipeline.py", 8007, "Content Pipeline"),
+]
+
 def run_service(script_name, port, service_name):
     """Run a service in a subprocess"""
     try:
@@ -25,14 +39,13 @@ def run_service(script_name, port, service_name):
 
 def main():
     """Start all services"""
-    services = [
-        ("app/main.py", 8000, "Crypto OHLCV API"),
-        ("app/research_agent.py", 8001, "Research Agent"),
-        ("app/blog_agent.py", 8002, "Blog Agent"),
-        ("app/tweet_agent.py", 8003, "Tweet Agent"),
-        ("app/image_agent.py", 8004, "Image Agent"),
-        ("app/script_agent.py", 8005, "Script Agent"),
-    ]
+    if "--prod" in sys.argv[1:]:
+        # Multi-worker, auto-restarting, reloadable: see supervisor.py
+        import supervisor
+        sys.argv.remove("--prod")
+        return supervisor.main()
+
+    services = SERVICES
     
     processes = []
     
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Production process supervisor for the API services.
+
+    python supervisor.py                      # every service, WEB_CONCURRENCY or cpu_count workers each
+    python supervisor.py --only blog_agent,swap_service --workers 4
+    kill -HUP <supervisor pid>                # zero-downtime reload (picks up new code)
+    kill -TERM <supervisor pid>               # graceful shutdown
+
+Layout: the supervisor binds every listening socket once and starts one *service master*
+per app (a fresh interpreter, inheriting the socket). Each master imports its app, then
+forks N uvicorn workers that all accept on the shared socket, so the imported code and
+data are shared copy-on-write. A service counts as started when all its workers report
+that uvicorn finished startup, not after a fixed sleep.
+
+Crashed workers (and crashed masters) are restarted with exponential backoff that
+resets once a process has stayed up for STABLE_S. On SIGHUP each service gets a new
+master with freshly imported code; only after it is ready is the old one sent SIGTERM,
+and its workers drain in-flight requests while the new generation already accepts. The
+reload is stepped from the supervision loop, so crashed masters of other services are
+still restarted while it runs.
+
+Per-service worker count: WORKERS_<MODULE> (e.g. WORKERS_SWAP_SERVICE=8).
+"""
+import argparse
+import asyncio
+import gc
+import os
+import select
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from start_services import SERVICES
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(HERE, "app")
+
+READY_TIMEOUT = float(os.getenv("SUPERVISOR_READY_TIMEOUT", "60"))
+GRACEFUL_TIMEOUT = int(os.getenv("SUPERVISOR_GRACEFUL_TIMEOUT", "30"))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+STABLE_S = 30.0
+BACKLOG = 2048
+
+
+def log(msg):
+    print(f"[supervisor {os.getpid()}] {msg}", file=sys.stderr, flush=True)
+
+
+def default_workers():
+    return int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+
+
+def backoff(failures):
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** max(failures - 1, 0))
+
+
+# ---------------------------------------------------------------------
+# Worker (forked from a service master)
+# ---------------------------------------------------------------------
+def run_worker(app, sock, ready_w):
+    import uvicorn
+
+    for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGCHLD):
+        signal.signal(sig, signal.SIG_DFL)
+    config = uvicorn.Config(
+        app,
+        lifespan="on",
+        access_log=False,
+        log_level=os.getenv("LOG_LEVEL", "warning"),
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+    )
+    server = uvicorn.Server(config)
+
+    async def main():
+        serving = asyncio.ensure_future(server.serve(sockets=[sock]))
+        while not server.started and not serving.done():
+            await asyncio.sleep(0.01)
+        if server.started:
+            os.write(ready_w, b".")
+        await serving
+
+    asyncio.run(main())
+
+
+# ---------------------------------------------------------------------
+# Service master (one per app)
+# ---------------------------------------------------------------------
+def serve(spec, fd, workers, ready_fd):
+    """Import `spec` once, fork `workers` uvicorn processes on the inherited socket, keep them alive."""
+    sys.path.insert(0, APP_DIR)
+    os.chdir(APP_DIR)
+    module, _, attr = spec.partition(":")
+    app = getattr(__import__(module), attr or "app")
+    sock = socket.socket(fileno=fd)
+    gc.collect()
+    gc.freeze()  # imported objects stay out of the workers' GC, so their pages stay shared
+
+    ready_r, ready_w = os.pipe()
+    children = {}  # pid -> (slot, started_at)
+    failures = [0] * workers
+    restart_at = {}  # slot -> monotonic time
+    stopping = False
+
+    def spawn(slot):
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_r)
+            code = 0
+            try:
+                run_worker(app, sock, ready_w)
+            except BaseException:
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = (slot, time.monotonic())
+
+    def stop(signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for slot in range(workers):
+        spawn(slot)
+
+    # Readiness: one byte per worker whose uvicorn server has started.
+    deadline, ready = time.monotonic() + READY_TIMEOUT, 0
+    while ready < workers and time.monotonic() < deadline and not stopping:
+        r, _, _ = select.select([ready_r], [], [], 0.1)
+        if r:
+            ready += len(os.read(ready_r, workers))
+    if ready < workers:
+        log(f"{spec}: only {ready}/{workers} workers ready after {READY_TIMEOUT:.0f}s")
+        stop(None, None)
+    else:
+        try:
+            os.write(ready_fd, b"ready\n")
+        except OSError:
+            pass  # restarted by the supervisor, which does not wait on this pipe
+    os.close(ready_fd)
+
+    stop_deadline = None
+    while children or (restart_at and not stopping):
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            pid = 0
+        if pid:
+            slot, started = children.pop(pid)
+            if not stopping:
+                lived = time.monotonic() - started
+                failures[slot] = 1 if lived >= STABLE_S else failures[slot] + 1
+                delay = backoff(failures[slot])
+                log(f"{spec}: worker {pid} exited ({status}) after {lived:.1f}s; restarting in {delay:.1f}s")
+                restart_at[slot] = time.monotonic() + delay
+            continue
+        if stopping:
+            stop_deadline = stop_deadline or time.monotonic() + GRACEFUL_TIMEOUT + 5
+            if time.monotonic() > stop_deadline:
+                for pid in list(children):
+                    os.kill(pid, signal.SIGKILL)
+        else:
+            now = time.monotonic()
+            for slot, when in list(restart_at.items()):
+                if now >= when:
+                    del restart_at[slot]
+                    spawn(slot)
+        # Drain readiness bytes from restarted workers so the pipe never fills.
+        r, _, _ = select.select([ready_r], [], [], 0.1)
+        if r:
+            os.read(ready_r, 4096)
+
+
+# ---------------------------------------------------------------------
+# Supervisor
+# ---------------------------------------------------------------------
+class Service:
+    def __init__(self, script, port, name, workers):
+        self.module = os.path.splitext(os.path.basename(script))[0]
+        self.port = port
+        self.name = name
+        self.workers = int(os.getenv(f"WORKERS_{self.module.upper()}", workers))
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((os.getenv("HOST", "0.0.0.0"), port))
+        self.sock.listen(BACKLOG)
+        self.sock.set_inheritable(True)
+        self.master = None
+        self.started_at = 0.0
+        self.failures = 0
+        self.restart_at = None
+
+    def spawn(self):
+        """Start a master; returns (process, readiness pipe read end)."""
+        ready_r, ready_w = os.pipe()
+        proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--serve", f"{self.module}:app",
+             "--fd", str(self.sock.fileno()), "--workers", str(self.workers), "--ready-fd", str(ready_w)],
+            pass_fds=(self.sock.fileno(), ready_w),
+            cwd=HERE,
+        )
+        os.close(ready_w)
+        return proc, ready_r
+
+
+def wait_ready(pending, timeout=READY_TIMEOUT):
+    """pending: {read_fd: service}. Returns the set of services whose master reported ready."""
+    ready, deadline = set(), time.monotonic() + timeout
+    pending = dict(pending)
+    while pending and time.monotonic() < deadline:
+        r, _, _ = select.select(list(pending), [], [], max(0.0, deadline - time.monotonic()))
+        for fd in r:
+            if os.read(fd, 64).startswith(b"ready"):
+                ready.add(pending[fd])
+            os.close(fd)
+            del pending[fd]
+    for fd in pending:
+        os.close(fd)
+    return ready
+
+
+def terminate(proc, timeout=GRACEFUL_TIMEOUT + 10):
+    if proc.poll() is None:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+
+def supervise(services):
+    t0 = time.monotonic()
+    pending = {}
+    for svc in services:
+        svc.master, fd = svc.spawn()
+        svc.started_at = time.monotonic()
+        pending[fd] = svc
+    ready = wait_ready(pending)
+    for svc in services:
+        state = "ready" if svc in ready else "NOT READY"
+        log(f"{svc.name}: {state} on :{svc.port} with {svc.workers} worker(s)")
+    log(f"startup took {time.monotonic() - t0:.2f}s")
+
+    signals = []
+    for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda s, _f: signals.append(s))
+
+    reloads = Reload()
+    while True:
+        while signals:
+            sig = signals.pop(0)
+            if sig == signal.SIGHUP:
+                reloads.start(services)
+            else:
+                log("shutting down")
+                procs = [svc.master for svc in services] + reloads.abort()
+                for proc in procs:
+                    if proc.poll() is None:
+                        proc.send_signal(signal.SIGTERM)
+                for proc in procs:
+                    terminate(proc)
+                return
+        reloads.step()
+        now = time.monotonic()
+        for svc in services:
+            if reloads.current is svc:
+                continue  # its new master is starting and replaces this one, dead or alive, once ready
+            if svc.restart_at is not None:
+                if now >= svc.restart_at:
+                    svc.restart_at = None
+                    svc.master, fd = svc.spawn()
+                    svc.started_at = now
+                    os.close(fd)
+            elif svc.master.poll() is not None:
+                lived = now - svc.started_at
+                svc.failures = 1 if lived >= STABLE_S else svc.failures + 1
+                delay = backoff(svc.failures)
+                log(f"{svc.name}: master exited ({svc.master.returncode}); restarting in {delay:.1f}s")
+                svc.restart_at = now + delay
+        time.sleep(0.2)
+
+
+class Reload:
+    """Rolling, zero-downtime reload, advanced by `step()` from the supervision loop.
+
+    One service at a time, its new master must report ready on the shared socket before the
+    old one is sent SIGTERM. Nothing here blocks, so while a new generation starts and an old
+    one drains, crashed masters of the other services are still restarted.
+    """
+
+    def __init__(self):
+        self.queue = []
+        self.current = None  # service whose new master is starting
+        self.new = None  # (process, readiness fd, deadline)
+        self.draining = []  # (process, kill deadline)
+
+    def start(self, services):
+        log("reloading")
+        self.queue += [svc for svc in services if svc not in self.queue and svc is not self.current]
+
+    def step(self):
+        now = time.monotonic()
+        for proc, kill_at in list(self.draining):
+            if proc.poll() is not None:
+                self.draining.remove((proc, kill_at))
+            elif now > kill_at:
+                proc.kill()
+        while self.current is None and self.queue:
+            svc = self.queue.pop(0)
+            if svc.restart_at is None:  # already restarting with fresh code
+                proc, fd = svc.spawn()
+                self.current, self.new = svc, (proc, fd, now + READY_TIMEOUT)
+        if self.current is None:
+            return
+        svc, (proc, fd, deadline) = self.current, self.new
+        r, _, _ = select.select([fd], [], [], 0)
+        if r and os.read(fd, 64).startswith(b"ready"):
+            self.drain(svc.master)
+            svc.master, svc.started_at = proc, now
+            log(f"{svc.name}: reloaded")
+        elif r or now > deadline or proc.poll() is not None:
+            log(f"{svc.name}: new generation failed readiness; keeping the running one")
+            self.drain(proc)
+        else:
+            return
+        os.close(fd)
+        self.current = self.new = None
+
+    def drain(self, proc):
+        if proc.poll() is None:
+            proc.send_signal(signal.SIGTERM)
+            self.draining.append((proc, time.monotonic() + GRACEFUL_TIMEOUT + 10))
+
+    def abort(self):
+        """Stop reloading; returns the processes the reload still owns."""
+        procs = [proc for proc, _ in self.draining]
+        if self.new is not None:
+            proc, fd, _ = self.new
+            os.close(fd)
+            procs.append(proc)
+        self.queue, self.current, self.new, self.draining = [], None, None, []
+        return procs
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Production supervisor for the API services")
+    ap.add_argument("--workers", type=int, default=None, help="workers per service (default WEB_CONCURRENCY or cpu count)")
+    ap.add_argument("--only", default="", help="comma-separated module names to run (default: all)")
+    ap.add_argument("--serve", help=argparse.SUPPRESS)
+    ap.add_argument("--fd", type=int, help=argparse.SUPPRESS)
+    ap.add_argument("--ready-fd", type=int, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.fd, args.workers, args.ready_fd)
+        return
+
+    only = {m.strip() for m in args.only.split(",") if m.strip()}
+    workers = args.workers or default_workers()
+    services = [
+        Service(script, port, name, workers)
+        for script, port, name in SERVICES
+        if not only or os.path.splitext(os.path.basename(script))[0] in only
+    ]
+    supervise(services)
+
+
+if __name__ == "__main__":
+    main()